@@ -55,11 +55,13 @@ def check_main_py_integration():
         content = f.read()
     
     checks = {
-        "Import predict module": "from predict import HeartFailurePredictor, build_ensemble_model",
+        "Import predict module": "from predict import FEATURE_NAMES, HeartFailurePredictor, build_ensemble_model",
         "Import logging": "import logging",
-        "Global predictor": "predictor = None",
-        "Load predictor startup": "predictor = HeartFailurePredictor",
-        "Use predictor.predict()": "predictor.predict(data.dict())",
+        "Model registry": "registry = ModelRegistry(",
+        "Load model startup": "registry.load(PRIMARY, MODEL_VERSION)",
+        "Default model fallback": "model = build_ensemble_model()",
+        "Route predictor": "slot, predictor = registry.route(",
+        "Batched predict()": "inference_batcher.predict(predictor, record.features)",
     }
     
     all_ok = True
@@ -89,14 +91,14 @@ def check_predict_py_structure():
     
     classes_functions = {
         "Classe HeartFailurePredictor": "class HeartFailurePredictor",
-        "Método __init__": "def __init__(self, model=None)",
+        "Método __init__": "def __init__(self, model=None, model_version: str = None, cache=None)",
         "Método prepare_data": "def prepare_data(self, data",
         "Método predict": "def predict(self, data",
         "Método predict_batch": "def predict_batch(self, data_list",
         "Método get_feature_importance": "def get_feature_importance",
-        "Função build_ensemble_model": "def build_ensemble_model()",
+        "Função build_ensemble_model": "def build_ensemble_model(",
         "Logging setup": "import logging",
-        "Feature names": "feature_names = [",
+        "Feature names": "FEATURE_NAMES = [",
     }
     
     all_ok = True
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+BENCHMARKS - Caminhos de predição e ingestão
+
+Roda offline sobre heart_failure_clinical_records_dataset.csv (e versões
+sintéticas ampliadas dele) e mede vazão e latência p50/p95/p99 de:
+- build_ensemble_model, prepare_data, predict e predict_batch
+- endpoints da API via TestClient em processo, com MinIO simulado (moto)
+  e Postgres substituído por SQLite
+
+Os resultados são comparados com benchmarks/baseline.json; uma regressão
+acima da tolerância faz o script sair com código 1.
+
+Uso:
+    python benchmarks/run_benchmarks.py                   # compara com o baseline
+    python benchmarks/run_benchmarks.py --update-baseline # grava novo baseline
+    python benchmarks/run_benchmarks.py --scale 100 --only predictor
+"""
+
+import os
+import gc
+import sys
+import asyncio
+import json
+import time
+import argparse
+import tempfile
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "fastapi"))
+
+DATASET = ROOT / "heart_failure_clinical_records_dataset.csv"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Colunas contínuas recebem ruído na ampliação sintética
+CONTINUOUS = ["age", "creatinine_phosphokinase", "ejection_fraction", "platelets",
+              "serum_creatinine", "serum_sodium", "time"]
+
+
+def load_dataset(scale: int = 1, seed: int = 42) -> pd.DataFrame:
+    """
+    Carrega o CSV e, se scale > 1, amplia por reamostragem com ruído.
+
+    Args:
+        scale: Fator de ampliação (linhas = 299 * scale)
+        seed: Semente do gerador
+
+    Returns:
+        DataFrame com as features e DEATH_EVENT
+    """
+    df = pd.read_csv(DATASET)
+    if scale <= 1:
+        return df
+    rng = np.random.default_rng(seed)
+    big = df.sample(n=len(df) * scale, replace=True, random_state=seed).reset_index(drop=True)
+    for col in CONTINUOUS:
+        noise = rng.normal(0.0, 0.02 * df[col].std(), len(big))
+        big[col] = (big[col] + noise).clip(lower=0).astype(df[col].dtype)
+    return big
+
+
+def measure(fn, iterations: int, warmup: int = 3, items: int = 1) -> dict:
+    """
+    Executa fn repetidamente e resume as latências.
+
+    Args:
+        fn: Função sem argumentos a medir
+        iterations: Repetições medidas
+        warmup: Repetições descartadas
+        items: Itens processados por chamada (para a vazão)
+
+    Returns:
+        Dicionário com p50/p95/p99 (ms) e vazão (itens/s)
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "iterations": iterations,
+        "items_per_call": items,
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "throughput_per_s": round(float(items * iterations / latencies.sum()), 2),
+    }
+
+
+# ---------- Benchmarks do preditor ----------
+
+def bench_predictor(args) -> dict:
+    from predict import HeartFailurePredictor, build_ensemble_model
+
+    df = load_dataset()
+    X = df.drop(columns=["DEATH_EVENT"]).to_numpy()
+    y = df["DEATH_EVENT"].to_numpy()
+    records = df.drop(columns=["DEATH_EVENT"]).to_dict("records")
+
+    results = {}
+    results["build_ensemble_model"] = measure(
+        lambda: build_ensemble_model(X, y), max(3, args.iterations // 100), warmup=1
+    )
+
+    predictor = HeartFailurePredictor(build_ensemble_model(X, y), model_version="bench")
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, len(records), size=args.iterations + 10)
+    it = iter(picks)
+
+    results["prepare_data"] = measure(lambda: predictor.prepare_data(records[next(it)]), args.iterations)
+    it = iter(picks)
+    results["predict"] = measure(lambda: predictor.predict(records[next(it)]), args.iterations)
+
+    batch = load_dataset(args.scale).drop(columns=["DEATH_EVENT"]).to_dict("records")
+    results["predict_batch"] = measure(
+        lambda: predictor.predict_batch(batch), max(3, args.iterations // 100), items=len(batch)
+    )
+    return results
+
+
+# ---------- Benchmarks da API (MinIO simulado + SQLite) ----------
+
+def bench_api(args) -> dict:
+    from moto import mock_aws
+
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    os.environ.update({
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "S3_BUCKET": "dados-analise",
+        "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+        "MODEL_CACHE_DIR": f"{tmp}/model_cache",
+    })
+    os.environ.pop("S3_ENDPOINT_URL", None)
+
+    with mock_aws():
+        import httpx
+        from fastapi.testclient import TestClient
+        import main
+
+        df = load_dataset()
+        records = df.drop(columns=["DEATH_EVENT"]).to_dict("records")
+        csv_body = load_dataset(args.scale).to_csv(index=False).encode()
+
+        results = {}
+        with TestClient(main.app) as client:
+            # A inicialização roda em segundo plano: mede só com a API pronta
+            deadline = time.perf_counter() + 120
+            while client.get("/health/ready").status_code != 200:
+                assert time.perf_counter() < deadline, client.get("/health/ready").text
+                time.sleep(0.05)
+            # Objetos da inicialização (moto, modelo, módulos importados) fora
+            # do coletor: as coletas completas sobre esse heap (~60 ms, a maior
+            # parte do moto, que não existe em produção) caíam em ~5% das
+            # medições e deixavam o p95 dos casos da API instável
+            gc.collect()
+            gc.freeze()
+            # Leituras distintas para não medir só o cache de predições
+            rng = np.random.default_rng(1)
+            def telemetry():
+                record = dict(records[rng.integers(len(records))])
+                record["age"] = float(record["age"]) + float(rng.random())
+                resp = client.post("/enviarDadosThingsBoard", json=record)
+                assert resp.status_code == 200, resp.text
+            results["api_enviarDadosThingsBoard"] = measure(telemetry, args.iterations)
+
+            # Mesma leitura com a explicação por feature na resposta
+            def telemetry_explained():
+                record = dict(records[rng.integers(len(records))])
+                record["age"] = float(record["age"]) + float(rng.random())
+                resp = client.post("/enviarDadosThingsBoard", params={"explain": "true"}, json=record)
+                assert resp.status_code == 200 and "explanation" in resp.json(), resp.text
+            results["api_enviarDadosThingsBoard_explain"] = measure(telemetry_explained, args.iterations)
+
+            # Dispositivos simultâneos: as predições unitárias são agrupadas
+            # (MicroBatcher). Requisições ASGI diretas, sem threads no cliente
+            concurrent = 32
+            async def post_concurrent():
+                transport = httpx.ASGITransport(app=main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as aclient:
+                    return await asyncio.gather(*[
+                        aclient.post("/enviarDadosThingsBoard",
+                                     json={**records[rng.integers(len(records))], "age": float(rng.random() * 100)})
+                        for _ in range(concurrent)
+                    ])
+            def telemetry_concurrent():
+                for resp in asyncio.run(post_concurrent()):
+                    assert resp.status_code == 200, resp.text
+            results["api_enviarDadosThingsBoard_concurrent"] = measure(
+                telemetry_concurrent, max(3, args.iterations // 5), items=concurrent
+            )
+
+            lote = json.dumps(load_dataset(args.scale).drop(columns=["DEATH_EVENT"]).to_dict("records"))
+            n_lote = len(df) * max(args.scale, 1)
+            def predizer_lote():
+                resp = client.post("/predizerLote", content=lote,
+                                   headers={"content-type": "application/json"})
+                assert resp.status_code == 200, resp.text
+            results["api_predizerLote"] = measure(
+                predizer_lote, max(3, args.iterations // 20), items=n_lote
+            )
+
+            def enviar_dados():
+                resp = client.post("/enviarDados", params={"mode": "replace"},
+                                   files={"file": ("bench.csv", csv_body, "text/csv")})
+                assert resp.status_code == 200 and resp.json()["status"] == "ok", resp.text
+            results["api_enviarDados"] = measure(
+                enviar_dados, max(3, args.iterations // 20), items=n_lote
+            )
+    return results
+
+
+# ---------- Comparação com o baseline ----------
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara p95 e vazão com o baseline.
+
+    Benchmarks sem entrada no baseline não têm como ser comparados e são
+    avisados (rode com --update-baseline ao adicionar um benchmark).
+
+    Returns:
+        Lista de mensagens de regressão (vazia se tudo OK)
+    """
+    regressions = []
+    for name, current in results.items():
+        ref = baseline.get(name)
+        if ref is None:
+            print(f"⚠️  {name}: sem baseline (não comparado)")
+            continue
+        if current["p95_ms"] > ref["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']:.3f} ms > baseline {ref['p95_ms']:.3f} ms")
+        if current["throughput_per_s"] < ref["throughput_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: vazão {current['throughput_per_s']:.1f}/s < baseline {ref['throughput_per_s']:.1f}/s"
+            )
+    return regressions
+
+
+def print_table(results: dict, baseline: dict) -> None:
+    print("\n" + "=" * 96)
+    print(f"{'Benchmark':<30} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} {'vazão/s':>14} {'Δ p95':>8}")
+    print("=" * 96)
+    for name, r in results.items():
+        ref = baseline.get(name)
+        delta = f"{(r['p95_ms'] / ref['p95_ms'] - 1) * 100:+.0f}%" if ref and ref["p95_ms"] else "-"
+        print(f"{name:<30} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{r['throughput_per_s']:>14.1f} {delta:>8}")
+    print("=" * 96 + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de predição e ingestão")
+    parser.add_argument("--iterations", type=int, default=500, help="repetições por benchmark")
+    parser.add_argument("--scale", type=int, default=10, help="fator de ampliação do dataset nos lotes")
+    parser.add_argument("--only", choices=["predictor", "api"], help="roda só um grupo")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="regressão tolerada (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="grava os resultados como baseline")
+    parser.add_argument("--output", type=Path, help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.disable(logging.INFO)
+
+    results = {}
+    if args.only in (None, "predictor"):
+        results.update(bench_predictor(args))
+    if args.only in (None, "api"):
+        results.update(bench_api(args))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    config = {"iterations": args.iterations, "scale": args.scale}
+    if baseline.get("_config", config) != config:
+        print(f"⚠️  Baseline gerado com {baseline['_config']}, execução atual com {config}")
+    print_table(results, baseline)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.update_baseline:
+        baseline.update(results)
+        baseline["_config"] = config
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline atualizado: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for msg in regressions:
+        print(f"❌ {msg}")
+    if not regressions:
+        print("✅ Nenhuma regressão em relação ao baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
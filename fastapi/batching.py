@@ -0,0 +1,261 @@
+import os
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+import logging
+
+from executors import INFERENCE_TIMEOUT, INFERENCE_WORKERS, StageTimeout, inference_executor, run_stage
+from metrics import BATCH_SIZE, SHED_REQUESTS, STAGE_ERRORS, observe_stage
+
+logger = logging.getLogger(__name__)
+
+# Agrupa as predições unitárias concorrentes (desligar: INFERENCE_BATCHING=0)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "1") == "1"
+# Registros por avaliação e espera máxima (s) para completar um lote
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT = float(os.getenv("BATCH_MAX_WAIT", "0.002"))
+# Orçamento de latência (s) da fila: acima dele, novas predições são recusadas
+BATCH_LATENCY_BUDGET = float(os.getenv("BATCH_LATENCY_BUDGET", "0.5"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "4096"))
+
+
+class Overloaded(Exception):
+    """Predição recusada: a espera estimada excede o orçamento de latência."""
+
+    def __init__(self, expected: float, budget: float):
+        self.expected = expected
+        self.budget = budget
+        super().__init__(f"Fila de inferência acima do orçamento ({expected * 1000:.0f} ms > {budget * 1000:.0f} ms)")
+
+
+class _Entry:
+    __slots__ = ("predictor", "values", "key", "future", "enqueued")
+
+    def __init__(self, predictor, values, key, future, enqueued):
+        self.predictor = predictor
+        self.values = values
+        self.key = key
+        self.future = future
+        self.enqueued = enqueued
+
+
+class MicroBatcher:
+    """
+    Agrupa predições unitárias concorrentes numa única avaliação vetorizada.
+
+    Cada requisição entra numa fila do event loop e recebe um Future. Um
+    lote é despachado para o pool de inferência quando há worker livre e:
+
+    - nenhum lote está em execução (carga baixa: sai na hora, sem espera);
+    - a fila tem ``max_batch`` registros; ou
+    - o registro mais antigo esperou ``max_wait`` segundos.
+
+    Com os workers ocupados os registros se acumulam, então o tamanho dos
+    lotes acompanha a carga. Cada lote é avaliado com ``predict_rows`` (uma
+    passada do ensemble por preditor/slot presente no lote) e cada chamador
+    recebe o seu resultado, no mesmo formato de ``predict``.
+
+    Controle de admissão: a espera estimada na fila (rodadas de lotes à
+    frente × duração média de um lote) acima de ``budget`` recusa a
+    predição com ``Overloaded``, e
+    registros que já esperaram mais que ``budget`` são descartados no
+    despacho (o chamador provavelmente desistiu).
+    """
+
+    def __init__(self, executor=inference_executor, workers: int = INFERENCE_WORKERS,
+                 max_batch: int = BATCH_MAX_SIZE, max_wait: float = BATCH_MAX_WAIT,
+                 budget: float = BATCH_LATENCY_BUDGET, max_queue: int = BATCH_MAX_QUEUE,
+                 timeout: float = INFERENCE_TIMEOUT, enabled: bool = INFERENCE_BATCHING):
+        """
+        Args:
+            executor: Pool onde os lotes são avaliados
+            workers: Lotes avaliados ao mesmo tempo (threads do pool)
+            max_batch: Registros por lote
+            max_wait: Espera máxima (s) para completar um lote
+            budget: Orçamento de latência (s) da fila
+            max_queue: Limite de registros na fila
+            timeout: Espera máxima (s) do chamador pelo resultado
+            enabled: False = cada predição roda sozinha (``run_stage``)
+        """
+        self.executor = executor
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.budget = budget
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.enabled = enabled
+        self._pending: Deque[_Entry] = deque()
+        self._inflight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Duração média (EWMA) de um lote, usada na estimativa de espera
+        self._batch_seconds: Optional[float] = None
+        self.batches = 0
+        self.batched = 0
+        self.cache_hits = 0
+        self.rejected = 0
+        self.expired = 0
+
+    @property
+    def depth(self) -> int:
+        """Registros aguardando um lote."""
+        return len(self._pending)
+
+    def expected_wait(self) -> float:
+        """Espera estimada (s) na fila de um registro que entrasse agora."""
+        if self._batch_seconds is None:
+            return 0.0
+        # Rodadas de lotes (em execução + completos na fila) antes do seu
+        rounds = (self._inflight + len(self._pending) // self.max_batch) // self.workers
+        return rounds * self._batch_seconds
+
+    async def predict(self, predictor, values: Sequence[float]) -> Dict[str, Any]:
+        """
+        Prediz um registro, agrupado com as demais predições concorrentes.
+
+        Args:
+            predictor: HeartFailurePredictor do slot roteado
+            values: Features na ordem de ``feature_names``
+
+        Returns:
+            Resultado no formato de ``predict``
+
+        Raises:
+            Overloaded: Fila acima do orçamento de latência
+            StageTimeout: Resultado não chegou em ``timeout`` segundos
+        """
+        if not self.enabled:
+            return await run_stage("inference", self.executor, self.timeout,
+                                   predictor.predict_values, values)
+
+        # Acertos do cache não entram na fila
+        key, cached = predictor.cached(values)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        expected = self.expected_wait()
+        if len(self._pending) >= self.max_queue or expected > self.budget:
+            self.rejected += 1
+            SHED_REQUESTS.labels("admission").inc()
+            raise Overloaded(expected, self.budget)
+
+        loop = asyncio.get_running_loop()
+        enqueued = time.perf_counter()
+        future = loop.create_future()
+        self._pending.append(_Entry(predictor, values, key, future, enqueued))
+        self._schedule()
+        try:
+            # Em caso de timeout o Future é cancelado e sai do próximo lote
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            STAGE_ERRORS.labels("inference").inc()
+            logger.error("Timeout na etapa 'inference' (%ss)", self.timeout)
+            raise StageTimeout("inference", self.timeout)
+        except Exception:
+            STAGE_ERRORS.labels("inference").inc()
+            raise
+        finally:
+            observe_stage("inference", time.perf_counter() - enqueued)
+
+    def _schedule(self) -> None:
+        while self._pending and self._inflight < self.workers:
+            waited = time.perf_counter() - self._pending[0].enqueued
+            if self._inflight and len(self._pending) < self.max_batch and waited < self.max_wait:
+                # Há lote em execução: espera o lote encher (até max_wait)
+                if self._timer is None:
+                    loop = asyncio.get_running_loop()
+                    self._timer = loop.call_later(self.max_wait - waited, self._on_timer)
+                return
+            self._dispatch()
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._schedule()
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.perf_counter()
+        batch: List[_Entry] = []
+        while self._pending and len(batch) < self.max_batch:
+            entry = self._pending.popleft()
+            if entry.future.done():
+                continue  # o chamador desistiu (timeout)
+            if now - entry.enqueued > self.budget:
+                self.expired += 1
+                SHED_REQUESTS.labels("expired").inc()
+                entry.future.set_exception(Overloaded(now - entry.enqueued, self.budget))
+                continue
+            observe_stage("batch_wait", now - entry.enqueued)
+            batch.append(entry)
+        if not batch:
+            return
+
+        BATCH_SIZE.observe(len(batch))
+        self._inflight += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._run, batch)
+        future.add_done_callback(lambda f: self._done(f, batch, now))
+
+    @staticmethod
+    def _run(batch: List[_Entry]) -> List[Any]:
+        # Uma avaliação por preditor presente no lote (slots diferentes)
+        groups: Dict[int, List[int]] = {}
+        for i, entry in enumerate(batch):
+            groups.setdefault(id(entry.predictor), []).append(i)
+
+        results: List[Any] = [None] * len(batch)
+        for idx in groups.values():
+            predictor = batch[idx[0]].predictor
+            try:
+                out = predictor.predict_rows([batch[i].values for i in idx],
+                                             [batch[i].key for i in idx])
+            except Exception:
+                # Isola o registro com problema: os demais do lote não falham junto
+                out = []
+                for i in idx:
+                    try:
+                        out.append(predictor.predict_values(batch[i].values))
+                    except Exception as e:
+                        out.append(e)
+            for i, result in zip(idx, out):
+                results[i] = result
+        return results
+
+    def _done(self, future: "asyncio.Future", batch: List[_Entry], started: float) -> None:
+        self._inflight -= 1
+        elapsed = time.perf_counter() - started
+        self._batch_seconds = elapsed if self._batch_seconds is None else 0.8 * self._batch_seconds + 0.2 * elapsed
+        self.batches += 1
+        self.batched += len(batch)
+
+        error = future.exception()
+        for i, entry in enumerate(batch):
+            if entry.future.done():
+                continue
+            result = error if error is not None else future.result()[i]
+            if isinstance(result, Exception):
+                entry.future.set_exception(result)
+            else:
+                entry.future.set_result(result)
+        self._schedule()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores do agrupamento e do controle de admissão."""
+        return {
+            "enabled": self.enabled,
+            "depth": self.depth,
+            "inflight": self._inflight,
+            "max_batch": self.max_batch,
+            "max_wait": self.max_wait,
+            "budget": self.budget,
+            "batches": self.batches,
+            "mean_batch": round(self.batched / self.batches, 2) if self.batches else 0.0,
+            "batch_seconds": round(self._batch_seconds, 6) if self._batch_seconds else None,
+            "cache_hits": self.cache_hits,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
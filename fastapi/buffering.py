@@ -0,0 +1,222 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, List, Optional, Tuple
+import logging
+
+from metrics import stage_timer
+from resources import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Recebe os registros recusados, cada um com o erro da sua gravação
+RejectHandler = Callable[[List[Tuple[Any, Exception]]], None]
+
+
+class BufferedWriter(ABC):
+    """
+    Base para escritas write-behind.
+
+    Os registros são acumulados em memória por ``add`` (sem I/O no caminho
+    da requisição) e gravados em lote por uma thread de fundo quando o
+    buffer atinge ``max_records`` (ou ``max_bytes``, se a subclasse medir o
+    tamanho dos registros em ``_weigh``) ou a cada ``max_delay`` segundos. ``close``
+    faz o flush final no shutdown. Depois de falhas seguidas de escrita, o
+    intervalo entre flushes cresce com backoff exponencial (até
+    ``max_backoff``), para não martelar um banco/MinIO fora do ar.
+
+    Com ``isolate_failures``, um lote que falha é regravado em metades até
+    isolar os registros com problema: se alguma parte é gravada o destino
+    está no ar, e os registros que falham sozinhos são recusados (contados
+    em ``rejected`` e entregues a ``on_reject``) em vez de voltarem ao
+    buffer e travarem as gravações seguintes. Se nenhuma parte é gravada a
+    falha é tratada como transitória e o lote inteiro volta ao buffer.
+
+    Subclasses implementam apenas ``_write(batch)``.
+    """
+
+    def __init__(self, max_records: int = 500, max_delay: float = 1.0,
+                 max_pending: int = 100_000, name: str = "buffered-writer",
+                 max_bytes: Optional[int] = None, stage: Optional[str] = None,
+                 max_backoff: float = 30.0, isolate_failures: bool = False,
+                 on_reject: Optional[RejectHandler] = None):
+        """
+        Args:
+            max_records: Tamanho do buffer que dispara um flush imediato
+            max_delay: Intervalo máximo (s) entre flushes
+            max_pending: Limite de registros retidos após falhas de escrita
+            name: Nome da thread de flush
+            max_bytes: Volume (segundo ``_weigh``) que dispara um flush
+            stage: Etapa nas métricas de duração de cada escrita (padrão: ``name``)
+            max_backoff: Intervalo máximo (s) entre flushes após falhas
+            isolate_failures: Divide os lotes que falham para isolar os registros com problema
+            on_reject: Recebe os registros recusados e seus erros (ex.: dead-letter)
+        """
+        self.max_records = max_records
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.name = name
+        self.max_bytes = max_bytes
+        self.stage = stage or name
+        self.max_backoff = max_backoff
+        self.isolate_failures = isolate_failures
+        self.on_reject = on_reject
+        self.failures = 0
+        self.rejected = 0
+        self._buffer: List[Any] = []
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Inicia a thread de flush periódico."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def add(self, record: Any) -> None:
+        """Enfileira um registro para gravação."""
+        self.extend([record])
+
+    def extend(self, records: List[Any]) -> None:
+        """Enfileira vários registros de uma vez."""
+        size = sum(self._weigh(r) for r in records)
+        with self._lock:
+            self._buffer.extend(records)
+            self._bytes += size
+            full = len(self._buffer) >= self.max_records or (
+                self.max_bytes is not None and self._bytes >= self.max_bytes
+            )
+        if full:
+            self._wake.set()
+
+    @property
+    def depth(self) -> int:
+        """Quantidade de registros aguardando gravação."""
+        return len(self._buffer)
+
+    def flush(self) -> int:
+        """
+        Grava tudo o que está no buffer.
+
+        Em caso de falha (com ``isolate_failures``, só se nenhuma parte do
+        lote puder ser gravada), o lote volta para a frente do buffer
+        (respeitando ``max_pending``) e será tentado de novo no próximo flush.
+
+        Returns:
+            Quantidade de registros gravados
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._bytes = 0
+            if not batch:
+                return 0
+            try:
+                with stage_timer(self.stage):
+                    try:
+                        self._write(batch)
+                        written, rejected = len(batch), []
+                    except Exception:
+                        if not self.isolate_failures or len(batch) == 1:
+                            raise
+                        written, rejected = self._isolate(batch)
+                self.failures = 0
+                if rejected:
+                    self._reject(rejected)
+                return written
+            except Exception as e:
+                self.failures += 1
+                logger.error("[%s] Falha ao gravar lote de %d registros: %s", self.name, len(batch), e)
+                with self._lock:
+                    self._buffer = batch + self._buffer
+                    excess = len(self._buffer) - self.max_pending
+                    if excess > 0:
+                        # Descarta os mais antigos para limitar a memória
+                        del self._buffer[:excess]
+                        self.dropped += excess
+                        logger.error("[%s] %d registros descartados (buffer cheio)", self.name, excess)
+                    self._bytes = sum(self._weigh(r) for r in self._buffer)
+                return 0
+
+    def _isolate(self, batch: List[Any]) -> Tuple[int, List[Tuple[Any, Exception]]]:
+        """
+        Regrava um lote que falhou em metades, até registros individuais.
+
+        Returns:
+            Tupla (registros gravados, [(registro recusado, erro)])
+
+        Raises:
+            Exception: Nenhuma das metades foi gravada (falha transitória)
+        """
+        mid = len(batch) // 2
+        written, failed, error = 0, [], None
+        for part in (batch[:mid], batch[mid:]):
+            try:
+                self._write(part)
+                written += len(part)
+            except Exception as e:
+                failed.append((part, e))
+                error = e
+        if not written:
+            raise error
+
+        rejected = []
+        while failed:
+            part, error = failed.pop()
+            if len(part) == 1:
+                rejected.append((part[0], error))
+                continue
+            mid = len(part) // 2
+            for sub in (part[:mid], part[mid:]):
+                try:
+                    self._write(sub)
+                    written += len(sub)
+                except Exception as e:
+                    failed.append((sub, e))
+        return written, rejected
+
+    def _reject(self, rejected: List[Tuple[Any, Exception]]) -> None:
+        self.rejected += len(rejected)
+        logger.error("[%s] %d registros recusados pelo destino (ex.: %s)",
+                     self.name, len(rejected), rejected[0][1])
+        if self.on_reject is not None:
+            try:
+                self.on_reject(rejected)
+            except Exception as e:
+                logger.error("[%s] Falha ao entregar registros recusados: %s", self.name, e)
+
+    def close(self) -> None:
+        """Para a thread de fundo e faz o flush final."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self.failures:
+                # Em falha, nem o buffer cheio antecipa a próxima tentativa
+                self._stop.wait(max(self.max_delay,
+                                    backoff_delay(self.failures, self.max_delay, self.max_backoff)))
+            else:
+                self._wake.wait(self.max_delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.flush()
+
+    def _weigh(self, record: Any) -> int:
+        """Tamanho de um registro para o limite ``max_bytes`` (0 = não mede)."""
+        return 0
+
+    @abstractmethod
+    def _write(self, batch: List[Any]) -> None:
+        """Grava um lote (levanta exceção em caso de falha)."""
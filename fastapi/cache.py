@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+# Casas decimais na canonicalização (leituras quase idênticas caem na mesma
+# chave e recebem o resultado da primeira: o cache é aproximado nessa precisão)
+PREDICTION_CACHE_DECIMALS = int(os.getenv("PREDICTION_CACHE_DECIMALS", "3"))
+
+
+def _clone(value: Any) -> Any:
+    # Cópia profunda só de dicts/listas (os resultados só têm escalares
+    # imutáveis nas folhas); bem mais barata que copy.deepcopy
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+class PredictionCache:
+    """
+    Cache LRU com TTL para resultados de predição.
+
+    A chave é o vetor das features canonicalizado (na ordem de
+    ``feature_names``, convertido para float e arredondado). O cache é
+    limpo automaticamente quando a versão do modelo muda.
+
+    Leituras que diferem só depois de ``decimals`` casas compartilham a
+    entrada: recebem a predição calculada para a primeira delas. Valores
+    do próprio registro guardados no resultado devem ser repostos por quem
+    lê (ex.: ``top[].value`` das explicações).
+
+    ``get`` e ``put`` copiam os dicionários e listas aninhados (ex.:
+    ``votes``): quem altera o resultado recebido não afeta o cache.
+    """
+
+    def __init__(self, feature_names: Sequence[str],
+                 max_size: int = PREDICTION_CACHE_SIZE,
+                 ttl: float = PREDICTION_CACHE_TTL,
+                 decimals: int = PREDICTION_CACHE_DECIMALS):
+        """
+        Args:
+            feature_names: Features que compõem a chave
+            max_size: Número máximo de entradas
+            ttl: Validade de cada entrada em segundos
+            decimals: Casas decimais usadas na canonicalização
+        """
+        self.feature_names = list(feature_names)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, data: Dict[str, Any]) -> Optional[tuple]:
+        """
+        Chave canônica do registro, ou None se não for canonicalizável.
+
+        Features ausentes valem 0, como em ``prepare_data``.
+        """
+        return self.key_values(data.get(f, 0) for f in self.feature_names)
+
+    def key_values(self, values: Iterable[Any]) -> Optional[tuple]:
+        """Como ``key``, para valores já na ordem de ``feature_names``."""
+        try:
+            # "+ 0.0" normaliza -0.0 para 0.0
+            return tuple(round(float(v), self.decimals) + 0.0 for v in values)
+        except (TypeError, ValueError):
+            return None
+
+    def _check_version(self, model_version: Any) -> None:
+        if model_version != self._model_version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info("Cache de predições invalidado (modelo %s -> %s)", self._model_version, model_version)
+            self._entries.clear()
+            self._model_version = model_version
+
+    def get(self, key: Optional[tuple], model_version: Any) -> Optional[Dict[str, Any]]:
+        """Resultado em cache para a chave, ou None (conta hit/miss)."""
+        if key is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(model_version)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _clone(entry[1])
+
+    def put(self, key: Optional[tuple], model_version: Any, result: Dict[str, Any]) -> None:
+        """Guarda um resultado, removendo o menos usado se o cache estiver cheio."""
+        if key is None or self.max_size <= 0:
+            return
+        with self._lock:
+            self._check_version(model_version)
+            self._entries[key] = (time.monotonic() + self.ttl, _clone(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove todas as entradas."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso do cache."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "model_version": self._model_version,
+        }
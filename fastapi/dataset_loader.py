@@ -0,0 +1,278 @@
+import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.fs as pafs
+import pyarrow.ipc as ipc
+import pyarrow.json as pajson
+from sqlalchemy import Float, Integer, SmallInteger
+import logging
+
+from schema import dados_analise
+
+logger = logging.getLogger(__name__)
+
+# Mesmo prefixo do SegmentWriter (segments.py não é importado aqui: traria
+# buffering/metrics para os notebooks, que só leem os segmentos)
+SEGMENT_PREFIX = os.getenv("SEGMENT_PREFIX", "telemetria")
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "/tmp/dataset_cache")
+# Downloads simultâneos (cabe no pool de conexões do cliente S3)
+DATASET_WORKERS = int(os.getenv("DATASET_WORKERS", "8"))
+# Folga (s) após o fim de um dia (UTC) para considerá-lo encerrado e não
+# listá-lo mais. O SegmentWriter particiona pelo instante de ingestão e
+# reenvia com backoff enquanto o MinIO estiver fora: a folga precisa cobrir
+# SEGMENT_INTERVAL mais a maior indisponibilidade que se quer tolerar
+DATASET_CLOSE_MARGIN = float(os.getenv("DATASET_CLOSE_MARGIN", str(6 * 3600)))
+
+MANIFEST_FILE = "manifest.json"
+
+_ARROW_TYPES = {Float: pa.float64(), SmallInteger: pa.int16(), Integer: pa.int32()}
+
+# Mesmo esquema tipado da tabela dados_analise (schema.py)
+SEGMENT_SCHEMA = pa.schema(
+    [(c.name, _ARROW_TYPES[type(c.type)]) for c in dados_analise.columns if c.name != "ingested_at"]
+    + [("ingested_at", pa.timestamp("us", tz="UTC"))]
+)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class DatasetLoader:
+    """
+    Leitura dos dados do MinIO para treino e análise, sem listar o bucket inteiro.
+
+    - Segmentos de telemetria (``<prefixo>/dt=AAAA-MM-DD/hour=HH/...``,
+      gravados pelo SegmentWriter): o manifesto local guarda os segmentos
+      já vistos por dia. Dias encerrados e já listados não são listados de
+      novo; só o dia corrente (ou dias sem manifesto) é relistado, com
+      paginação e restrito ao prefixo do dia.
+    - Downloads em paralelo para um cache em disco (escrita atômica); cada
+      segmento NDJSON é convertido uma única vez para Arrow IPC com o
+      esquema tipado de dados_analise.
+    - ``dataset`` devolve um ``pyarrow.dataset.Dataset`` lido sob demanda
+      (lotes/colunas) com mmap dos arquivos do cache.
+    - ``latest_upload``/``fetch_object``: CSVs enviados por /enviarDados
+      (raiz do bucket), com listagem paginada e cache por ETag.
+    """
+
+    def __init__(self, s3, bucket: str, prefix: str = SEGMENT_PREFIX,
+                 cache_dir: str = DATASET_CACHE_DIR, workers: int = DATASET_WORKERS,
+                 close_margin: float = DATASET_CLOSE_MARGIN):
+        """
+        Args:
+            s3: Cliente boto3 S3 (MinIO)
+            bucket: Bucket dos dados
+            prefix: Prefixo dos segmentos de telemetria
+            cache_dir: Diretório do cache local e do manifesto
+            workers: Downloads simultâneos
+            close_margin: Folga (s) após o fim do dia para não relistá-lo
+        """
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache_dir = Path(cache_dir) / bucket
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.close_margin = close_margin
+        self._lock = threading.Lock()
+
+    # ---------- manifesto ----------
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            return json.loads((self.cache_dir / MANIFEST_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return {"days": {}}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        _atomic_write(self.cache_dir / MANIFEST_FILE, json.dumps(manifest).encode())
+
+    def _paginate(self, **kwargs) -> Iterable[Dict[str, Any]]:
+        paginator = self.s3.get_paginator("list_objects_v2")
+        yield from paginator.paginate(Bucket=self.bucket, **kwargs)
+
+    def _list_days(self) -> List[str]:
+        """Dias com partição (só os prefixos ``dt=``, não os objetos)."""
+        days = []
+        for page in self._paginate(Prefix=f"{self.prefix}/", Delimiter="/"):
+            for common in page.get("CommonPrefixes", []):
+                name = common["Prefix"].rstrip("/").rsplit("/", 1)[-1]
+                if name.startswith("dt="):
+                    days.append(name[3:])
+        return sorted(days)
+
+    def refresh(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Atualiza o manifesto dos segmentos entre ``start`` e ``end`` (inclusive).
+
+        Sem ``start``, descobre os dias pelos prefixos ``dt=`` (listagem
+        com delimitador, uma entrada por dia) e considera também os dias já
+        no manifesto: o intervalo começa no dia mais antigo, como em
+        ``segments(None, end)``.
+
+        Returns:
+            {"listed_days": dias relistados, "segments": total no intervalo}
+        """
+        today = datetime.now(timezone.utc).date()
+        if start is None:
+            last = str(end) if end is not None else None
+            known = set(self._list_days()) | set(self._read_manifest()["days"])
+            days = sorted(d for d in known if last is None or d <= last)
+        else:
+            end = end or today
+            days = [str(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+
+        with self._lock:
+            manifest = self._read_manifest()
+            listed = 0
+            for day in days:
+                # Dia encerrado se a listagem começou depois do fim do dia
+                # mais a folga: nenhum flush atrasado chega depois disso
+                listed_at = datetime.now(timezone.utc)
+                day_end = datetime.combine(date.fromisoformat(day) + timedelta(days=1),
+                                           datetime.min.time(), timezone.utc)
+                entry = manifest["days"].get(day)
+                if entry is not None and entry.get("complete"):
+                    continue
+                segments = {}
+                for page in self._paginate(Prefix=f"{self.prefix}/dt={day}/"):
+                    for obj in page.get("Contents", []):
+                        segments[obj["Key"]] = {"size": obj["Size"], "etag": obj["ETag"].strip('"')}
+                closed = listed_at >= day_end + timedelta(seconds=self.close_margin)
+                manifest["days"][day] = {"complete": closed, "listed_at": listed_at.isoformat(),
+                                         "segments": segments}
+                listed += 1
+            if listed:
+                self._write_manifest(manifest)
+        total = sum(len(manifest["days"].get(d, {}).get("segments", {})) for d in days)
+        logger.info("Manifesto: %d dias relistados, %d segmentos", listed, total)
+        return {"listed_days": listed, "segments": total}
+
+    def segments(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Dict[str, Any]]:
+        """Segmentos do manifesto no intervalo de dias (sem acessar o MinIO)."""
+        manifest = self._read_manifest()
+        selected = {}
+        for day, entry in manifest["days"].items():
+            d = datetime.fromisoformat(day).date()
+            if (start is None or d >= start) and (end is None or d <= end):
+                selected.update(entry["segments"])
+        return selected
+
+    # ---------- cache ----------
+
+    def _local_path(self, key: str, etag: str, suffix: str) -> Path:
+        # O ETag no nome invalida o cache se o objeto for sobrescrito
+        safe = key.replace("/", "__")
+        return self.cache_dir / "objects" / f"{safe}.{etag}{suffix}"
+
+    def _download(self, key: str, etag: str) -> Path:
+        path = self._local_path(key, etag, "")
+        if path.exists():
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+        os.close(fd)
+        try:
+            self.s3.download_file(self.bucket, key, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        return path
+
+    def _segment_arrow(self, key: str, etag: str) -> Path:
+        """Baixa um segmento NDJSON e o converte (uma vez) para Arrow IPC."""
+        target = self._local_path(key, etag, ".arrow")
+        if target.exists():
+            return target
+        raw = self._download(key, etag)
+        compression = "gzip" if key.endswith(".gz") else None
+        table = pajson.read_json(
+            pa.input_stream(str(raw), compression=compression),
+            parse_options=pajson.ParseOptions(explicit_schema=SEGMENT_SCHEMA,
+                                              unexpected_field_behavior="ignore"),
+        )
+        fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".part")
+        os.close(fd)
+        # Sem compressão: o arquivo é lido com mmap, sem cópia
+        with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, SEGMENT_SCHEMA) as writer:
+            writer.write_table(table)
+        os.replace(tmp, target)
+        # O NDJSON bruto não é mais necessário
+        raw.unlink(missing_ok=True)
+        return target
+
+    def fetch(self, segments: Dict[str, Dict[str, Any]]) -> List[Path]:
+        """
+        Garante os segmentos no cache local, baixando os que faltam em paralelo.
+
+        Returns:
+            Caminhos dos arquivos Arrow IPC, na ordem das chaves
+        """
+        keys = sorted(segments)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dataset") as pool:
+            return list(pool.map(lambda k: self._segment_arrow(k, segments[k]["etag"]), keys))
+
+    # ---------- leitura ----------
+
+    def dataset(self, start: Optional[date] = None, end: Optional[date] = None,
+                refresh: bool = True) -> pads.Dataset:
+        """
+        Dataset colunar dos segmentos de telemetria no intervalo de dias.
+
+        Os arquivos são mapeados em memória; ``to_table(columns=...)``,
+        ``to_batches()`` ou ``scanner(filter=...)`` leem só o necessário.
+
+        Args:
+            start: Primeiro dia (inclusive); None = desde o início
+            end: Último dia (inclusive); None = até hoje
+            refresh: Atualiza o manifesto antes (False = usa só o cache)
+
+        Returns:
+            pyarrow.dataset.Dataset com o esquema de dados_analise
+        """
+        if refresh:
+            self.refresh(start, end)
+        paths = self.fetch(self.segments(start, end))
+        return pads.dataset([str(p) for p in paths], schema=SEGMENT_SCHEMA, format="ipc",
+                            filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+    def to_pandas(self, start: Optional[date] = None, end: Optional[date] = None,
+                  columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Atalho: segmentos do intervalo como DataFrame (apenas ``columns``, se informado)."""
+        return self.dataset(start, end).to_table(columns=columns).to_pandas()
+
+    def latest_upload(self, suffix: str = ".csv") -> Optional[Dict[str, Any]]:
+        """
+        Objeto mais recente na raiz do bucket (uploads de /enviarDados).
+
+        A listagem é paginada e usa delimitador, então os segmentos de
+        telemetria (em subprefixos) não são percorridos.
+
+        Returns:
+            {"Key", "ETag", "LastModified", "Size"} ou None
+        """
+        latest = None
+        for page in self._paginate(Delimiter="/"):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(suffix) and (latest is None or obj["LastModified"] > latest["LastModified"]):
+                    latest = obj
+        return latest
+
+    def fetch_object(self, key: str) -> Path:
+        """Baixa um objeto para o cache (reaproveitado enquanto o ETag não mudar)."""
+        etag = self.s3.head_object(Bucket=self.bucket, Key=key)["ETag"].strip('"')
+        return self._download(key, etag)
@@ -0,0 +1,545 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import logging
+
+from buffering import BufferedWriter
+from predict import FEATURE_NAMES
+from reference import DRIFT_QUANTILES, quantile_label, reference_profile
+
+logger = logging.getLogger(__name__)
+
+# Monitor de drift sobre a telemetria predita (desligar: DRIFT_MONITOR=0)
+DRIFT_MONITOR = os.getenv("DRIFT_MONITOR", "1") == "1"
+# Linhas por incorporação que entram no P² (amostra uniforme acima disso:
+# o P² é sequencial e limita o custo de CPU sob carga alta)
+DRIFT_QUANTILE_ROWS = int(os.getenv("DRIFT_QUANTILE_ROWS", "256"))
+# Intervalo (s) entre incorporações dos registros pendentes nos esboços
+DRIFT_UPDATE_INTERVAL = float(os.getenv("DRIFT_UPDATE_INTERVAL", "1"))
+# Intervalo (s) entre snapshots: a janela corrente é gravada e reiniciada
+DRIFT_SNAPSHOT_INTERVAL = float(os.getenv("DRIFT_SNAPSHOT_INTERVAL", "300"))
+DRIFT_PREFIX = os.getenv("DRIFT_PREFIX", "drift")
+# Perfil de referência alternativo: CSV do treino ou JSON de reference_profile
+DRIFT_REFERENCE = os.getenv("DRIFT_REFERENCE", "")
+# Limiares de PSI (moderado / drift) e registros mínimos para avaliar
+DRIFT_PSI_WARN = float(os.getenv("DRIFT_PSI_WARN", "0.1"))
+DRIFT_PSI_ALERT = float(os.getenv("DRIFT_PSI_ALERT", "0.25"))
+DRIFT_MIN_RECORDS = int(os.getenv("DRIFT_MIN_RECORDS", "100"))
+# Registros aguardando incorporação (acima disso, novas leituras são descartadas)
+DRIFT_MAX_PENDING = int(os.getenv("DRIFT_MAX_PENDING", "50000"))
+DRIFT_KEEP_SNAPSHOTS = int(os.getenv("DRIFT_KEEP_SNAPSHOTS", "24"))
+
+# Proporção mínima por faixa no PSI (evita log(0) em faixas vazias)
+_PSI_FLOOR = 1e-4
+
+
+def load_reference(path: str) -> Dict[str, Any]:
+    """
+    Carrega o perfil de referência de um JSON (``reference_profile``) ou do CSV de treino.
+
+    Args:
+        path: Caminho do arquivo (.json ou .csv com FEATURE_NAMES e, opcionalmente, DEATH_EVENT)
+    """
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    y = df["DEATH_EVENT"].to_numpy() if "DEATH_EVENT" in df.columns else None
+    return reference_profile(df[FEATURE_NAMES].to_numpy(dtype=np.float64), y)
+
+
+def psi(live: np.ndarray, expected: np.ndarray) -> float:
+    """Population Stability Index entre proporções observadas e de referência."""
+    live = np.maximum(live, _PSI_FLOOR)
+    expected = np.maximum(expected, _PSI_FLOOR)
+    return float(np.sum((live - expected) * np.log(live / expected)))
+
+
+class P2Quantiles:
+    """
+    Estimador P² (Jain & Chlamtac) de vários quantis de várias séries.
+
+    Cinco marcadores por (quantil, série), atualizados a cada observação
+    com interpolação parabólica: memória constante, sem guardar os
+    valores. Todas as séries e quantis avançam juntos em arrays NumPy
+    (uma linha de marcadores por par quantil × feature).
+    """
+
+    _CELLS = np.arange(5)
+
+    def __init__(self, n_series: int, probabilities: Sequence[float]):
+        """
+        Args:
+            n_series: Séries observadas (features)
+            probabilities: Quantis estimados (ex.: 0.5 = mediana)
+        """
+        self.n_series = n_series
+        self.probabilities = list(probabilities)
+        p = np.repeat(np.asarray(self.probabilities, dtype=np.float64), n_series)
+        self._desired = np.stack([np.ones_like(p), 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, np.full_like(p, 5.0)], axis=1)
+        self._increment = np.stack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)], axis=1)
+        self._positions = np.tile(np.arange(1.0, 6.0), (len(p), 1))
+        self._heights: Optional[np.ndarray] = None
+        self._first: List[np.ndarray] = []
+
+    def update(self, X: np.ndarray) -> None:
+        """Incorpora as linhas de ``X`` (n, n_series), em ordem."""
+        for row in np.tile(X, (1, len(self.probabilities))):
+            self._add(row)
+
+    def _add(self, x: np.ndarray) -> None:
+        if self._heights is None:
+            # As cinco primeiras observações são os marcadores iniciais
+            self._first.append(x)
+            if len(self._first) == 5:
+                self._heights = np.sort(np.array(self._first), axis=0).T.copy()
+                self._first = []
+            return
+
+        q, n = self._heights, self._positions
+        cell = (x[:, None] >= q[:, 1:4]).sum(axis=1)
+        np.minimum(q[:, 0], x, out=q[:, 0])
+        np.maximum(q[:, 4], x, out=q[:, 4])
+        n += self._CELLS > cell[:, None]
+        self._desired += self._increment
+
+        for i in (1, 2, 3):
+            d = self._desired[:, i] - n[:, i]
+            up = (d >= 1) & (n[:, i + 1] - n[:, i] > 1)
+            down = (d <= -1) & (n[:, i - 1] - n[:, i] < -1)
+            idx = np.flatnonzero(up | down)
+            if not len(idx):
+                continue
+            s = np.where(up[idx], 1.0, -1.0)
+            qi, qm, qp = q[idx, i], q[idx, i - 1], q[idx, i + 1]
+            ni, nm, np_ = n[idx, i], n[idx, i - 1], n[idx, i + 1]
+            parabolic = qi + s / (np_ - nm) * ((ni - nm + s) * (qp - qi) / (np_ - ni)
+                                               + (np_ - ni - s) * (qi - qm) / (ni - nm))
+            # Fora dos vizinhos: ajuste linear em direção ao marcador vizinho
+            qj = np.where(s > 0, qp, qm)
+            nj = np.where(s > 0, np_, nm)
+            linear = qi + s * (qj - qi) / (nj - ni)
+            q[idx, i] = np.where((qm < parabolic) & (parabolic < qp), parabolic, linear)
+            n[idx, i] += s
+
+    def values(self) -> Optional[np.ndarray]:
+        """Estimativas (n_quantis, n_series), ou None sem observações."""
+        if self._heights is not None:
+            return self._heights[:, 2].reshape(len(self.probabilities), self.n_series)
+        if not self._first:
+            return None
+        # Menos de cinco observações: quantis exatos
+        first = np.array(self._first)[:, :self.n_series]
+        return np.quantile(first, self.probabilities, axis=0)
+
+
+class StreamingStats:
+    """
+    Esboços de memória constante de um período de registros preditos.
+
+    - média/variância por Welford, incorporadas por lote com a fórmula de
+      Chan (a mesma do ``FeaturePreprocessor.partial_fit``), mínimo e máximo;
+    - quantis P² (opcional: ``quantiles``), sobre até ``DRIFT_QUANTILE_ROWS``
+      linhas por lote;
+    - histogramas nas faixas do perfil de referência;
+    - contagem de predições positivas e soma da probabilidade de óbito.
+    """
+
+    def __init__(self, reference: Optional[Dict[str, Any]] = None, quantiles: Sequence[float] = ()):
+        """
+        Args:
+            reference: Perfil de ``reference_profile``; as faixas dos
+                histogramas vêm dele (None ou sem faixas = sem histogramas)
+            quantiles: Quantis estimados com P² (vazio = nenhum)
+        """
+        n_features = len(FEATURE_NAMES)
+        edges = expected = None
+        if reference is not None and reference.get("edges") is not None:
+            edges = [np.asarray(e, dtype=np.float64) for e in reference["edges"]]
+            expected = [np.asarray(p, dtype=np.float64) for p in reference["proportions"]]
+        self.started = datetime.now(timezone.utc)
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.quantiles = P2Quantiles(n_features, quantiles) if quantiles else None
+        self._rng = np.random.default_rng()
+        self.edges = edges
+        self.expected = expected
+        self.histograms = None if edges is None else [np.zeros(len(e) + 1, dtype=np.int64) for e in edges]
+        self.predictions = 0
+        self.positives = 0
+        self.probability_sum = 0.0
+        self.probability_count = 0
+        self.invalid = 0
+
+    def update(self, X: np.ndarray, labels: np.ndarray, probabilities: np.ndarray) -> None:
+        """
+        Incorpora um lote.
+
+        Args:
+            X: Features (n, n_features); linhas com valores não finitos são ignoradas
+            labels: DEATH_EVENT predito (NaN = sem predição)
+            probabilities: Probabilidade de óbito (NaN = ausente)
+        """
+        finite = np.isfinite(X).all(axis=1)
+        self.invalid += int(len(X) - finite.sum())
+        X = X[finite]
+
+        n_b = len(X)
+        if n_b:
+            n_a = self.count
+            n = n_a + n_b
+            mean_b = X.mean(axis=0)
+            delta = mean_b - self.mean
+            self.mean = self.mean + delta * (n_b / n)
+            self.m2 = self.m2 + X.var(axis=0) * n_b + delta ** 2 * (n_a * n_b / n)
+            self.count = n
+            np.minimum(self.min, X.min(axis=0), out=self.min)
+            np.maximum(self.max, X.max(axis=0), out=self.max)
+            if self.quantiles is not None:
+                if n_b > DRIFT_QUANTILE_ROWS:
+                    # Amostra uniforme, na ordem de chegada
+                    keep = np.sort(self._rng.choice(n_b, DRIFT_QUANTILE_ROWS, replace=False))
+                    self.quantiles.update(X[keep])
+                else:
+                    self.quantiles.update(X)
+            if self.histograms is not None:
+                for j, inner in enumerate(self.edges):
+                    self.histograms[j] += np.bincount(np.searchsorted(inner, X[:, j], side="right"),
+                                                      minlength=len(inner) + 1)
+
+        predicted = labels[~np.isnan(labels)]
+        self.predictions += len(predicted)
+        self.positives += int((predicted == 1).sum())
+        probabilities = probabilities[~np.isnan(probabilities)]
+        self.probability_count += len(probabilities)
+        self.probability_sum += float(probabilities.sum())
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2 / self.count) if self.count else np.zeros_like(self.m2)
+
+    @property
+    def positive_rate(self) -> Optional[float]:
+        return self.positives / self.predictions if self.predictions else None
+
+    def psi(self) -> Optional[np.ndarray]:
+        """PSI por feature em relação às proporções de referência (None sem histogramas)."""
+        if self.histograms is None or not self.count:
+            return None
+        return np.array([psi(h / self.count, expected) for h, expected in zip(self.histograms, self.expected)])
+
+    def compare(self, reference: Optional[Dict[str, Any]], histograms: bool = False) -> Dict[str, Any]:
+        """
+        Estatísticas do período e drift em relação à referência.
+
+        Args:
+            reference: Perfil de ``reference_profile`` (ou só média/desvio)
+            histograms: Inclui as proporções por faixa (observadas e de referência)
+        """
+        std = self.std
+        scores = self.psi()
+        quantiles = self.quantiles.values() if self.quantiles is not None else None
+        enough = self.count >= DRIFT_MIN_RECORDS
+        features = {}
+        for j, name in enumerate(FEATURE_NAMES):
+            info: Dict[str, Any] = {"mean": None, "std": None, "min": None, "max": None}
+            if self.count:
+                info.update(mean=round(float(self.mean[j]), 6), std=round(float(std[j]), 6),
+                            min=float(self.min[j]), max=float(self.max[j]))
+            if quantiles is not None:
+                info["quantiles"] = {quantile_label(p): round(float(quantiles[k, j]), 6)
+                                     for k, p in enumerate(self.quantiles.probabilities)}
+            if reference is not None and self.count:
+                ref_std = reference["std"][j]
+                # Diferença de médias em desvios do treino
+                info["mean_shift"] = round((float(self.mean[j]) - reference["mean"][j]) / ref_std, 4) if ref_std else None
+            if scores is not None:
+                info["psi"] = round(float(scores[j]), 4)
+                info["status"] = _status(scores[j]) if enough else "insufficient_data"
+                if histograms:
+                    info["histogram"] = {
+                        "edges": list(self.edges[j]),
+                        "live": (self.histograms[j] / self.count).round(4).tolist(),
+                        "reference": reference["proportions"][j],
+                    }
+            features[name] = info
+
+        drifted = [] if scores is None or not enough else [
+            name for name, score in zip(FEATURE_NAMES, scores) if score >= DRIFT_PSI_ALERT]
+        return {
+            "started": self.started.isoformat(),
+            "records": self.count,
+            "invalid": self.invalid,
+            "status": _overall(scores, enough),
+            "max_psi": None if scores is None else round(float(scores.max()), 4),
+            "drifted": drifted,
+            "predictions": self.prediction_summary(reference),
+            "features": features,
+        }
+
+    def prediction_summary(self, reference: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Taxa de predições positivas e desvio em relação à taxa do treino."""
+        rate = self.positive_rate
+        info = {
+            "count": self.predictions,
+            "positive_rate": None if rate is None else round(rate, 4),
+            "mean_probability": round(self.probability_sum / self.probability_count, 4) if self.probability_count else None,
+        }
+        expected = None if reference is None else reference.get("positive_rate")
+        if expected is not None:
+            info["reference_rate"] = round(expected, 4)
+            if rate is not None:
+                info["shift"] = round(rate - expected, 4)
+                # Teste de proporção contra a taxa do treino
+                se = np.sqrt(expected * (1 - expected) / self.predictions)
+                info["z"] = round(float((rate - expected) / se), 3) if se else None
+        return info
+
+
+def _status(score: float) -> str:
+    if score >= DRIFT_PSI_ALERT:
+        return "drift"
+    if score >= DRIFT_PSI_WARN:
+        return "moderate"
+    return "stable"
+
+
+def _overall(scores: Optional[np.ndarray], enough: bool) -> str:
+    if scores is None:
+        return "no_reference"
+    if not enough:
+        return "insufficient_data"
+    return _status(float(scores.max()))
+
+
+def _fingerprint(reference: Optional[Dict[str, Any]]) -> Optional[str]:
+    if reference is None:
+        return None
+    return hashlib.sha256(json.dumps(reference, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class DriftMonitor(BufferedWriter):
+    """
+    Estatísticas das features e das predições atualizadas em fluxo.
+
+    O caminho da requisição só enfileira (features, DEATH_EVENT predito,
+    probabilidade) em ``observe``; a thread do BufferedWriter incorpora os
+    pendentes em lote, a cada ``DRIFT_UPDATE_INTERVAL`` segundos, em dois
+    conjuntos de esboços de memória constante (StreamingStats):
+
+    - ``window``: período corrente, com quantis P²; a cada
+      ``DRIFT_SNAPSHOT_INTERVAL`` segundos vira um snapshot JSON no MinIO
+      (``<prefixo>/dt=AAAA-MM-DD/snapshot_<hora>_<uuid>.json``) e é reiniciado;
+    - ``total``: desde o início do processo (ou da troca de referência).
+
+    O drift é medido contra o perfil do treino (``reference_profile``),
+    guardado no FeaturePreprocessor do modelo primary ou lido de
+    ``DRIFT_REFERENCE``: PSI por feature sobre as faixas do treino,
+    deslocamento da média em desvios do treino e desvio da taxa de
+    predições positivas em relação à do treino. Artefatos sem perfil usam
+    só média/desvio do preprocessor (sem PSI).
+    """
+
+    def __init__(self, s3=None, bucket: Optional[str] = None, prefix: str = DRIFT_PREFIX,
+                 interval: float = DRIFT_UPDATE_INTERVAL, snapshot_interval: float = DRIFT_SNAPSHOT_INTERVAL,
+                 reference_path: str = DRIFT_REFERENCE, enabled: bool = DRIFT_MONITOR):
+        """
+        Args:
+            s3: Cliente boto3 S3 (MinIO) dos snapshots (None = só em memória)
+            bucket: Bucket dos snapshots
+            prefix: Prefixo das chaves dos snapshots
+            interval: Intervalo (s) entre incorporações
+            snapshot_interval: Intervalo (s) entre snapshots
+            reference_path: Perfil de referência fixo (CSV/JSON); vazio = o do modelo
+            enabled: False = ``observe`` não faz nada
+        """
+        super().__init__(max_records=5000, max_delay=interval, max_pending=DRIFT_MAX_PENDING,
+                         name="drift-monitor", stage="drift_update")
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.snapshot_interval = snapshot_interval
+        self.reference_path = reference_path
+        self.enabled = enabled
+        self.reference: Optional[Dict[str, Any]] = None
+        self.reference_source: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+        self._stats_lock = threading.Lock()
+        self.window = self._new_stats(quantiles=DRIFT_QUANTILES)
+        self.total = self._new_stats()
+        self._last_snapshot = time.monotonic()
+        self.snapshots: Deque[Dict[str, Any]] = deque(maxlen=DRIFT_KEEP_SNAPSHOTS)
+        self.psi_scores: Dict[str, float] = {}
+        self.skipped = 0
+
+    # ---------- referência ----------
+
+    def _new_stats(self, quantiles: Sequence[float] = ()) -> StreamingStats:
+        return StreamingStats(self.reference, quantiles)
+
+    def use_model(self, predictor) -> None:
+        """
+        Adota o perfil de referência do modelo (chamado a cada troca do primary).
+
+        Com ``DRIFT_REFERENCE`` o perfil do arquivo tem precedência. As
+        estatísticas só são reiniciadas se o perfil mudar (atualizações
+        incrementais mantêm o perfil do treino original).
+        """
+        if self.reference_path:
+            if self.reference is None:
+                self.set_reference(load_reference(self.reference_path), self.reference_path)
+            return
+        preprocessor = getattr(predictor, "preprocessor", None)
+        reference = getattr(preprocessor, "reference_", None)
+        source = f"model:{getattr(predictor, 'model_version', None)}"
+        if reference is None and getattr(preprocessor, "var_", None) is not None:
+            # Artefato sem perfil: só média/desvio do treino
+            reference = {"n": int(getattr(preprocessor, "n_samples_seen_", 0)),
+                         "mean": preprocessor.mean_.tolist(),
+                         "std": np.sqrt(preprocessor.var_).tolist(),
+                         "edges": None, "proportions": None, "positive_rate": None}
+        self.set_reference(reference, source)
+
+    def set_reference(self, reference: Optional[Dict[str, Any]], source: Optional[str] = None) -> None:
+        """Troca o perfil de referência, reiniciando as estatísticas se ele mudou."""
+        fingerprint = _fingerprint(reference)
+        with self._stats_lock:
+            if fingerprint == self._fingerprint and reference is not None:
+                return
+            self.reference = reference
+            self.reference_source = source
+            self._fingerprint = fingerprint
+            self.window = self._new_stats(quantiles=DRIFT_QUANTILES)
+            self.total = self._new_stats()
+            self.psi_scores = {}
+        logger.info("Drift: perfil de referência %s (%s)", fingerprint, source)
+
+    # ---------- caminho da requisição ----------
+
+    def observe(self, features: Sequence[Any], label: Optional[int], probability: Optional[float] = None) -> None:
+        """Enfileira um registro predito (só um append; a incorporação é em fundo)."""
+        if not self.enabled:
+            return
+        if len(self._buffer) >= self.max_pending:
+            self.skipped += 1
+            return
+        self.add((features, label, probability))
+
+    def observe_many(self, items: List[Tuple[Sequence[Any], Optional[int], Optional[float]]]) -> None:
+        """Como ``observe``, para um micro-lote (fila de telemetria)."""
+        if not self.enabled or not items:
+            return
+        if len(self._buffer) >= self.max_pending:
+            self.skipped += len(items)
+            return
+        self.extend(items)
+
+    # ---------- thread de fundo ----------
+
+    def _write(self, batch: List[Tuple[Sequence[Any], Optional[int], Optional[float]]]) -> None:
+        X = np.array([item[0] for item in batch], dtype=np.float64)
+        labels = np.array([item[1] for item in batch], dtype=np.float64)
+        probabilities = np.array([item[2] for item in batch], dtype=np.float64)
+        with self._stats_lock:
+            self.window.update(X, labels, probabilities)
+            self.total.update(X, labels, probabilities)
+            scores = self.window.psi()
+        if scores is not None:
+            self.psi_scores = dict(zip(FEATURE_NAMES, scores.tolist()))
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Grava a janela corrente (MinIO) e inicia uma nova.
+
+        Se a gravação falhar, a janela é mantida e o snapshot é tentado de
+        novo no próximo intervalo.
+
+        Returns:
+            O snapshot, ou None se a janela estiver vazia
+        """
+        with self._stats_lock:
+            window = self.window
+            if not window.count and not window.predictions:
+                self._last_snapshot = time.monotonic()
+                return None
+            ended = datetime.now(timezone.utc)
+            snapshot = {
+                "ended": ended.isoformat(),
+                "reference": {"source": self.reference_source, "fingerprint": self._fingerprint},
+                "window": window.compare(self.reference),
+                "total": {"started": self.total.started.isoformat(), "records": self.total.count,
+                          "predictions": self.total.prediction_summary(self.reference)},
+            }
+        self._last_snapshot = time.monotonic()
+        key = None
+        if self.s3 is not None and self.bucket:
+            key = f"{self.prefix}/dt={ended:%Y-%m-%d}/snapshot_{ended:%H%M%S}_{uuid.uuid4().hex[:8]}.json"
+            try:
+                self.s3.put_object(Bucket=self.bucket, Key=key, Body=json.dumps(snapshot).encode(),
+                                   ContentType="application/json")
+            except Exception as e:
+                logger.error("Drift: falha ao gravar o snapshot %s: %s", key, e)
+                return None
+        with self._stats_lock:
+            if self.window is window:
+                self.window = self._new_stats(quantiles=DRIFT_QUANTILES)
+                self.psi_scores = {}
+        self.snapshots.append({"key": key, "ended": snapshot["ended"], "started": snapshot["window"]["started"],
+                               "records": snapshot["window"]["records"], "status": snapshot["window"]["status"],
+                               "max_psi": snapshot["window"]["max_psi"], "drifted": snapshot["window"]["drifted"],
+                               "positive_rate": snapshot["window"]["predictions"]["positive_rate"]})
+        logger.info("Drift: snapshot de %d registros (%s) em %s", snapshot["window"]["records"],
+                    snapshot["window"]["status"], key)
+        return snapshot
+
+    def close(self) -> None:
+        """Incorpora os pendentes e grava o snapshot da janela corrente."""
+        super().close()
+        if self.enabled:
+            self.snapshot()
+
+    # ---------- leitura ----------
+
+    def report(self, histograms: bool = False) -> Dict[str, Any]:
+        """
+        Drift da janela corrente e do acumulado em relação à referência.
+
+        Args:
+            histograms: Inclui as proporções por faixa de cada feature
+        """
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "reference": None if self.reference is None else {
+                    "source": self.reference_source,
+                    "fingerprint": self._fingerprint,
+                    "records": self.reference.get("n"),
+                    "positive_rate": self.reference.get("positive_rate"),
+                },
+                "pending": self.depth,
+                "skipped": self.skipped,
+                "snapshot_interval": self.snapshot_interval,
+                "window": self.window.compare(self.reference, histograms),
+                "total": self.total.compare(self.reference, histograms),
+                "last_snapshot": self.snapshots[-1] if self.snapshots else None,
+            }
+
+    def positive_rate(self, scope: str = "window") -> float:
+        """Taxa de predições positivas (0 sem predições), para as métricas."""
+        rate = (self.window if scope == "window" else self.total).positive_rate
+        return rate if rate is not None else 0.0
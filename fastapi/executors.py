@@ -0,0 +1,101 @@
+import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+import logging
+
+from metrics import STAGE_ERRORS, observe_stage, observe_wait
+
+logger = logging.getLogger(__name__)
+
+# Tamanho dos pools (limitados para não competir com o event loop)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", "1"))
+
+# Timeouts por etapa (segundos)
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "2.0"))
+S3_TIMEOUT = float(os.getenv("S3_TIMEOUT", "5.0"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "5.0"))
+# Predição em lote (decodificação + inferência + serialização)
+BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", "60"))
+# Uploads de CSV (MinIO + carga no banco) podem levar minutos
+INGEST_TIMEOUT = float(os.getenv("INGEST_TIMEOUT", "600"))
+
+# Inferência (CPU): o sklearn/NumPy libera o GIL na maior parte do trabalho
+inference_executor = ThreadPoolExecutor(
+    max_workers=INFERENCE_WORKERS, thread_name_prefix="inference"
+)
+
+# Escritas em MinIO/Postgres (I/O bloqueante dos clientes síncronos)
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+# Modelos em sombra (fora do caminho da resposta; separado para não
+# disputar o pool de inferência com as requisições)
+shadow_executor = ThreadPoolExecutor(max_workers=SHADOW_WORKERS, thread_name_prefix="shadow")
+
+
+class StageTimeout(Exception):
+    """Uma etapa da requisição excedeu o seu timeout."""
+
+    def __init__(self, stage: str, timeout: float):
+        self.stage = stage
+        self.timeout = timeout
+        super().__init__(f"Etapa '{stage}' excedeu {timeout:.1f}s")
+
+
+async def run_stage(
+    stage: str,
+    executor: ThreadPoolExecutor,
+    timeout: float,
+    fn: Callable[..., Any],
+    *args,
+    **kwargs,
+) -> Any:
+    """
+    Executa uma função bloqueante num pool dedicado, com timeout.
+
+    O event loop continua livre enquanto a etapa roda. Em caso de timeout a
+    requisição segue (a thread termina em segundo plano) e StageTimeout é
+    levantada para o chamador decidir como responder.
+
+    A duração total da etapa e a espera na fila do pool são registradas
+    nas métricas (``heart_stage_duration_seconds`` e
+    ``heart_executor_wait_seconds``).
+
+    Args:
+        stage: Nome da etapa (para logs e erros)
+        executor: Pool onde a função será executada
+        timeout: Tempo máximo de espera em segundos
+        fn: Função bloqueante
+        *args, **kwargs: Argumentos da função
+
+    Returns:
+        Resultado da função
+    """
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+
+    def call():
+        observe_wait(stage, time.perf_counter() - submitted)
+        return fn(*args, **kwargs)
+
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(executor, call), timeout)
+    except asyncio.TimeoutError:
+        STAGE_ERRORS.labels(stage).inc()
+        logger.error("Timeout na etapa '%s' (%ss)", stage, timeout)
+        raise StageTimeout(stage, timeout)
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - submitted)
+
+
+def shutdown_executors() -> None:
+    """Encerra os pools aguardando as tarefas em andamento."""
+    inference_executor.shutdown(wait=True)
+    io_executor.shutdown(wait=True)
+    shadow_executor.shutdown(wait=True)
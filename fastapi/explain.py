@@ -0,0 +1,259 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import logging
+
+from inference import CompiledKNN, CompiledTrees, compile_member
+
+logger = logging.getLogger(__name__)
+
+# Features destacadas em "top" (maiores contribuições em módulo)
+EXPLAIN_TOP = int(os.getenv("EXPLAIN_TOP", "3"))
+# Pontos de referência (amostra do conjunto do KNN) usados na importância global
+EXPLAIN_BACKGROUND_MAX = int(os.getenv("EXPLAIN_BACKGROUND_MAX", "1000"))
+
+
+class TreeExplainer:
+    """
+    Contribuições por caminho (Saabas) de uma árvore ou floresta compilada.
+
+    Ao descer de um nó para o filho, a probabilidade de óbito muda de
+    ``v[pai]`` para ``v[filho]`` e a diferença é creditada à feature da
+    divisão. Como o caminho só depende da folha, o vetor de contribuições
+    de cada folha é calculado uma vez na carga (tabela nós × features) e a
+    explicação de um lote é uma consulta por folha alcançada (a mesma
+    travessia de ``CompiledTrees.leaves``), com média entre as árvores.
+    """
+
+    def __init__(self, compiled: CompiledTrees, n_features: int, death_idx: int,
+                 importances: Optional[np.ndarray] = None):
+        """
+        Args:
+            compiled: Árvores já achatadas pelo CompiledEnsemble
+            n_features: Número de features
+            death_idx: Coluna da classe de óbito nas distribuições das folhas
+            importances: feature_importances_ do estimador (importância global)
+        """
+        self.compiled = compiled
+        self.importances = importances
+        value = compiled.value[:, death_idx]
+        children = compiled.children
+        nodes = np.arange(len(value))
+        internal = children[:, 0] != nodes
+
+        contrib = np.zeros((len(value), n_features))
+        # Descida nível a nível a partir das raízes (todas as árvores juntas)
+        frontier = compiled.roots
+        while len(frontier):
+            parents = frontier[internal[frontier]]
+            for side in (0, 1):
+                kids = children[parents, side]
+                contrib[kids] = contrib[parents]
+                contrib[kids, compiled.feature[parents]] += value[kids] - value[parents]
+            frontier = children[parents].ravel()
+        self.contrib = contrib
+        self.base = float(value[compiled.roots].mean())
+
+    def explain(self, X: np.ndarray) -> np.ndarray:
+        """Contribuições (n, n_features) para a probabilidade de óbito do membro."""
+        return self.contrib[self.compiled.leaves(X)].mean(axis=1)
+
+
+class KNNExplainer:
+    """
+    Atribuição por vizinhos para o KNN.
+
+    A probabilidade de óbito do KNN é o voto (ponderado) dos k vizinhos;
+    cada vizinho puxa a probabilidade em ``peso × (rótulo - taxa base)``,
+    onde a taxa base é a proporção de óbitos no conjunto de referência. A
+    puxada de cada vizinho é repartida entre as features em que o paciente
+    está mais perto dele do que estaria de um ponto típico do conjunto
+    (distância esperada ``(x - média)² + variância``, pré-calculada na
+    carga): o crédito de cada feature é essa folga, normalizada para somar
+    1. A soma das contribuições é exatamente a probabilidade do membro
+    menos a taxa base.
+    """
+
+    def __init__(self, compiled: CompiledKNN, fit_X: np.ndarray, death_idx: int):
+        """
+        Args:
+            compiled: KNN compilado (mesma busca de vizinhos da predição)
+            fit_X: Conjunto de referência já normalizado
+            death_idx: Índice (codificado) da classe de óbito
+        """
+        self.compiled = compiled
+        self.fit_X = np.ascontiguousarray(fit_X, dtype=np.float64)
+        self.death = (compiled.y == death_idx).astype(np.float64)
+        self.base = float(self.death.mean())
+        self.mean = self.fit_X.mean(axis=0)
+        self.var = self.fit_X.var(axis=0)
+
+    def _weights(self, dist: np.ndarray) -> np.ndarray:
+        # Mesmos pesos do CompiledKNN.predict_proba, normalizados por linha
+        if self.compiled.weights == "distance":
+            with np.errstate(divide="ignore"):
+                w = 1.0 / dist
+            exact = np.isinf(w)
+            w = np.where(exact.any(axis=1, keepdims=True), exact.astype(np.float64), w)
+        else:
+            w = np.ones_like(dist)
+        return w / w.sum(axis=1, keepdims=True)
+
+    def explain(self, X: np.ndarray) -> np.ndarray:
+        """Contribuições (n, n_features) para a probabilidade de óbito do membro."""
+        dist, idx = self.compiled.kneighbors(X)
+        pull = self._weights(dist) * (self.death[idx] - self.base)  # (n, k)
+        d2 = (X[:, None, :] - self.fit_X[idx]) ** 2  # (n, k, f)
+        expected = ((X - self.mean) ** 2 + self.var)[:, None, :]
+        closeness = np.maximum(expected - d2, 0.0)
+        total = closeness.sum(axis=2, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = closeness / total
+        # Nenhuma feature mais próxima que o típico: crédito igual entre elas
+        share = np.where(total > 0, share, 1.0 / X.shape[1])
+        return np.einsum("nk,nkf->nf", pull, share)
+
+
+class ExplanationEngine:
+    """
+    Contribuições por feature da probabilidade de óbito do ensemble.
+
+    Cada membro é explicado na sua forma (árvores: caminhos; KNN:
+    vizinhos) e as contribuições são combinadas com os mesmos pesos da
+    média de probabilidades do CompiledEnsemble. Para cada registro,
+    ``base_value + soma das contribuições (+ unexplained)`` é a
+    ``probability_death`` da predição. Membros sem explicador (não
+    compilados) entram como ``unexplained``.
+
+    Tabelas das árvores, conjunto do KNN e a amostra de referência da
+    importância global são preparados na carga do modelo.
+    """
+
+    def __init__(self, feature_names: Sequence[str], names: List[str], explainers: list,
+                 members: list, weights: np.ndarray, death_idx: int,
+                 background: Optional[np.ndarray] = None):
+        self.feature_names = list(feature_names)
+        self.names = names
+        self.explainers = explainers
+        self.members = members
+        self.weights = weights / weights.sum()
+        self.death_idx = death_idx
+        self.base = float(sum(w * e.base for w, e in zip(self.weights, explainers) if e is not None))
+        self.background = background
+        self._importance: Optional[Dict[str, float]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_model(cls, model, engine, feature_names: Sequence[str]) -> Optional["ExplanationEngine"]:
+        """
+        Monta o explicador do estimador servido.
+
+        Args:
+            model: Estimador (sem o pré-processamento)
+            engine: CompiledEnsemble do preditor (None se não for um VotingClassifier)
+            feature_names: Ordem das features
+
+        Returns:
+            ExplanationEngine, ou None se nenhum membro for explicável
+        """
+        if engine is not None:
+            estimators = model.estimators_
+            names, members, weights, death_idx = engine.names, engine.members, engine.weights, engine.death_idx
+        elif model is not None and hasattr(model, "classes_"):
+            # Modelo único (árvore, floresta ou KNN)
+            estimators = [model]
+            names, members, weights = [type(model).__name__], [compile_member(model)], np.ones(1)
+            death = np.flatnonzero(np.asarray(model.classes_) == 1)
+            death_idx = int(death[0]) if len(death) else None
+        else:
+            return None
+        if death_idx is None:
+            return None
+
+        n_features = len(feature_names)
+        explainers, background = [], None
+        for estimator, member in zip(estimators, members):
+            if isinstance(member, CompiledTrees):
+                explainers.append(TreeExplainer(member, n_features, death_idx,
+                                                getattr(estimator, "feature_importances_", None)))
+            elif isinstance(member, CompiledKNN):
+                fit_X = np.asarray(estimator._fit_X, dtype=np.float64)
+                explainers.append(KNNExplainer(member, fit_X, death_idx))
+                if background is None:
+                    # Conjunto de treino (normalizado) como referência da importância global
+                    step = max(1, len(fit_X) // EXPLAIN_BACKGROUND_MAX)
+                    background = fit_X[::step][:EXPLAIN_BACKGROUND_MAX]
+            else:
+                explainers.append(None)
+        if all(e is None for e in explainers):
+            return None
+        return cls(feature_names, names, explainers, members, np.asarray(weights, dtype=np.float64),
+                   death_idx, background)
+
+    def explain(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Contribuições de um lote.
+
+        Args:
+            X: Matriz já normalizada (n, n_features)
+
+        Returns:
+            Tupla (contribuições (n, n_features), parcela não explicada (n,))
+        """
+        contributions = np.zeros(X.shape)
+        unexplained = np.zeros(len(X))
+        for w, explainer, member in zip(self.weights, self.explainers, self.members):
+            if explainer is not None:
+                contributions += w * explainer.explain(X)
+            else:
+                unexplained += w * member.predict_proba(X)[:, self.death_idx]
+        return contributions, unexplained
+
+    def describe(self, raw: Sequence[float], contributions: np.ndarray, unexplained: float,
+                 top: int = EXPLAIN_TOP) -> Dict[str, Any]:
+        """
+        Explicação de um registro no formato da API.
+
+        Args:
+            raw: Valores originais das features (exibidos em ``top``)
+            contributions: Linha de ``explain``
+            unexplained: Parcela de membros sem explicador
+            top: Features destacadas
+        """
+        order = np.argsort(-np.abs(contributions), kind="stable")[:top]
+        explanation = {
+            "base_value": round(self.base, 4),
+            "contributions": {name: round(float(c), 4) for name, c in zip(self.feature_names, contributions)},
+            "top": [{"feature": self.feature_names[j], "value": float(raw[j]),
+                     "contribution": round(float(contributions[j]), 4)} for j in order],
+        }
+        if unexplained:
+            explanation["unexplained"] = round(float(unexplained), 4)
+        return explanation
+
+    def importance(self) -> Dict[str, float]:
+        """
+        Importância global das features (soma 1), calculada uma vez.
+
+        Média do módulo das contribuições sobre a amostra de referência
+        (conjunto de treino do KNN); sem ela, média ponderada das
+        ``feature_importances_`` das árvores.
+        """
+        if self._importance is not None:
+            return self._importance
+        with self._lock:
+            if self._importance is None:
+                if self.background is not None and len(self.background):
+                    scores = np.abs(self.explain(self.background)[0]).mean(axis=0)
+                else:
+                    scores = np.zeros(len(self.feature_names))
+                    for w, explainer in zip(self.weights, self.explainers):
+                        if isinstance(explainer, TreeExplainer) and explainer.importances is not None:
+                            scores += w * np.asarray(explainer.importances)
+                total = scores.sum()
+                if total > 0:
+                    scores = scores / total
+                self._importance = {name: round(float(s), 6) for name, s in zip(self.feature_names, scores)}
+        return self._importance
@@ -0,0 +1,91 @@
+import io
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+# Content-Types aceitos pelo endpoint de predição em lote
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+ARROW = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+_ALIASES = {
+    "application/jsonl": NDJSON,
+    "application/ndjson": NDJSON,
+    "application/vnd.apache.arrow.file": ARROW,
+    "application/x-parquet": PARQUET,
+    "application/parquet": PARQUET,
+}
+
+MEDIA_TYPES = (JSON, NDJSON, ARROW, PARQUET)
+
+
+def normalize_media_type(content_type: str) -> str:
+    """
+    Normaliza o Content-Type (remove parâmetros e resolve aliases).
+
+    Raises:
+        ValueError: Se o formato não for suportado
+    """
+    media_type = (content_type or JSON).split(";")[0].strip().lower()
+    media_type = _ALIASES.get(media_type, media_type)
+    if media_type not in MEDIA_TYPES:
+        raise ValueError(f"Formato não suportado: {media_type}")
+    return media_type
+
+
+def decode(body: bytes, media_type: str) -> pd.DataFrame:
+    """
+    Converte o corpo da requisição numa tabela de registros.
+
+    Args:
+        body: Corpo bruto
+        media_type: Um dos MEDIA_TYPES
+
+    Returns:
+        DataFrame com um registro por linha
+    """
+    if media_type == JSON:
+        payload = json.loads(body)
+        if isinstance(payload, dict):
+            payload = payload.get("records", [])
+        return pd.DataFrame.from_records(payload)
+    if media_type == NDJSON:
+        return pd.read_json(io.BytesIO(body), lines=True)
+    if media_type == ARROW:
+        reader = pa.BufferReader(body)
+        try:
+            table = ipc.open_stream(reader).read_all()
+        except pa.ArrowInvalid:
+            table = ipc.open_file(pa.BufferReader(body)).read_all()
+        return table.to_pandas()
+    return pq.read_table(pa.BufferReader(body)).to_pandas()
+
+
+def encode(df: pd.DataFrame, media_type: str) -> bytes:
+    """
+    Serializa a tabela de resultados no mesmo formato da requisição.
+
+    Args:
+        df: Resultados
+        media_type: Um dos MEDIA_TYPES
+
+    Returns:
+        Corpo da resposta
+    """
+    if media_type == JSON:
+        return df.to_json(orient="records").encode()
+    if media_type == NDJSON:
+        return df.to_json(orient="records", lines=True).encode()
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    if media_type == ARROW:
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
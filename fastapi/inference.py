@@ -0,0 +1,292 @@
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier, ExtraTreeClassifier
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Desliga a compilação dos membros (usa o predict_proba do sklearn)
+COMPILE_ENSEMBLE = os.getenv("COMPILE_ENSEMBLE", "1") == "1"
+# Até este tamanho do conjunto de referência a busca exaustiva (um produto
+# matricial) é mais rápida que consultar o KD-tree/ball-tree (12 features)
+KNN_BRUTE_MAX = int(os.getenv("KNN_BRUTE_MAX", "16384"))
+
+
+class CompiledTrees:
+    """
+    Uma ou mais árvores de decisão achatadas em arrays contíguos.
+
+    Os nós de todas as árvores ficam concatenados (filhos, feature, limiar
+    e distribuição de classes por folha) e a travessia é vetorizada em
+    NumPy para o lote inteiro e todas as árvores ao mesmo tempo. As folhas
+    apontam para si mesmas, então basta iterar ``max_depth`` vezes, sem
+    testar a cada nível quais amostras já chegaram a uma folha.
+    """
+
+    def __init__(self, trees: list):
+        """
+        Args:
+            trees: Lista de DecisionTreeClassifier ajustados
+        """
+        children, feature, threshold, value, roots = [], [], [], [], []
+        offset, max_depth = 0, 0
+        for tree in trees:
+            t = tree.tree_
+            nodes = np.arange(t.node_count) + offset
+            is_leaf = t.children_left == -1
+            children.append(np.column_stack([
+                np.where(is_leaf, nodes, t.children_left + offset),
+                np.where(is_leaf, nodes, t.children_right + offset),
+            ]))
+            feature.append(np.where(is_leaf, 0, t.feature))
+            threshold.append(np.where(is_leaf, np.inf, t.threshold))
+            counts = t.value[:, 0, :]
+            value.append(counts / counts.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+
+        self.children = np.ascontiguousarray(np.concatenate(children), dtype=np.intp)
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64)
+        self.value = np.ascontiguousarray(np.concatenate(value), dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """
+        Folha alcançada por cada amostra em cada árvore.
+
+        Args:
+            X: Matriz (n, n_features)
+
+        Returns:
+            Índices de nó (n, n_trees)
+        """
+        # O sklearn compara em float32: converter garante as mesmas decisões
+        X = X.astype(np.float32).astype(np.float64)
+        n = X.shape[0]
+        node = np.broadcast_to(self.roots, (n, len(self.roots)))
+        rows = np.arange(n)[:, None]
+        for _ in range(self.max_depth):
+            go_right = X[rows, self.feature[node]] > self.threshold[node]
+            node = self.children[node, go_right.view(np.int8)]
+        return node
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Média das distribuições de classe das folhas (n, n_classes)."""
+        return self.value[self.leaves(X)].mean(axis=1)
+
+
+class CompiledKNN:
+    """
+    KNN sobre o conjunto de referência, com busca exaustiva ou por índice.
+
+    Conjuntos pequenos usam busca exaustiva em NumPy: as normas ao quadrado
+    são pré-calculadas e as distâncias de um lote saem de um único produto
+    matricial. Acima de ``brute_max`` pontos, se o KNN foi treinado com
+    ``algorithm='kd_tree'`` ou ``'ball_tree'``, a consulta usa o índice já
+    construído no treino (serializado no artefato), com custo sublinear.
+    Suporta a métrica euclidiana (minkowski, p=2) com pesos uniformes ou
+    por distância.
+    """
+
+    def __init__(self, knn: KNeighborsClassifier, brute_max: int = KNN_BRUTE_MAX):
+        """
+        Args:
+            knn: KNeighborsClassifier ajustado
+            brute_max: Tamanho máximo do conjunto para a busca exaustiva
+        """
+        tree = getattr(knn, "_tree", None)
+        if knn._fit_method in ("kd_tree", "ball_tree") and tree is not None \
+                and knn.n_samples_fit_ > brute_max:
+            self.tree = tree
+            self.fit_X = self.fit_sq = None
+        else:
+            self.tree = None
+            self.fit_X = np.ascontiguousarray(knn._fit_X, dtype=np.float64)
+            self.fit_sq = np.einsum("ij,ij->i", self.fit_X, self.fit_X)
+        self.y = np.asarray(knn._y, dtype=np.intp)
+        self.n_classes = len(knn.classes_)
+        self.k = knn.n_neighbors
+        self.weights = knn.weights
+
+    @staticmethod
+    def supports(knn: KNeighborsClassifier) -> bool:
+        metric_ok = knn.effective_metric_ == "euclidean" or (
+            knn.effective_metric_ == "minkowski" and knn.effective_metric_params_.get("p", 2) == 2
+        )
+        return metric_ok and knn.weights in ("uniform", "distance") and getattr(knn, "outputs_2d_", False) is False
+
+    def kneighbors(self, X: np.ndarray, sort: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vizinhos mais próximos de cada amostra.
+
+        Args:
+            X: Matriz já normalizada (n, n_features)
+            sort: Ordenar os k vizinhos por distância (dispensável no voto uniforme)
+
+        Returns:
+            Tupla (distâncias (n, k), índices (n, k))
+        """
+        if self.tree is not None:
+            k = min(self.k, len(self.y))
+            return self.tree.query(X, k=k, return_distance=True, sort_results=sort)
+
+        # |x - y|² = |y|² - 2 x·y + |x|²  (o termo |x|² não muda a ordem)
+        d2 = X @ self.fit_X.T
+        d2 *= -2.0
+        d2 += self.fit_sq
+        k = min(self.k, d2.shape[1])
+        idx = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        part = np.take_along_axis(d2, idx, axis=1)
+        if sort:
+            order = np.argsort(part, axis=1, kind="stable")
+            idx = np.take_along_axis(idx, order, axis=1)
+            part = np.take_along_axis(part, order, axis=1)
+        part += np.einsum("ij,ij->i", X, X)[:, None]
+        return np.sqrt(np.maximum(part, 0.0)), idx
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Distribuição de classes entre os vizinhos (n, n_classes)."""
+        if self.weights == "uniform":
+            _, idx = self.kneighbors(X, sort=False)
+            labels = self.y[idx]
+            proba = (labels[:, :, None] == np.arange(self.n_classes)).sum(axis=1)
+            return proba / idx.shape[1]
+
+        dist, idx = self.kneighbors(X)
+        labels = self.y[idx]
+        if self.weights == "distance":
+            with np.errstate(divide="ignore"):
+                w = 1.0 / dist
+            # Vizinho idêntico: só ele(s) contam, como no sklearn
+            exact = np.isinf(w)
+            w = np.where(exact.any(axis=1, keepdims=True), exact.astype(np.float64), w)
+        else:
+            w = np.ones_like(dist)
+        proba = np.zeros((X.shape[0], self.n_classes))
+        for c in range(self.n_classes):
+            proba[:, c] = (w * (labels == c)).sum(axis=1)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+
+class _SklearnMember:
+    """Membro não compilável: delega ao predict_proba do sklearn."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.estimator.predict_proba(X)
+
+
+def compile_member(estimator, compile_members: bool = True):
+    """
+    Converte um membro do ensemble para a forma baseada em arrays, quando possível.
+
+    Args:
+        estimator: Estimador ajustado
+        compile_members: Se False, mantém o estimador do sklearn
+
+    Returns:
+        Objeto com ``predict_proba(X)``
+    """
+    if compile_members:
+        if isinstance(estimator, (DecisionTreeClassifier, ExtraTreeClassifier)) and estimator.n_outputs_ == 1:
+            return CompiledTrees([estimator])
+        if isinstance(estimator, (RandomForestClassifier, ExtraTreesClassifier)) and estimator.n_outputs_ == 1:
+            return CompiledTrees(estimator.estimators_)
+        if isinstance(estimator, KNeighborsClassifier) and CompiledKNN.supports(estimator):
+            return CompiledKNN(estimator)
+    return _SklearnMember(estimator)
+
+
+class CompiledEnsemble:
+    """
+    Motor de inferência de passada única para o VotingClassifier.
+
+    Cada estimador base é avaliado uma única vez por lote (predict_proba),
+    e daí saem juntos:
+    - o rótulo final (votação 'hard' ou 'soft', como no sklearn);
+    - a distribuição de votos ponderada entre os membros;
+    - a probabilidade de morte como média ponderada das probabilidades
+      dos membros (também disponível no ensemble 'hard', que não tem
+      predict_proba).
+    """
+
+    def __init__(self, names: List[str], members: list, weights: np.ndarray,
+                 voting: str, classes: np.ndarray):
+        self.names = names
+        self.members = members
+        self.weights = weights
+        self.voting = voting
+        self.classes = np.asarray(classes)
+        death_idx = np.flatnonzero(self.classes == 1)
+        self.death_idx = int(death_idx[0]) if len(death_idx) else None
+
+    @classmethod
+    def from_model(cls, model, compile_members: bool = COMPILE_ENSEMBLE) -> Optional["CompiledEnsemble"]:
+        """
+        Monta o motor a partir de um VotingClassifier ajustado.
+
+        Args:
+            model: Estimador ajustado
+            compile_members: Achatar árvores/KNN em arrays
+
+        Returns:
+            CompiledEnsemble, ou None se o modelo não for um VotingClassifier
+        """
+        if not isinstance(model, VotingClassifier) or not hasattr(model, "estimators_"):
+            return None
+
+        names = [name for name, est in model.estimators if est != "drop"]
+        if model.weights is None:
+            weights = np.ones(len(model.estimators_))
+        else:
+            weights = np.asarray(
+                [w for (_, est), w in zip(model.estimators, model.weights) if est != "drop"],
+                dtype=np.float64,
+            )
+        members = [compile_member(est, compile_members) for est in model.estimators_]
+        compiled = [n for n, m in zip(names, members) if not isinstance(m, _SklearnMember)]
+        logger.info("Ensemble compilado (membros em arrays: %s)", compiled or "nenhum")
+        # Membros do VotingClassifier trabalham com rótulos codificados (0..n_classes-1)
+        return cls(names, members, weights, model.voting, model.le_.classes_)
+
+    def evaluate(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Avalia o ensemble numa única passada.
+
+        Args:
+            X: Matriz já normalizada (n, n_features)
+
+        Returns:
+            Tupla (rótulos, probabilidade de morte, confiança, votos) onde
+            votos é (n, n_membros) com o rótulo escolhido por cada membro
+        """
+        probas = np.stack([m.predict_proba(X) for m in self.members])  # (m, n, c)
+        w = self.weights / self.weights.sum()
+        mean_proba = np.tensordot(w, probas, axes=1)  # (n, c)
+        vote_idx = probas.argmax(axis=2).T  # (n, m)
+
+        if self.voting == "soft":
+            shares = mean_proba
+        else:
+            shares = np.zeros_like(mean_proba)
+            for c in range(len(self.classes)):
+                shares[:, c] = (vote_idx == c) @ w
+
+        label_idx = shares.argmax(axis=1)
+        labels = self.classes[label_idx].astype(int)
+        confidence = shares[np.arange(len(labels)), label_idx]
+        if self.death_idx is None:
+            probability_death = np.zeros(len(labels))
+        else:
+            probability_death = mean_proba[:, self.death_idx]
+        votes = self.classes[vote_idx].astype(int)
+        return labels, probability_death, confidence, votes
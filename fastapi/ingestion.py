@@ -0,0 +1,182 @@
+import io
+import os
+import uuid
+from typing import Any, BinaryIO, Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import inspect, text
+import logging
+
+from persistence import copy_records
+from schema import DATA_COLUMNS, column_type, is_managed
+from segments import transfer_config
+
+logger = logging.getLogger(__name__)
+
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "50000"))
+
+INGEST_MODES = ("replace", "append", "upsert")
+
+
+def _q(name: str) -> str:
+    """Identificador entre aspas (preserva maiúsculas, ex.: DEATH_EVENT)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _NonClosingReader(io.RawIOBase):
+    """Leitor que não fecha o arquivo original (o s3transfer fecha o fileobj ao terminar)."""
+
+    def __init__(self, fileobj: BinaryIO):
+        self._f = fileobj
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._f.read(size)
+
+    def readinto(self, b) -> int:
+        data = self._f.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._f.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+
+def upload_raw(s3, bucket: str, key: str, fileobj: BinaryIO) -> None:
+    """
+    Envia o arquivo bruto ao MinIO em partes (multipart), lendo em blocos.
+
+    Args:
+        s3: Cliente boto3 S3
+        bucket: Bucket de destino
+        key: Chave do objeto
+        fileobj: Arquivo aberto em modo binário
+    """
+    fileobj.seek(0)
+    # O mesmo arquivo ainda será lido por load_csv
+    s3.upload_fileobj(_NonClosingReader(fileobj), bucket, key, Config=transfer_config())
+
+
+def _load_chunk(engine, table_name: str, chunk: pd.DataFrame) -> None:
+    if engine.dialect.name == "postgresql":
+        rows = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+        copy_records(engine, table_name, list(chunk.columns), rows)
+    else:
+        chunk.to_sql(table_name, engine, if_exists="append", index=False)
+
+
+def load_csv(
+    engine,
+    fileobj: BinaryIO,
+    table_name: str,
+    mode: str = "replace",
+    key_columns: Optional[List[str]] = None,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+) -> Dict[str, Any]:
+    """
+    Carrega um CSV no banco em blocos de ``chunk_rows`` linhas.
+
+    Os blocos são gravados (COPY no Postgres) numa tabela de staging; a
+    tabela final só é tocada no fim, numa transação curta:
+
+    - ``replace``: a staging substitui a tabela (DROP + RENAME)
+    - ``append``: INSERT ... SELECT da staging
+    - ``upsert``: remove as linhas com as mesmas ``key_columns`` e insere
+
+    Na tabela gerenciada (schema.py) o esquema nunca é trocado pelo do CSV:
+    ``replace`` esvazia a tabela (TRUNCATE) e insere, e os valores são
+    convertidos para os tipos das colunas. Colunas fora do esquema são
+    recusadas.
+
+    Assim a memória usada é proporcional ao bloco, não ao arquivo, e a
+    tabela não fica bloqueada durante a carga inteira.
+
+    Args:
+        engine: Engine SQLAlchemy
+        fileobj: CSV aberto em modo binário
+        table_name: Tabela de destino
+        mode: "replace", "append" ou "upsert"
+        key_columns: Colunas-chave (obrigatórias no upsert)
+        chunk_rows: Linhas por bloco
+
+    Returns:
+        Dicionário com quantidade de linhas e colunas carregadas
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Modo inválido: {mode} (use {', '.join(INGEST_MODES)})")
+    if mode == "upsert" and not key_columns:
+        raise ValueError("O modo upsert exige key_columns")
+
+    staging = f"{table_name}_staging_{uuid.uuid4().hex[:8]}"
+    target_exists = inspect(engine).has_table(table_name)
+    managed = target_exists and is_managed(engine, table_name)
+    postgres = engine.dialect.name == "postgresql"
+    rows, columns = 0, []
+
+    fileobj.seek(0)
+    try:
+        for chunk in pd.read_csv(fileobj, chunksize=chunk_rows):
+            if not columns:
+                columns = list(chunk.columns)
+                missing = set(key_columns or []) - set(columns)
+                if missing:
+                    raise ValueError(f"Colunas-chave ausentes no CSV: {sorted(missing)}")
+                unknown = set(columns) - set(DATA_COLUMNS) if managed else set()
+                if unknown:
+                    raise ValueError(f"Colunas fora do esquema de {table_name}: {sorted(unknown)}")
+                # Staging com o esquema inferido do primeiro bloco
+                chunk.head(0).to_sql(staging, engine, if_exists="fail", index=False)
+            _load_chunk(engine, staging, chunk)
+            rows += len(chunk)
+            logger.debug("%d linhas carregadas em %s", rows, staging)
+
+        if not columns:
+            raise ValueError("CSV vazio")
+
+        cols = ", ".join(_q(c) for c in columns)
+        select = ", ".join(
+            f"CAST({_q(c)} AS {column_type(c)})" if managed and postgres else _q(c)
+            for c in columns
+        )
+        with engine.begin() as conn:
+            if managed and mode == "replace":
+                # Mantém tipos, partições, índices e o agregado da tabela gerenciada
+                conn.execute(text(
+                    f"TRUNCATE {_q(table_name)}" if postgres else f"DELETE FROM {_q(table_name)}"
+                ))
+                conn.execute(text(
+                    f"INSERT INTO {_q(table_name)} ({cols}) SELECT {select} FROM {_q(staging)}"
+                ))
+                conn.execute(text(f"DROP TABLE {_q(staging)}"))
+            elif mode == "replace" or not target_exists:
+                if target_exists:
+                    conn.execute(text(f"DROP TABLE {_q(table_name)}"))
+                conn.execute(text(f"ALTER TABLE {_q(staging)} RENAME TO {_q(table_name)}"))
+            else:
+                if mode == "upsert":
+                    match = " AND ".join(
+                        f"{_q(table_name)}.{_q(k)} = s.{_q(k)}" for k in key_columns
+                    )
+                    conn.execute(text(
+                        f"DELETE FROM {_q(table_name)} WHERE EXISTS "
+                        f"(SELECT 1 FROM {_q(staging)} s WHERE {match})"
+                    ))
+                conn.execute(text(
+                    f"INSERT INTO {_q(table_name)} ({cols}) SELECT {select} FROM {_q(staging)}"
+                ))
+                conn.execute(text(f"DROP TABLE {_q(staging)}"))
+    except Exception:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {_q(staging)}"))
+        raise
+
+    logger.info("%d linhas carregadas em %s (%s)", rows, table_name, mode)
+    return {"rows": rows, "columns": columns}
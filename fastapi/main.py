@@ -1,119 +1,480 @@
-import io
 import os
 import json
-from typing import Dict, Optional, Any
-from pydantic import BaseModel, Field
+import hmac
+import importlib
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Any, Tuple, Union
 
-import boto3
-import pandas as pd
 import logging
-from fastapi import FastAPI, UploadFile, File
-from sqlalchemy import create_engine, text
-from predict import HeartFailurePredictor, build_ensemble_model
+from fastapi import FastAPI, UploadFile, File, Header, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from predict import FEATURE_NAMES, HeartFailurePredictor, build_ensemble_model
+from model_store import ModelStore
+from cache import PredictionCache
+from batching import MicroBatcher, Overloaded
+from drift import DriftMonitor
+from executors import (
+    BATCH_TIMEOUT,
+    DB_TIMEOUT,
+    INFERENCE_TIMEOUT,
+    INGEST_TIMEOUT,
+    inference_executor,
+    io_executor,
+    run_stage,
+    shadow_executor,
+    shutdown_executors,
+)
+from persistence import PostgresWriteBuffer
+from schema import ANALYSIS_TABLE, AggregateRefresher, daily_aggregate, ensure_schema
+from segments import DEAD_LETTER_PREFIX, SegmentWriter
+from online import ONLINE_LEARNING, OnlineUpdater
+from registry import (
+    MODEL_ROUTE_HEADER,
+    MODEL_SHADOWS,
+    MODEL_SLOTS,
+    MODEL_TRAFFIC,
+    PRIMARY,
+    ModelRegistry,
+    parse_mapping,
+)
+from records import FIELDS, HeartData, HeartRecord
+from telemetry import MQTT_HOST, TELEMETRY_QUEUE, MqttListener, TelemetryQueue
+from resources import (
+    LazyS3Client,
+    close_s3_client,
+    create_db_engine,
+    database_url,
+    retry,
+)
+from startup import STARTUP_SHUTDOWN_WAIT, StagedStartup
+import metrics
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="API de Ingestão e Predição")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Não bloqueia: as etapas rodam em segundo plano (ver /health/ready)
+    init_bucket_and_db()
+    yield
+    shutdown()
+
+
+app = FastAPI(title="API de Ingestão e Predição", lifespan=lifespan)
 
 # ---------- MinIO (S3 compatível) ----------
-s3 = boto3.client(
-    "s3",
-    endpoint_url=os.getenv("S3_ENDPOINT_URL"),
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-)
+# Um cliente por processo, com pool de conexões e retentativas (resources.py);
+# criado no primeiro uso, fora da importação da API
+s3 = LazyS3Client()
 
 BUCKET = os.getenv("S3_BUCKET", "dados-analise")
 
 # ---------- Postgres ----------
-db_url = (
-    f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
-    f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-)
-engine = create_engine(db_url)
+db_url = database_url()
+# Pool dimensionado para os pools de threads, com pre-ping e recycle
+engine = create_db_engine(db_url)
 
 # --- Modelo preditor ---
-predictor = None
+MODEL_VERSION = os.getenv("MODEL_VERSION", "latest")
+# Explicação (contribuição por feature) em toda resposta de /enviarDadosThingsBoard;
+# sem isso, só com ?explain=true
+EXPLAIN_PREDICTIONS = os.getenv("EXPLAIN_PREDICTIONS", "0") == "1"
+# Token exigido (header X-Admin-Token) para trocar versões de modelo pela API;
+# sem ele, POST /models/{slot} fica desativado
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+model_store = ModelStore(s3=s3, bucket=os.getenv("MODEL_S3_BUCKET", BUCKET))
+
+# Cache de predições do slot primary (invalidado quando a versão do modelo muda)
+prediction_cache = PredictionCache(FEATURE_NAMES)
+metrics.register_cache(prediction_cache)
+
+# Predições unitárias concorrentes avaliadas em lote, com controle de admissão
+inference_batcher = MicroBatcher()
+metrics.register_queue("inference_batch", lambda: inference_batcher.depth)
+
+# Estatísticas em fluxo das features e das predições, comparadas ao perfil do treino
+drift_monitor = DriftMonitor(s3, BUCKET)
+metrics.register_drift(drift_monitor)
+
+
+def _modelo_trocado(slot: str, version: str) -> None:
+    metrics.set_model_version(version, slot)
+    if slot == PRIMARY:
+        # O perfil de referência do drift vem do artefato do primary
+        drift_monitor.use_model(registry.primary)
+
+
+# Versões servidas lado a lado (primary + MODEL_SLOTS), com roteamento e sombra
+registry = ModelRegistry(
+    model_store,
+    shadow_executor,
+    primary_cache=prediction_cache,
+    traffic=parse_mapping(MODEL_TRAFFIC),
+    shadows=[s.strip() for s in MODEL_SHADOWS.split(",") if s.strip()],
+    on_change=_modelo_trocado,
+)
+
+
+@app.middleware("http")
+async def instrumentar_requisicao(request: Request, call_next):
+    """
+    Mede a duração de cada requisição e, por amostragem, perfila com cProfile.
+    
+    O instante de chegada fica em ``request.state.started`` para que os
+    endpoints meçam a etapa de validação (leitura do corpo + pydantic).
+    """
+    request.state.started = time.perf_counter()
+    profiler = metrics.start_profile() if metrics.should_profile() else None
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Rótulo pelo template da rota, para não criar uma série por URL
+        route = request.scope.get("route")
+        path = getattr(route, "path", "desconhecida")
+        metrics.REQUEST_SECONDS.labels(request.method, path, str(status)).observe(
+            time.perf_counter() - request.state.started
+        )
+        if profiler is not None:
+            metrics.finish_profile(profiler, f"{request.method} {path}")
+
+
+def _ensure_bucket() -> list:
+    buckets = [b["Name"] for b in s3.list_buckets().get("Buckets", [])]
+    if BUCKET not in buckets:
+        logger.info("Criando bucket '%s'...", BUCKET)
+        s3.create_bucket(Bucket=BUCKET)
+        logger.info("Bucket '%s' criado", BUCKET)
+    else:
+        logger.info("Bucket '%s' já existe", BUCKET)
+    return buckets
+
+
+def _check_db() -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+# As falhas das etapas são registradas (com traceback) pelo StagedStartup
+def _iniciar_minio() -> None:
+    logger.info("Conectando ao MinIO...")
+    # MinIO/Postgres podem ficar prontos depois da API: tenta com backoff
+    buckets = retry(_ensure_bucket, label="MinIO")
+    logger.info("Bucket '%s' pronto (buckets existentes: %s)", BUCKET, buckets)
+
+
+def _iniciar_postgres() -> Dict[str, Any]:
+    logger.info("Conectando ao PostgreSQL...")
+    retry(_check_db, label="PostgreSQL")
+    logger.info("Conexão com PostgreSQL OK")
+    # Tabela tipada/particionada, índices e agregado diário
+    schema_info = ensure_schema(engine)
+    logger.info("Esquema de %s pronto %s", ANALYSIS_TABLE, schema_info)
+    aggregate_refresher.start()
+    return schema_info
+
+
+def _carregar_modelos() -> Dict[str, str]:
+    logger.info("Carregando modelo...")
+    info = registry.load(PRIMARY, MODEL_VERSION)
+    if info is None:
+        # Nenhum artefato remoto nem em cache: treina o padrão uma vez
+        # e guarda no cache para os próximos workers/reinícios
+        logger.info("Nenhum artefato encontrado, treinando modelo padrão...")
+        model = build_ensemble_model()
+        info = {"version": "default", "sha256": model_store.save(model, "default")}
+        registry.set(PRIMARY, model, info["version"])
+    logger.info("Modelo %s (%s) carregado com sucesso", info["version"], info["sha256"][:12])
+    
+    # Challengers/canários carregados lado a lado
+    for slot, version in parse_mapping(MODEL_SLOTS).items():
+        try:
+            if registry.load(slot, version) is None:
+                logger.error("Slot '%s': versão %s não encontrada", slot, version)
+        except Exception as e:
+            logger.error("Erro ao carregar o slot '%s' (%s): %s", slot, version, e, exc_info=True)
+    
+    if ONLINE_LEARNING:
+        online_updater.start()
+        metrics.register_queue("online_updates", lambda: online_updater.depth)
+    return {"version": info["version"], "sha256": info["sha256"]}
+
+
+def _iniciar_telemetria() -> None:
+    # Consumidores só depois do modelo carregado
+    telemetry_queue.start()
+    metrics.register_queue("telemetry", lambda: telemetry_queue.depth)
+    if MQTT_HOST:
+        mqtt_listener.start()
+
+
+def _aquecer_imports() -> None:
+    # Módulos pesados dos endpoints de lote/CSV (pandas, pyarrow, sklearn):
+    # carregados aqui para que a primeira requisição não pague o import
+    for name in ("preprocessing", "inference", "formats", "ingestion"):
+        importlib.import_module(name)
+
+
+# Etapas independentes rodam ao mesmo tempo; /health/ready mostra o andamento.
+# O modelo espera a verificação do MinIO (de onde vem o artefato), enquanto
+# o import do sklearn ("imports") e o Postgres seguem em paralelo
+startup = StagedStartup()
+startup.add("imports", _aquecer_imports)
+startup.add("minio", _iniciar_minio)
+startup.add("postgres", _iniciar_postgres)
+startup.add("model", _carregar_modelos, after=["minio"])
+if TELEMETRY_QUEUE or MQTT_HOST:
+    startup.add("telemetry", _iniciar_telemetria, after=["model"])
+
 
-@app.on_event("startup")
 def init_bucket_and_db():
-    global predictor
+    logger.info("Iniciando configuração...")
+    # Um processo criado por fork herdaria as conexões do pai: descarta-as
+    # sem fechá-las (o pai continua usando as suas)
+    engine.dispose(close=False)
     
-    print("\n[STARTUP] Iniciando configuração...")
+    # Os buffers só acumulam e reenviam com backoff: podem começar antes
+    # de MinIO/Postgres responderem
+    db_buffer.start()
+    segment_writer.start()
+    dead_letter_writer.start()
+    drift_monitor.start()
+    metrics.register_queue("postgres", lambda: db_buffer.depth)
+    metrics.register_queue("minio_segments", lambda: segment_writer.depth)
+    metrics.register_queue("drift", lambda: drift_monitor.depth)
     
-    # garante bucket
-    try:
-        print("[STARTUP] Conectando ao MinIO...")
-        resp = s3.list_buckets()
-        buckets = [b["Name"] for b in resp.get("Buckets", [])]
-        print(f"[STARTUP] Buckets existentes: {buckets}")
-        
-        if BUCKET not in buckets:
-            print(f"[STARTUP] Criando bucket '{BUCKET}'...")
-            s3.create_bucket(Bucket=BUCKET)
-            print(f"[STARTUP] ✅ Bucket '{BUCKET}' criado")
-        else:
-            print(f"[STARTUP] ✅ Bucket '{BUCKET}' já existe")
-        logger.info(f"Bucket '{BUCKET}' pronto")
-    except Exception as e:
-        print(f"[STARTUP] ❌ Erro com MinIO: {e}")
-        logger.error(f"Erro ao criar bucket: {e}", exc_info=True)
+    # Verificações e carga do modelo em segundo plano: a API já aceita
+    # conexões e /health/ready responde 503 até as etapas obrigatórias concluírem
+    startup.start()
+    logger.info("API no ar; inicialização em segundo plano (GET /health/ready)")
+
+
+def shutdown():
+    # Etapas ainda em andamento podem estar iniciando buffers e consumidores;
+    # as novas tentativas das que falharam são interrompidas
+    if not startup.close(STARTUP_SHUTDOWN_WAIT):
+        logger.warning("Encerrando com etapas de inicialização pendentes: %s", startup.stats()["pending"])
+    # Para de receber leituras e esvazia a fila nos buffers antes do flush final
+    mqtt_listener.close()
+    telemetry_queue.close()
+    # Flush final dos registros pendentes antes de encerrar
+    db_buffer.close()
+    aggregate_refresher.close()
+    segment_writer.close()
+    dead_letter_writer.close()
+    # Snapshot final da janela de drift (antes de fechar o cliente S3)
+    drift_monitor.close()
+    online_updater.close()
+    shutdown_executors()
+    # Só depois dos flushes: fecha as conexões do pool e do cliente S3
+    engine.dispose()
+    close_s3_client(s3)
+
+
+@app.get("/")
+def teste_api():
+    return {"status": "ok", "msg": "API rodando"}
+
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: o processo responde (não depende de MinIO, Postgres nem do modelo)."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Readiness: 200 quando as etapas obrigatórias da inicialização concluíram.
+    
+    Enquanto alguma ainda está aquecendo (ou falhou) responde 503, com a
+    situação e a duração de cada etapa.
+    """
+    return JSONResponse(startup.stats(), status_code=200 if startup.ready else 503)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Contadores do cache de predições (hits, misses, taxa de acerto)."""
+    return prediction_cache.stats()
+
 
-    # teste rápido de conexão db
+@app.get("/inference/stats")
+def inference_stats():
+    """Agrupamento das predições unitárias (tamanho médio dos lotes, recusas)."""
+    return inference_batcher.stats()
+
+
+@app.get("/drift")
+def drift(histograms: bool = False):
+    """
+    Drift das features e da taxa de predições em relação ao perfil do treino.
+    
+    ``window`` é o período corrente (até o próximo snapshot) e ``total`` o
+    acumulado desde o início; nenhum dos dois varre dados_analise.
+    
+    Args:
+        histograms: Inclui as proporções por faixa de cada feature
+    """
+    return drift_monitor.report(histograms)
+
+
+@app.get("/drift/snapshots")
+def drift_snapshots():
+    """Resumo dos snapshots de drift mais recentes (o conteúdo completo está no MinIO)."""
+    return {"snapshots": list(drift_monitor.snapshots)}
+
+
+@app.post("/drift/snapshot")
+async def drift_snapshot():
+    """Grava a janela corrente de drift agora e inicia uma nova."""
     try:
-        print("[STARTUP] Conectando ao PostgreSQL...")
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        print("[STARTUP] ✅ PostgreSQL conectado")
-        logger.info("Conexão com PostgreSQL OK")
+        snapshot = await run_stage("drift_snapshot", io_executor, INGEST_TIMEOUT, drift_monitor.snapshot)
     except Exception as e:
-        print(f"[STARTUP] ❌ Erro PostgreSQL: {e}")
-        logger.error(f"Erro ao conectar PostgreSQL: {e}", exc_info=True)
+        logger.error("Erro ao gravar o snapshot de drift: %s", e, exc_info=True)
+        return {"status": "error", "message": str(e)}
+    if snapshot is None:
+        return {"status": "error", "message": "Janela de drift vazia ou falha na gravação"}
+    return {"status": "ok", **drift_monitor.snapshots[-1]}
+
+
+@app.get("/models")
+def models():
+    """Slots carregados, divisão de tráfego e situação da avaliação em sombra."""
+    return registry.stats()
+
+
+@app.get("/models/{slot}/importance")
+def model_importance(slot: str):
+    """
+    Importância global das features do modelo de um slot.
     
-    # Carregar modelo
+    Para o ensemble, média do módulo das contribuições por feature sobre o
+    conjunto de treino (calculada uma vez por versão).
+    """
+    predictor = registry.get(slot)
+    if predictor is None:
+        return {"status": "error", "message": f"Slot {slot} não carregado"}
+    return {"status": "ok", "slot": slot, "version": predictor.model_version,
+            "importance": predictor.get_feature_importance()}
+
+
+def _admin_negado(token: Optional[str]) -> Optional[JSONResponse]:
+    # Resposta de erro se a operação administrativa não for permitida
+    if not ADMIN_TOKEN:
+        return JSONResponse({"status": "error", "message": "Operação desativada (defina ADMIN_TOKEN)"},
+                            status_code=403)
+    if token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return JSONResponse({"status": "error", "message": "X-Admin-Token inválido"}, status_code=401)
+    return None
+
+
+@app.post("/models/{slot}")
+async def load_model(slot: str, version: str = "latest",
+                     x_admin_token: Optional[str] = Header(None)):
+    """
+    Carrega (ou troca) a versão de um slot sem reiniciar a API.
+    
+    Exige o header ``X-Admin-Token`` igual a ADMIN_TOKEN (desativado se
+    ADMIN_TOKEN não estiver definido): troca o modelo servido.
+    
+    Args:
+        slot: Nome do slot (ex.: primary, challenger)
+        version: Versão no ModelStore
+        x_admin_token: Token administrativo
+    """
+    denied = _admin_negado(x_admin_token)
+    if denied is not None:
+        return denied
     try:
-        print("[STARTUP] Carregando modelo...")
-        default_model = build_ensemble_model()
-        predictor = HeartFailurePredictor(model=default_model)
-        print("[STARTUP] ✅ Modelo carregado com sucesso!")
-        logger.info("✅ Modelo carregado com sucesso!")
+        info = await run_stage("model_load", io_executor, INGEST_TIMEOUT,
+                               registry.load, slot, version)
     except Exception as e:
-        print(f"[STARTUP] ❌ Erro ao carregar modelo: {e}")
-        logger.error(f"Erro ao carregar modelo: {e}", exc_info=True)
-    
-    print("[STARTUP] 🚀 API pronta!\n")
+        logger.error("Erro ao carregar o slot '%s' (%s): %s", slot, version, e, exc_info=True)
+        return {"status": "error", "message": str(e)}
+    if info is None:
+        return {"status": "error", "message": f"Versão {version} não encontrada"}
+    return {"status": "ok", "slot": slot, **info}
 
 
-@app.get("/")
-def teste_api():
-    return {"status": "ok", "msg": "API rodando"}
+@app.get("/online/stats")
+def online_stats():
+    """Situação do aprendizado incremental (ONLINE_LEARNING=1)."""
+    return online_updater.stats()
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Métricas no formato de exposição do Prometheus."""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/debug/profiles")
+def debug_profiles():
+    """Perfis cProfile amostrados mais recentes (PROFILE_SAMPLE_RATE > 0)."""
+    return {"sample_rate": metrics.PROFILE_SAMPLE_RATE, "profiles": metrics.recent_profiles()}
 
 
 # =========================================================
 # 1) Endpoint original para upload de CSV (mantido)
 # =========================================================
 @app.post("/enviarDados")
-async def enviar_dados(file: UploadFile = File(...)):
+async def enviar_dados(
+    file: UploadFile = File(...),
+    mode: str = "replace",
+    key_columns: Optional[str] = None,
+):
     """
     Recebe um CSV, salva bruto no MinIO e grava em tabela dados_analise no Postgres.
+    
+    O arquivo é processado em streaming: o upload ao MinIO é multipart e o
+    CSV é lido em blocos e gravado via COPY, sem carregar tudo em memória.
+    
+    Args:
+        file: CSV enviado
+        mode: "replace" (padrão), "append" ou "upsert"
+        key_columns: Colunas-chave separadas por vírgula (modo upsert)
     """
-    content = await file.read()
+    # pandas só é carregado aqui (ou na etapa "imports" da inicialização)
+    from ingestion import INGEST_MODES, load_csv, upload_raw
+
+    if mode not in INGEST_MODES:
+        return {"status": "error", "message": f"Modo inválido: {mode}"}
+    keys = [k.strip() for k in key_columns.split(",") if k.strip()] if key_columns else None
+    if mode == "upsert" and not keys:
+        return {"status": "error", "message": "O modo upsert exige key_columns"}
 
     # 1) Guarda o arquivo bruto no MinIO
     key = f"{file.filename}"
-    s3.put_object(Bucket=BUCKET, Key=key, Body=content)
+    await run_stage("minio_put", io_executor, INGEST_TIMEOUT,
+                    upload_raw, s3, BUCKET, key, file.file)
 
-    # 2) Lê em DataFrame e grava no banco
-    df = pd.read_csv(io.BytesIO(content))
-    df.to_sql("dados_analise", engine, if_exists="replace", index=False)
+    # 2) Lê em blocos e grava no banco
+    try:
+        result = await run_stage("postgres_insert", io_executor, INGEST_TIMEOUT,
+                                 load_csv, engine, file.file, ANALYSIS_TABLE, mode, keys)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    aggregate_refresher.wake()
+
+    # 3) Linhas rotuladas alimentam a atualização incremental do modelo
+    if ONLINE_LEARNING:
+        await run_stage("online_feed", io_executor, INGEST_TIMEOUT,
+                        online_updater.extend_csv, file.file)
 
     return {
         "status": "ok",
         "s3_key": key,
-        "rows": len(df),
-        "columns": list(df.columns),
+        "mode": mode,
+        "rows": result["rows"],
+        "columns": result["columns"],
     }
 
 
@@ -121,33 +482,87 @@ async def enviar_dados(file: UploadFile = File(...)):
 # 2) Endpoint para receber telemetria do ThingsBoard COM PREDIÇÃO
 # =========================================================
 
-class HeartData(BaseModel):
-    age: float
-    anaemia: int
-    creatinine_phosphokinase: int
-    diabetes: int
-    ejection_fraction: int
-    high_blood_pressure: int
-    platelets: float
-    serum_creatinine: float
-    serum_sodium: int
-    sex: int
-    smoking: int
-    time: int
-    DEATH_EVENT: Optional[int] = None
+# Linhas recusadas pelo Postgres (erro de dados, não de conexão) vão para
+# segmentos à parte no MinIO, com o erro, em vez de travar o buffer
+dead_letter_writer = SegmentWriter(s3, BUCKET, prefix=DEAD_LETTER_PREFIX)
+
+
+def _rejeitar_linhas(rejected: List[Tuple[Any, Exception]]) -> None:
+    dead_letter_writer.extend([
+        {**(dict(zip(FIELDS, row)) if isinstance(row, tuple) else row), "error": str(error)}
+        for row, error in rejected
+    ])
+
+
+# Registros preditos são gravados em lote (write-behind) no Postgres
+# (colunas na ordem de HeartRecord.row: as features e o DEATH_EVENT de dados_analise)
+db_buffer = PostgresWriteBuffer(engine, ANALYSIS_TABLE, FIELDS, on_reject=_rejeitar_linhas)
+
+# Atualiza o agregado diário materializado (dashboards) e cria as partições futuras
+aggregate_refresher = AggregateRefresher(engine)
+
+# Registros brutos vão para segmentos NDJSON particionados no MinIO
+segment_writer = SegmentWriter(s3, BUCKET)
+
+
+# Atualização incremental do slot primary com registros rotulados (ONLINE_LEARNING=1);
+# a troca é atômica: as requisições em andamento terminam com o preditor anterior
+online_updater = OnlineUpdater(
+    lambda: registry.primary,
+    lambda model, version: registry.set(PRIMARY, model, version),
+    FEATURE_NAMES,
+)
+
+
+def _gravar_telemetria(records: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> None:
+    """Grava um micro-lote da fila de telemetria (mesmo destino do endpoint síncrono)."""
+    rows = []
+    observed = []
+    for record, result in zip(records, results):
+        row = {field: record.get(field) for field in FIELDS}
+        if ONLINE_LEARNING and row['DEATH_EVENT'] is not None:
+            online_updater.add_labelled(dict(row))
+        row['DEATH_EVENT'] = result["DEATH_EVENT"]
+        rows.append(row)
+        observed.append(([row[f] for f in FEATURE_NAMES], row['DEATH_EVENT'], result.get("probability_death")))
+    segment_writer.extend(rows)
+    db_buffer.extend(rows)
+    drift_monitor.observe_many(observed)
+
+
+# Ingestão por fila (TELEMETRY_QUEUE=1 e/ou MQTT_HOST): os consumidores
+# predizem em micro-lotes e gravam pelos mesmos buffers
+telemetry_queue = TelemetryQueue(lambda: registry.route(), _gravar_telemetria)
+mqtt_listener = MqttListener(telemetry_queue, model=HeartData)
+
 
 @app.post("/enviarDadosThingsBoard")
-async def enviar_dados_thingsboard(data: HeartData):
+async def enviar_dados_thingsboard(data: HeartData, request: Request, explain: bool = EXPLAIN_PREDICTIONS):
     """
     Endpoint chamado pelo ThingsBoard.
     - Faz predição primeiro
-    - Salva o JSON completo (com DEATH_EVENT predito) no MinIO.
-    - Grava em tabela dados_analise no Postgres.
+    - Enfileira o JSON completo (com DEATH_EVENT predito) num segmento NDJSON do MinIO.
+    - Enfileira o registro para gravação em lote na tabela dados_analise.
     - Retorna predição com todos os dados + DEATH_EVENT predito.
+    
+    Nada bloqueia o event loop: a inferência roda no pool de inferência (com
+    timeout) e as escritas são feitas em lote por threads de fundo.
+    
+    O slot do registry que responde vem do cabeçalho MODEL_ROUTE_HEADER ou
+    da divisão de tráfego; os modelos em sombra são avaliados depois, fora
+    do caminho da resposta.
+    
+    Com ``explain`` (ou EXPLAIN_PREDICTIONS=1) a resposta traz também
+    ``explanation``: a contribuição de cada feature para a probabilidade
+    de óbito (o segmento do MinIO continua só com o registro).
     """
+    metrics.observe_stage("validation", time.perf_counter() - request.state.started)
+    # Convertido uma única vez: preditor, buffers e resposta usam o mesmo registro
+    record = HeartRecord.from_model(data)
     
-    # 0. Fazer a Predição PRIMEIRO
+    # 0. Fazer a Predição PRIMEIRO (DEATH_EVENT recebido não entra: será predito)
     predicted_death_event = None
+    slot, predictor = registry.route(request.headers.get(MODEL_ROUTE_HEADER))
     try:
         if predictor is None:
             logger.error("Predictor é None!")
@@ -157,64 +572,183 @@ async def enviar_dados_thingsboard(data: HeartData):
                 "DEATH_EVENT": None
             }
         
-        # Preparar dados: remover DEATH_EVENT (será predito)
-        data_dict = data.dict()
-        data_dict.pop('DEATH_EVENT', None)
-        
-        # Fazer predição
-        prediction_result = predictor.predict(data_dict)
+        # Fazer predição (agrupada com as requisições concorrentes)
+        prediction_result = await inference_batcher.predict(predictor, record.features)
         predicted_death_event = int(prediction_result["DEATH_EVENT"])
-        logger.info(f"Predição realizada: {prediction_result}")
+        logger.debug("Predição realizada: %s", prediction_result)
+        registry.shadow(record, slot, prediction_result)
+        explanation = None
+        if explain:
+            explanation = await run_stage("explain", inference_executor, INFERENCE_TIMEOUT,
+                                          predictor.explain_values, record.features)
         
+    except Overloaded as e:
+        # Controle de admissão: o dispositivo deve reenviar depois
+        return JSONResponse({"status": "error", "message": str(e), "DEATH_EVENT": None},
+                            status_code=503, headers={"Retry-After": "1"})
     except Exception as e:
-        logger.error(f"Erro ao fazer predição: {str(e)}", exc_info=True)
+        logger.error("Erro ao fazer predição: %s", e, exc_info=True)
         return {
             "status": "error",
             "message": str(e),
             "DEATH_EVENT": None
         }
     
-    # 1. Salvar Dado Bruto no MinIO (COM o DEATH_EVENT predito)
+    # DEATH_EVENT enviado pelo dispositivo é o desfecho real: vai para o aprendizado incremental
+    if ONLINE_LEARNING and record.label is not None:
+        online_updater.add_labelled(record)
+    saved = record.with_label(predicted_death_event)
+    # Serializado uma vez: é a linha do segmento e o corpo da resposta
+    body = saved.to_json()
+    
+    # 1. Salvar Dado Bruto no MinIO (COM o DEATH_EVENT predito), em segmento
+    segment_writer.extend_json([body])
+    
+    # 2. Salvar no Postgres (COM o DEATH_EVENT predito), em lote
+    db_buffer.add(saved.row)
+    # Estatísticas de drift: só enfileira, a atualização é em segundo plano
+    drift_monitor.observe(record.features, predicted_death_event, prediction_result["probability_death"])
+
+    # 3. Retornar resposta com todos os dados + DEATH_EVENT predito
+    if explanation is not None:
+        body = body[:-1] + b',"explanation":' + json.dumps(explanation, separators=(",", ":")).encode() + b"}"
+    logger.debug("Resposta: %s", body)
+    return Response(content=body, media_type="application/json",
+                    headers={"X-Model-Slot": slot, "X-Model-Version": str(predictor.model_version)})
+
+
+@app.post("/enfileirarDadosThingsBoard", status_code=202)
+async def enfileirar_dados_thingsboard(data: Union[HeartData, List[HeartData]]):
+    """
+    Ingestão assíncrona de telemetria: só valida e enfileira (202 Accepted).
+    
+    A predição e a gravação no MinIO/Postgres são feitas pelos consumidores
+    da fila, em micro-lotes. Aceita uma leitura ou uma lista. Com a fila
+    cheia, as leituras que não couberam são recusadas (503 se nenhuma coube)
+    e o dispositivo deve reenviá-las.
+    """
+    if not telemetry_queue.running:
+        return JSONResponse({"status": "error", "message": "Fila de telemetria desativada (TELEMETRY_QUEUE=1)"},
+                            status_code=503)
+    records = [r.dict() for r in (data if isinstance(data, list) else [data])]
+    accepted = telemetry_queue.submit(records)
+    if accepted == 0 and records:
+        return JSONResponse({"status": "error", "message": "Fila de telemetria cheia", "rejected": len(records)},
+                            status_code=503, headers={"Retry-After": "1"})
+    return {"status": "accepted", "queued": accepted, "rejected": len(records) - accepted,
+            "depth": telemetry_queue.depth}
+
+
+@app.get("/analise/diaria")
+async def analise_diaria(days: int = 30):
+    """
+    Agregado diário de dados_analise (registros, óbitos preditos e médias).
+    
+    Lido da view materializada, atualizada a cada SCHEMA_REFRESH_INTERVAL
+    segundos, sem varrer a tabela de registros.
+    """
     try:
-        file_name = f"record_{pd.Timestamp.now().isoformat()}.json"
-        # Montar JSON com DEATH_EVENT predito
-        data_to_save = data.dict()
-        data_to_save['DEATH_EVENT'] = predicted_death_event
-        body = json.dumps(data_to_save)
-        print(f"[DEBUG] Salvando em MinIO - Bucket: {BUCKET}, Arquivo: {file_name}")
-        s3.put_object(Bucket=BUCKET, Key=file_name, Body=body)
-        print(f"[DEBUG] ✅ Arquivo salvo em MinIO com sucesso!")
-        logger.info(f"Dado salvo em MinIO: {file_name}")
+        rows = await run_stage("postgres_query", io_executor, DB_TIMEOUT,
+                               daily_aggregate, engine, max(1, min(days, 3660)))
     except Exception as e:
-        print(f"[DEBUG] ❌ Erro ao salvar em MinIO: {e}")
-        logger.error(f"Erro ao salvar em S3: {e}", exc_info=True)
+        logger.error("Erro ao ler o agregado diário: %s", e)
+        return {"status": "error", "message": str(e)}
+    return {"status": "ok", "days": rows}
+
+
+@app.get("/telemetry/stats")
+def telemetry_stats():
+    """Situação da fila de telemetria e do listener MQTT."""
+    return {**telemetry_queue.stats(), "mqtt": mqtt_listener.stats()}
+
+
+# =========================================================
+# 3) Endpoint de predição em lote (JSON, NDJSON, Arrow IPC, Parquet)
+# =========================================================
+
+def _predizer_lote(predictor: HeartFailurePredictor, body: bytes, media_type: str,
+                   explain: bool = False) -> bytes:
+    """Decodifica, prediz de forma vetorizada e serializa no mesmo formato."""
+    import formats
+
+    df = formats.decode(body, media_type)
+    result = predictor.predict_frame(df, explain=explain)
+    return formats.encode(result, media_type)
+
+
+@app.post("/predizerLote")
+async def predizer_lote(request: Request, explain: bool = False):
+    """
+    Predição em lote para frotas de dispositivos e coortes armazenadas.
+    
+    O formato é definido pelo Content-Type e a resposta volta no mesmo formato:
+    - application/json: lista de registros (ou {"records": [...]})
+    - application/x-ndjson: um registro JSON por linha
+    - application/vnd.apache.arrow.stream: Arrow IPC
+    - application/vnd.apache.parquet: Parquet
+    
+    Todas as linhas são avaliadas numa única passada do ensemble, sem
+    validação pydantic por registro. Os registros não são persistidos.
+    
+    Com ``?explain=true`` cada linha traz ``base_value`` e as colunas
+    ``contrib_<feature>`` (contribuições para probability_death).
+    """
+    import formats
 
-    # 2. Salvar no Postgres (COM o DEATH_EVENT predito)
     try:
-        data_dict = data.dict()
-        data_dict['DEATH_EVENT'] = predicted_death_event
-        df = pd.DataFrame([data_dict])
-        df.to_sql('dados_analise', engine, if_exists='append', index=False)
-        logger.info("Dado salvo em PostgreSQL")
+        media_type = formats.normalize_media_type(request.headers.get("content-type"))
+    except ValueError as e:
+        return Response(content=json.dumps({"status": "error", "message": str(e)}),
+                        status_code=415, media_type=formats.JSON)
+    
+    slot, predictor = registry.route(request.headers.get(MODEL_ROUTE_HEADER))
+    if predictor is None:
+        return Response(content=json.dumps({"status": "error", "message": "Preditor não inicializado"}),
+                        status_code=503, media_type=formats.JSON)
+    
+    body = await request.body()
+    try:
+        content = await run_stage("batch_inference", inference_executor, BATCH_TIMEOUT,
+                                  _predizer_lote, predictor, body, media_type, explain)
     except Exception as e:
-        logger.error(f"Erro ao salvar em PostgreSQL: {e}")
+        logger.error("Erro na predição em lote: %s", e, exc_info=True)
+        return Response(content=json.dumps({"status": "error", "message": str(e)}),
+                        status_code=400, media_type=formats.JSON)
+    
+    return Response(content=content, media_type=media_type,
+                    headers={"X-Model-Slot": slot, "X-Model-Version": str(predictor.model_version)})
 
-    # 3. Retornar resposta com todos os dados + DEATH_EVENT predito
-    response = {
-        "age": data.age,
-        "anaemia": data.anaemia,
-        "creatinine_phosphokinase": data.creatinine_phosphokinase,
-        "diabetes": data.diabetes,
-        "ejection_fraction": data.ejection_fraction,
-        "high_blood_pressure": data.high_blood_pressure,
-        "platelets": data.platelets,
-        "serum_creatinine": data.serum_creatinine,
-        "serum_sodium": data.serum_sodium,
-        "sex": data.sex,
-        "smoking": data.smoking,
-        "time": data.time,
-        "DEATH_EVENT": predicted_death_event
-    }
+
+# =========================================================
+# 4) Predição explicada (contribuição de cada feature)
+# =========================================================
+
+def _explicar(predictor: HeartFailurePredictor, values) -> tuple:
+    """Predição e explicação de um registro (ambas consultam os caches do preditor)."""
+    return predictor.predict_values(values), predictor.explain_values(values)
+
+
+@app.post("/explicar")
+async def explicar(data: HeartData, request: Request):
+    """
+    Predição de um registro com a explicação do risco, sem persistir.
     
-    logger.info(f"Resposta: {response}")
-    return response
\ No newline at end of file
+    ``explanation.contributions`` traz quanto cada feature soma (ou
+    subtrai) à probabilidade de óbito a partir de ``base_value`` (taxa do
+    treino): caminhos das árvores (DT/RF) e vizinhos do KNN, combinados
+    com os pesos do ensemble. ``top`` lista as features de maior peso.
+    """
+    record = HeartRecord.from_model(data)
+    slot, predictor = registry.route(request.headers.get(MODEL_ROUTE_HEADER))
+    if predictor is None:
+        return {"status": "error", "message": "Preditor não inicializado"}
+    try:
+        result, explanation = await run_stage("explain", inference_executor, INFERENCE_TIMEOUT,
+                                              _explicar, predictor, record.features)
+    except Exception as e:
+        logger.error("Erro ao explicar a predição: %s", e, exc_info=True)
+        return {"status": "error", "message": str(e)}
+    if explanation is None:
+        return {"status": "error", "message": "Modelo sem explicação disponível", **result}
+    return {**result, "explanation": explanation, "model_slot": slot,
+            "model_version": str(predictor.model_version)}
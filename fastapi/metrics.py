@@ -0,0 +1,212 @@
+import io
+import os
+import time
+import random
+import cProfile
+import pstats
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fração de requisições perfiladas com cProfile (0 = desligado)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# Buckets de 50 µs a 10 s: cobre desde o ensemble compilado até uploads
+_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+            0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "heart_stage_duration_seconds",
+    "Duração de cada etapa do caminho de requisição",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+EXECUTOR_WAIT = Histogram(
+    "heart_executor_wait_seconds",
+    "Espera na fila do pool antes de a etapa começar a executar",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "heart_request_duration_seconds",
+    "Duração total das requisições HTTP",
+    ["method", "path", "status"],
+    buckets=_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "heart_stage_errors_total",
+    "Falhas por etapa",
+    ["stage"],
+)
+QUEUE_DEPTH = Gauge(
+    "heart_queue_depth",
+    "Registros aguardando processamento por fila/buffer",
+    ["queue"],
+)
+CACHE_EVENTS = Gauge(
+    "heart_prediction_cache",
+    "Contadores do cache de predições (hits, misses, size, hit_rate)",
+    ["field"],
+)
+BATCH_SIZE = Histogram(
+    "heart_inference_batch_size",
+    "Registros por avaliação agrupada do MicroBatcher",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+SHED_REQUESTS = Counter(
+    "heart_inference_shed_total",
+    "Predições recusadas pelo controle de admissão (admission) ou descartadas na fila (expired)",
+    ["reason"],
+)
+DRIFT_PSI = Gauge(
+    "heart_feature_drift_psi",
+    "PSI da janela corrente por feature em relação ao perfil do treino",
+    ["feature"],
+)
+PREDICTED_POSITIVE_RATE = Gauge(
+    "heart_predicted_positive_rate",
+    "Taxa de DEATH_EVENT=1 predito (window = janela corrente, total = desde o início)",
+    ["scope"],
+)
+MODEL_INFO = Gauge(
+    "heart_model_info",
+    "Versão do modelo em uso por slot (valor 1 na versão ativa)",
+    ["slot", "version"],
+)
+
+_recent_profiles: Deque[Dict[str, str]] = deque(maxlen=PROFILE_KEEP)
+_profile_lock = threading.Lock()
+
+
+# Séries já resolvidas por etapa: ``labels()`` custa mais que o próprio
+# ``observe()`` e as etapas são chamadas no caminho quente
+_stage_series: Dict[str, Histogram] = {}
+_wait_series: Dict[str, Histogram] = {}
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Registra a duração de uma etapa."""
+    series = _stage_series.get(stage)
+    if series is None:
+        series = _stage_series[stage] = STAGE_SECONDS.labels(stage)
+    series.observe(seconds)
+
+
+def observe_wait(stage: str, seconds: float) -> None:
+    """Registra a espera de uma etapa na fila do pool."""
+    series = _wait_series.get(stage)
+    if series is None:
+        series = _wait_series[stage] = EXECUTOR_WAIT.labels(stage)
+    series.observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Mede o bloco como uma etapa; exceções também contam em heart_stage_errors_total."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def register_queue(name: str, depth: Callable[[], float]) -> None:
+    """Expõe a profundidade de uma fila, lida no momento da coleta."""
+    QUEUE_DEPTH.labels(name).set_function(depth)
+
+
+def register_cache(cache) -> None:
+    """Expõe os contadores de um PredictionCache."""
+    for field in ("hits", "misses", "size", "hit_rate"):
+        CACHE_EVENTS.labels(field).set_function(lambda f=field: cache.stats()[f])
+
+
+def register_drift(monitor) -> None:
+    """Expõe o PSI por feature e a taxa de predições positivas de um DriftMonitor."""
+    from predict import FEATURE_NAMES
+
+    for feature in FEATURE_NAMES:
+        DRIFT_PSI.labels(feature).set_function(lambda f=feature: monitor.psi_scores.get(f, 0.0))
+    for scope in ("window", "total"):
+        PREDICTED_POSITIVE_RATE.labels(scope).set_function(lambda s=scope: monitor.positive_rate(s))
+
+
+_model_versions: Dict[str, str] = {}
+
+
+def set_model_version(version: str, slot: str = "primary") -> None:
+    """Marca a versão ativa do modelo num slot."""
+    previous = _model_versions.get(slot)
+    if previous is not None:
+        MODEL_INFO.remove(slot, previous)
+    _model_versions[slot] = str(version)
+    MODEL_INFO.labels(slot, str(version)).set(1)
+
+
+def render() -> tuple:
+    """Conteúdo e Content-Type do endpoint /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# ---------- Profiling por amostragem ----------
+
+def should_profile() -> bool:
+    """Sorteia se a requisição atual será perfilada."""
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profile() -> Optional[cProfile.Profile]:
+    """
+    Liga o cProfile, ou retorna None se outro perfil já estiver ativo.
+
+    Só um perfil roda por vez (o interpretador não aceita dois
+    profilers ligados na mesma thread).
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def finish_profile(profiler: cProfile.Profile, label: str, limit: int = 25) -> None:
+    """
+    Encerra o perfil e guarda o resumo (funções por tempo acumulado).
+
+    O cProfile só enxerga a thread do event loop; etapas que rodam nos
+    pools aparecem como espera, e seus tempos estão nos histogramas.
+    """
+    try:
+        profiler.disable()
+    finally:
+        _profile_lock.release()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    stats = out.getvalue()
+    _recent_profiles.append({"label": label, "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "stats": stats})
+    logger.debug("Perfil de %s:\n%s", label, stats)
+
+
+def recent_profiles() -> List[Dict[str, str]]:
+    """Perfis amostrados mais recentes."""
+    return list(_recent_profiles)
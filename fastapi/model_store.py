@@ -0,0 +1,249 @@
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = os.getenv("MODEL_NAME", "heart_failure_ensemble")
+MODEL_SOURCE = os.getenv("MODEL_SOURCE", "minio")  # "minio" ou "mlflow"
+MODEL_PREFIX = os.getenv("MODEL_S3_PREFIX", "modelos")
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/tmp/model_cache")
+
+ARTIFACT_FILE = "model.joblib"
+INDEX_FILE = "index.json"
+
+
+def _sha256(path: Path) -> str:
+    """Calcula o hash SHA-256 do conteúdo de um arquivo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelStore:
+    """
+    Carrega artefatos de modelo versionados com cache local em disco.
+
+    - Busca o artefato no MinIO (``<prefixo>/<nome>/<versão>/model.joblib``)
+      ou no registry do MLflow (``models:/<nome>/<versão>``).
+    - Guarda uma cópia local em ``<cache>/<sha256>/model.joblib``, indexada
+      por hash do conteúdo, de modo que a mesma versão nunca é baixada duas vezes.
+    - Carrega com ``joblib.load(mmap_mode='r')``: os arrays NumPy do modelo
+      ficam mapeados em memória e as páginas são compartilhadas entre os
+      workers do uvicorn que usam o mesmo arquivo.
+    - Se o armazenamento remoto estiver indisponível, usa a última versão
+      em cache (cold start sem retreino) quando a pedida é "latest"; uma
+      versão fixa só é carregada se ela mesma estiver em cache.
+    """
+
+    def __init__(
+        self,
+        s3=None,
+        bucket: Optional[str] = None,
+        model_name: str = MODEL_NAME,
+        source: str = MODEL_SOURCE,
+        prefix: str = MODEL_PREFIX,
+        cache_dir: str = MODEL_CACHE_DIR,
+    ):
+        """
+        Args:
+            s3: Cliente boto3 S3 (MinIO)
+            bucket: Bucket onde os modelos são publicados
+            model_name: Nome do modelo no MinIO/MLflow
+            source: Origem remota ("minio" ou "mlflow")
+            prefix: Prefixo das chaves de modelo no bucket
+            cache_dir: Diretório do cache local
+        """
+        self.s3 = s3
+        self.bucket = bucket
+        self.model_name = model_name
+        self.source = source
+        self.prefix = prefix.strip("/")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # ---------- índice local ----------
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.cache_dir / INDEX_FILE) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        # Escrita atômica: vários workers podem atualizar o índice ao mesmo tempo
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self.cache_dir / INDEX_FILE)
+
+    def _remember(self, version: str, digest: str, current: bool = True) -> None:
+        index = self._read_index()
+        entry = index.setdefault(self.model_name, {"versions": {}})
+        entry["versions"][version] = digest
+        if current or "current" not in entry:
+            entry["current"] = {"version": version, "sha256": digest}
+        self._write_index(index)
+
+    def _add_to_cache(self, tmp_path: Path) -> str:
+        """Move um artefato baixado para o cache, endereçado pelo hash."""
+        digest = _sha256(tmp_path)
+        target = self.cache_dir / digest / ARTIFACT_FILE
+        if target.exists():
+            tmp_path.unlink()
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, target)
+        return digest
+
+    def _cached_path(self, digest: str) -> Optional[Path]:
+        path = self.cache_dir / digest / ARTIFACT_FILE
+        if not path.exists():
+            return None
+        if _sha256(path) != digest:
+            logger.warning("Artefato em cache corrompido: %s", path)
+            return None
+        return path
+
+    # ---------- origens remotas ----------
+
+    def _key(self, version: str) -> str:
+        return f"{self.prefix}/{self.model_name}/{version}/{ARTIFACT_FILE}"
+
+    def _resolve_version(self, version: str) -> str:
+        if version != "latest" or self.source != "minio":
+            return version
+        obj = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}/{self.model_name}/LATEST")
+        return obj["Body"].read().decode().strip()
+
+    def _download_minio(self, version: str, tmp_path: Path) -> None:
+        self.s3.download_file(self.bucket, self._key(version), str(tmp_path))
+
+    def _download_mlflow(self, version: str, tmp_path: Path) -> None:
+        import joblib
+        import mlflow.sklearn
+
+        # O formato do MLflow (cloudpickle) não é mapeável em memória:
+        # converte uma vez para joblib antes de entrar no cache.
+        model = mlflow.sklearn.load_model(f"models:/{self.model_name}/{version}")
+        joblib.dump(model, tmp_path)
+
+    def fetch(self, version: str = "latest", current: bool = True) -> Tuple[str, str]:
+        """
+        Baixa uma versão do armazenamento remoto para o cache local.
+
+        Args:
+            version: Versão do modelo ("latest" resolve a mais recente)
+            current: Marcar como versão atual (usada no fallback sem rede)
+
+        Returns:
+            Tupla (versão resolvida, sha256 do artefato)
+        """
+        resolved = self._resolve_version(version)
+
+        # Versão fixa já em cache: nada a baixar
+        known = self._read_index().get(self.model_name, {}).get("versions", {})
+        if resolved != "latest" and resolved in known and self._cached_path(known[resolved]):
+            digest = known[resolved]
+        else:
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+            os.close(fd)
+            tmp_path = Path(tmp)
+            try:
+                if self.source == "mlflow":
+                    self._download_mlflow(resolved, tmp_path)
+                else:
+                    self._download_minio(resolved, tmp_path)
+                digest = self._add_to_cache(tmp_path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+        self._remember(resolved, digest, current)
+        return resolved, digest
+
+    # ---------- API pública ----------
+
+    def load(self, version: str = "latest", current: bool = True) -> Tuple[Optional[Any], Optional[Dict[str, str]]]:
+        """
+        Carrega o modelo, preferindo o remoto e caindo para o cache local.
+
+        Args:
+            version: Versão desejada ("latest" por padrão)
+            current: Marcar como versão atual (False para versões servidas
+                lado a lado, ex.: challengers)
+
+        Returns:
+            Tupla (modelo, {"version", "sha256"}) ou (None, None) se não
+            houver artefato remoto nem em cache. Sem acesso ao remoto, só
+            "latest" cai para a versão atual do cache: uma versão fixa que
+            não está no cache não é trocada por outra
+        """
+        try:
+            resolved, digest = self.fetch(version, current)
+            logger.info("Modelo %s:%s obtido (%s)", self.model_name, resolved, self.source)
+        except Exception as e:
+            logger.warning("Falha ao buscar modelo remoto, usando cache local: %s", e)
+            entry = self._read_index().get(self.model_name, {})
+            if version != "latest":
+                if version not in entry.get("versions", {}):
+                    logger.error("Versão %s:%s não está no cache local", self.model_name, version)
+                    return None, None
+                resolved, digest = version, entry["versions"][version]
+            elif "current" in entry:
+                resolved, digest = entry["current"]["version"], entry["current"]["sha256"]
+            else:
+                return None, None
+
+        path = self._cached_path(digest)
+        if path is None:
+            return None, None
+
+        # joblib (e o sklearn, na desserialização) só são carregados aqui
+        import joblib
+
+        model = joblib.load(path, mmap_mode="r")
+        return model, {"version": resolved, "sha256": digest}
+
+    def save(self, model: Any, version: str, publish: bool = False) -> str:
+        """
+        Serializa um modelo no cache local e, opcionalmente, publica no MinIO.
+
+        O dump é feito sem compressão para permitir o mmap na carga.
+
+        Args:
+            model: Modelo treinado
+            version: Versão a registrar
+            publish: Se True, envia ao MinIO e atualiza o ponteiro LATEST
+
+        Returns:
+            sha256 do artefato
+        """
+        import joblib
+
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        os.close(fd)
+        tmp_path = Path(tmp)
+        joblib.dump(model, tmp_path)
+        digest = self._add_to_cache(tmp_path)
+        self._remember(version, digest)
+
+        if publish:
+            path = self.cache_dir / digest / ARTIFACT_FILE
+            self.s3.upload_file(str(path), self.bucket, self._key(version))
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}/{self.model_name}/LATEST",
+                Body=version.encode(),
+            )
+            logger.info("Modelo %s:%s publicado no MinIO", self.model_name, version)
+
+        return digest
@@ -0,0 +1,362 @@
+"""
+Aprendizado incremental do ensemble servido (ONLINE_LEARNING=1).
+
+As versões ``<base>+online.<n>`` existem só na memória do processo:
+
+- cada worker do uvicorn atualiza a sua própria cópia do modelo com os
+  registros rotulados que ele recebeu, então workers diferentes servem
+  versões incrementais diferentes;
+- nada é publicado no ModelStore: ao reiniciar, o worker volta à versão
+  base (MODEL_VERSION) e as atualizações se perdem;
+- no encerramento, os registros ainda pendentes não geram atualização e
+  são contados em ``dropped``.
+
+Os rótulos continuam gravados em dados_analise/MinIO; para tornar uma
+atualização permanente, retreine e publique (training.py --publish).
+"""
+
+import os
+import copy
+from collections import deque
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import logging
+
+from buffering import BufferedWriter
+
+# scikit-learn/pandas só são carregados quando há uma atualização
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# Liga o aprendizado incremental (desligado por padrão: altera o modelo em produção)
+ONLINE_LEARNING = os.getenv("ONLINE_LEARNING", "0") == "1"
+# Registros rotulados acumulados antes de cada atualização
+ONLINE_MIN_RECORDS = int(os.getenv("ONLINE_MIN_RECORDS", "50"))
+# Intervalo (s) entre verificações do buffer
+ONLINE_INTERVAL = float(os.getenv("ONLINE_INTERVAL", "60"))
+# Janela de registros recentes usada para as novas árvores
+ONLINE_WINDOW = int(os.getenv("ONLINE_WINDOW", "2000"))
+# Árvores novas por atualização e limite da floresta (as mais antigas saem)
+ONLINE_NEW_TREES = int(os.getenv("ONLINE_NEW_TREES", "10"))
+ONLINE_MAX_TREES = int(os.getenv("ONLINE_MAX_TREES", "200"))
+# Limite do conjunto de referência do KNN (os pontos mais antigos saem)
+ONLINE_KNN_MAX = int(os.getenv("ONLINE_KNN_MAX", "5000"))
+
+
+def _member_types() -> Tuple[tuple, tuple]:
+    """Classes de árvore e de floresta (import do sklearn sob demanda)."""
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier, ExtraTreeClassifier
+
+    return (DecisionTreeClassifier, ExtraTreeClassifier), (RandomForestClassifier, ExtraTreesClassifier)
+
+
+def _trees_of(estimator) -> list:
+    trees, forests = _member_types()
+    if isinstance(estimator, trees):
+        return [estimator]
+    if isinstance(estimator, forests):
+        return list(estimator.estimators_)
+    return []
+
+
+def _remappable(estimator) -> bool:
+    """Membros cujo espaço normalizado pode ser convertido sem retreino."""
+    from sklearn.neighbors import KNeighborsClassifier
+
+    trees, forests = _member_types()
+    return isinstance(estimator, trees + forests + (KNeighborsClassifier,))
+
+
+def remap_member(estimator, old, new) -> None:
+    """
+    Converte um membro ajustado da normalização ``old`` para ``new``, no lugar.
+
+    A normalização é afim e crescente em cada feature, então os limiares
+    das árvores são convertidos ((t·σ₀ + μ₀ - μ₁) / σ₁) e cada divisão
+    continua separando as mesmas amostras (exceto amostras exatamente sobre
+    o limiar, onde o arredondamento em float32 do sklearn pode mudar o
+    lado). No KNN o conjunto
+    de referência é reescalado (as distâncias mudam junto com a escala,
+    como se o modelo tivesse sido treinado com a nova normalização).
+
+    Args:
+        estimator: Membro ajustado (árvore, floresta ou KNN)
+        old: FeaturePreprocessor com que o membro foi treinado
+        new: FeaturePreprocessor atualizado
+    """
+    from sklearn.neighbors import KNeighborsClassifier
+
+    if isinstance(estimator, KNeighborsClassifier):
+        raw = estimator._fit_X * old.scale_ + old.mean_
+        labels = estimator.classes_[estimator._y]
+        estimator.fit((raw - new.mean_) / new.scale_, labels)
+        return
+    for tree in _trees_of(estimator):
+        t = tree.tree_
+        split = t.children_left != -1
+        f = t.feature[split]
+        # O array de limiares é a memória da própria árvore: escrita no lugar
+        t.threshold[split] = (t.threshold[split] * old.scale_[f] + old.mean_[f] - new.mean_[f]) / new.scale_[f]
+
+
+class OnlineUpdater(BufferedWriter):
+    """
+    Atualização incremental do ensemble a partir de registros rotulados.
+
+    Os registros (features brutas + DEATH_EVENT real) são acumulados como
+    num BufferedWriter e, a cada ``min_records``, uma thread de fundo:
+
+    1. atualiza média/variância do FeaturePreprocessor (``partial_fit``) e
+       converte os membros para a nova normalização (``remap_member``);
+    2. acrescenta os registros ao conjunto de referência do KNN;
+    3. treina ``new_trees`` árvores novas na floresta (warm start) sobre a
+       janela de registros recentes, descartando as mais antigas acima de
+       ``max_trees``;
+    4. entrega o Pipeline atualizado a ``on_update``, que troca o preditor
+       em uso de uma vez (as requisições em andamento terminam com o anterior).
+
+    A árvore de decisão isolada não tem forma incremental e é mantida
+    (apenas convertida para a nova normalização). Só registros com rótulo
+    real devem ser enviados: aprender com as próprias predições apenas
+    reforçaria os erros do modelo.
+
+    O custo de cada atualização depende do lote e da janela, não do total
+    de registros já vistos.
+    """
+
+    def __init__(
+        self,
+        get_predictor: Callable[[], Any],
+        on_update: Callable[["Pipeline", str], None],
+        feature_names: Sequence[str],
+        min_records: int = ONLINE_MIN_RECORDS,
+        interval: float = ONLINE_INTERVAL,
+        window: int = ONLINE_WINDOW,
+        new_trees: int = ONLINE_NEW_TREES,
+        max_trees: int = ONLINE_MAX_TREES,
+        knn_max: int = ONLINE_KNN_MAX,
+    ):
+        """
+        Args:
+            get_predictor: Retorna o HeartFailurePredictor em uso
+            on_update: Recebe (modelo atualizado, versão) e faz a troca
+            feature_names: Ordem das features do modelo
+            min_records: Registros rotulados por atualização
+            interval: Intervalo (s) entre verificações do buffer
+            window: Registros recentes usados para treinar árvores novas
+            new_trees: Árvores acrescentadas à floresta por atualização
+            max_trees: Tamanho máximo da floresta
+            knn_max: Tamanho máximo do conjunto de referência do KNN
+        """
+        super().__init__(max_records=min_records, max_delay=interval,
+                         max_pending=max(window, min_records) * 10,
+                         name="online-updater", stage="online_update")
+        self.get_predictor = get_predictor
+        self.on_update = on_update
+        self.feature_names = list(feature_names)
+        self.new_trees = new_trees
+        self.max_trees = max_trees
+        self.knn_max = knn_max
+        self._window_X: deque = deque(maxlen=window)
+        self._window_y: deque = deque(maxlen=window)
+        self._base_version = None
+        self._last_version = None
+        self.updates = 0
+        self.records_seen = 0
+
+    def add_labelled(self, data: Dict[str, Any]) -> bool:
+        """
+        Enfileira um registro se ele tiver DEATH_EVENT real e features numéricas.
+
+        Returns:
+            True se o registro foi aceito
+        """
+        label = data.get("DEATH_EVENT")
+        if label is None:
+            return False
+        try:
+            x = np.fromiter((float(data.get(f, 0)) for f in self.feature_names),
+                            dtype=np.float64, count=len(self.feature_names))
+            label = int(label)
+        except (TypeError, ValueError):
+            return False
+        if not np.isfinite(x).all():
+            return False
+        self.add((x, label))
+        return True
+
+    def extend_csv(self, fileobj: BinaryIO, chunk_rows: int = 50000) -> int:
+        """
+        Enfileira as linhas rotuladas de um CSV (ex.: upload em /enviarDados).
+
+        Args:
+            fileobj: CSV aberto em modo binário
+            chunk_rows: Linhas lidas por bloco
+
+        Returns:
+            Quantidade de registros enfileirados (0 se não houver DEATH_EVENT)
+        """
+        import pandas as pd
+
+        fileobj.seek(0)
+        header = pd.read_csv(fileobj, nrows=0).columns
+        if "DEATH_EVENT" not in header:
+            return 0
+        fileobj.seek(0)
+        usecols = [c for c in self.feature_names if c in header] + ["DEATH_EVENT"]
+        added = 0
+        for chunk in pd.read_csv(fileobj, usecols=usecols, chunksize=chunk_rows):
+            chunk = chunk.reindex(columns=self.feature_names + ["DEATH_EVENT"], fill_value=0)
+            values = chunk.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+            values = values[np.isfinite(values).all(axis=1)]
+            self.extend([(row[:-1], int(row[-1])) for row in values])
+            added += len(values)
+        return added
+
+    def flush(self) -> int:
+        # Só atualiza com lotes completos; a verificação periódica não força
+        if self.depth < self.max_records:
+            return 0
+        return super().flush()
+
+    def close(self) -> None:
+        """
+        Para a thread de fundo sem atualizar o modelo com o que restou.
+
+        O modelo incremental só existe neste processo e seria descartado
+        logo em seguida; os registros pendentes são contados em ``dropped``.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            remaining, self._buffer = len(self._buffer), []
+            self._bytes = 0
+        if remaining:
+            self.dropped += remaining
+            logger.warning("[%s] %d registros rotulados não usados no encerramento "
+                           "(as versões incrementais não são persistidas)",
+                           self.name, remaining)
+
+    def _write(self, batch: List[Tuple[np.ndarray, int]]) -> None:
+        predictor = self.get_predictor()
+        if predictor is None or predictor.model is None:
+            raise RuntimeError("Preditor não inicializado")
+
+        X_new = np.vstack([x for x, _ in batch])
+        y_new = np.asarray([y for _, y in batch], dtype=np.int64)
+
+        # Uma versão carregada de fora (nova publicação) vira a nova base
+        if predictor.model_version != self._last_version:
+            self._base_version = predictor.model_version
+            self.updates = 0
+
+        model, stats = self.update(predictor.preprocessor, predictor.model, X_new, y_new)
+        self.updates += 1
+        self.records_seen += len(batch)
+        version = f"{self._base_version}+online.{self.updates}"
+        self._last_version = version
+
+        self.on_update(model, version)
+        logger.info("Modelo atualizado incrementalmente: %s (%s)", version, stats)
+
+    def update(self, preprocessor, ensemble, X_new: np.ndarray,
+               y_new: np.ndarray) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Gera uma cópia atualizada do modelo com um lote rotulado.
+
+        O modelo em uso não é alterado (as requisições continuam usando-o
+        até a troca).
+
+        Args:
+            preprocessor: FeaturePreprocessor em uso (ou None)
+            ensemble: VotingClassifier ajustado
+            X_new: Features brutas (n, n_features)
+            y_new: Rótulos reais
+
+        Returns:
+            Tupla (modelo atualizado — Pipeline se houver preprocessor —,
+            resumo da atualização)
+        """
+        from sklearn.ensemble import VotingClassifier
+        from sklearn.neighbors import KNeighborsClassifier
+        from sklearn.pipeline import Pipeline
+
+        if not isinstance(ensemble, VotingClassifier):
+            raise TypeError("Atualização incremental suportada apenas para o VotingClassifier")
+        # deepcopy também tira os arrays do mmap (somente leitura)
+        ensemble = copy.deepcopy(ensemble)
+        members = ensemble.estimators_
+        stats: Dict[str, Any] = {"records": len(y_new)}
+
+        known = np.isin(y_new, ensemble.le_.classes_)
+        X_new, y_new = X_new[known], y_new[known]
+        y_enc = ensemble.le_.transform(y_new)
+        # A janela só é confirmada no fim: um lote que falha volta ao buffer
+        maxlen = self._window_y.maxlen
+        window_X = np.vstack([*self._window_X, X_new])[-maxlen:]
+        window_y = np.concatenate([np.asarray(self._window_y, dtype=y_enc.dtype), y_enc])[-maxlen:]
+
+        # 1) Normalização acumulada
+        new_prep = preprocessor
+        if preprocessor is not None and hasattr(preprocessor, "n_samples_seen_") \
+                and all(_remappable(m) for m in members):
+            new_prep = copy.deepcopy(preprocessor).partial_fit(X_new)
+            for member in members:
+                remap_member(member, preprocessor, new_prep)
+            stats["scaler_samples"] = new_prep.n_samples_seen_
+        elif preprocessor is not None:
+            logger.warning("Normalização mantida fixa (preprocessor sem estatísticas acumuladas "
+                           "ou membro não convertível)")
+
+        def scale(X):
+            return new_prep.transform(X) if new_prep is not None else np.asarray(X, dtype=np.float64)
+
+        X_scaled = scale(X_new)
+        _, forests = _member_types()
+        for member in members:
+            # 2) KNN: novos pontos no conjunto de referência
+            if isinstance(member, KNeighborsClassifier) and len(X_scaled):
+                fit_X = np.vstack([member._fit_X, X_scaled])[-self.knn_max:]
+                labels = np.concatenate([member.classes_[member._y], y_enc])[-self.knn_max:]
+                member.fit(fit_X, labels)
+                stats["knn_points"] = len(fit_X)
+
+            # 3) Floresta: árvores novas sobre a janela recente
+            elif isinstance(member, forests) and self.new_trees > 0:
+                if len(np.unique(window_y)) < len(ensemble.le_.classes_):
+                    stats["forest"] = "janela sem todas as classes"
+                    continue
+                member.set_params(warm_start=True,
+                                  n_estimators=len(member.estimators_) + self.new_trees)
+                member.fit(scale(window_X), window_y)
+                if len(member.estimators_) > self.max_trees:
+                    del member.estimators_[:len(member.estimators_) - self.max_trees]
+                    member.n_estimators = len(member.estimators_)
+                stats["forest_trees"] = len(member.estimators_)
+
+        self._window_X.extend(X_new)
+        self._window_y.extend(y_enc)
+        if new_prep is None:
+            return ensemble, stats
+        return Pipeline([('preprocessor', new_prep), ('ensemble', ensemble)]), stats
+
+    def stats(self) -> Dict[str, Any]:
+        """Situação do aprendizado incremental."""
+        return {
+            "enabled": self._thread is not None,
+            "pending": self.depth,
+            "min_records": self.max_records,
+            "window": len(self._window_y),
+            "updates": self.updates,
+            "records_seen": self.records_seen,
+            "base_version": self._base_version,
+            "current_version": self._last_version,
+            "dropped": self.dropped,
+        }
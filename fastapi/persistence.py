@@ -0,0 +1,114 @@
+import io
+import os
+import csv
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from sqlalchemy import column, inspect, table
+import logging
+
+from buffering import BufferedWriter, RejectHandler
+from schema import ANALYSIS_TABLE, ensure_schema
+
+logger = logging.getLogger(__name__)
+
+DB_FLUSH_MAX_RECORDS = int(os.getenv("DB_FLUSH_MAX_RECORDS", "500"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+
+
+def copy_records(engine, table_name: str, columns: List[str], rows) -> None:
+    """
+    Grava linhas via protocolo COPY do Postgres numa única transação.
+
+    Args:
+        engine: Engine SQLAlchemy (dialeto postgresql/psycopg2)
+        table_name: Tabela de destino
+        columns: Colunas, na ordem dos valores de cada linha
+        rows: Iterável de sequências de valores (None vira NULL)
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(["" if v is None else v for v in row])
+    buf.seek(0)
+
+    cols = ", ".join(f'"{c}"' for c in columns)
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            cur.copy_expert(f'COPY "{table_name}" ({cols}) FROM STDIN WITH (FORMAT csv)', buf)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+class PostgresWriteBuffer(BufferedWriter):
+    """
+    Buffer write-behind para a tabela dados_analise.
+
+    Substitui o ``df.to_sql(..., if_exists='append')`` por registro: os
+    registros preditos são gravados em lote, via COPY no Postgres ou
+    INSERT multi-linha em outros bancos (ex.: SQLite nos benchmarks), com
+    um único commit por flush.
+
+    Os registros são dicionários ou tuplas já na ordem de ``columns``
+    (ex.: ``HeartRecord.row``), gravadas sem conversão.
+
+    Um lote recusado pelo banco é dividido até isolar as linhas com
+    problema (ex.: valor fora da faixa de SMALLINT); só elas vão para
+    ``on_reject`` e as demais são gravadas.
+    """
+
+    def __init__(self, engine, table_name: str, columns: List[str],
+                 max_records: int = DB_FLUSH_MAX_RECORDS,
+                 max_delay: float = DB_FLUSH_INTERVAL,
+                 on_reject: Optional[RejectHandler] = None):
+        """
+        Args:
+            engine: Engine SQLAlchemy
+            table_name: Tabela de destino
+            columns: Colunas gravadas (chaves dos registros)
+            max_records: Tamanho do lote que dispara um flush
+            max_delay: Intervalo máximo (s) entre flushes
+            on_reject: Recebe as linhas recusadas e seus erros
+        """
+        super().__init__(max_records=max_records, max_delay=max_delay, name="postgres-writer",
+                         stage="postgres_insert", isolate_failures=True, on_reject=on_reject)
+        self.engine = engine
+        self.table_name = table_name
+        self.columns = list(columns)
+        self._table = table(table_name, *[column(c) for c in self.columns])
+        self._table_ready = False
+
+    def _ensure_table(self) -> None:
+        # A tabela é criada pelo ensure_schema (sob o seu advisory lock), e não
+        # com o esquema inferido do lote: um flush anterior à etapa de
+        # inicialização não deixa uma tabela simples para ser migrada depois
+        if self._table_ready:
+            return
+        if not inspect(self.engine).has_table(self.table_name):
+            if self.table_name != ANALYSIS_TABLE:
+                raise RuntimeError(f"Tabela {self.table_name} não existe")
+            ensure_schema(self.engine)
+        self._table_ready = True
+
+    def _values(self, record: Union[Dict[str, Any], tuple]) -> Sequence[Any]:
+        if isinstance(record, tuple):
+            return record
+        return [record.get(c) for c in self.columns]
+
+    def _write(self, batch: List[Union[Dict[str, Any], tuple]]) -> None:
+        self._ensure_table()
+        if self.engine.dialect.name == "postgresql":
+            copy_records(
+                self.engine, self.table_name, self.columns,
+                (self._values(record) for record in batch)
+            )
+        else:
+            rows = [dict(zip(self.columns, self._values(record))) for record in batch]
+            with self.engine.begin() as conn:
+                # executemany: o SQLAlchemy agrupa em INSERTs multi-linha
+                conn.execute(self._table.insert(), rows)
+        logger.debug("%d registros gravados em %s", len(batch), self.table_name)
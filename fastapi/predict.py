@@ -1,14 +1,35 @@
-import pandas as pd
+import os
+import time
+
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier, VotingClassifier
-from typing import Dict, Any, Tuple
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Sequence, Tuple
 import logging
 
+from cache import PredictionCache
+from metrics import observe_stage
+
+# pandas e scikit-learn são importados só quando usados: importar este
+# módulo (FEATURE_NAMES, registry) não deve custar a carga do sklearn
+if TYPE_CHECKING:
+    import pandas as pd
+    from sklearn.pipeline import Pipeline
+
 logger = logging.getLogger(__name__)
 
+# Busca de vizinhos do membro KNN: o índice (KD-tree/ball-tree) é construído
+# no treino e serializado junto com o artefato
+KNN_ALGORITHM = os.getenv("KNN_ALGORITHM", "kd_tree")  # kd_tree, ball_tree, brute ou auto
+KNN_LEAF_SIZE = int(os.getenv("KNN_LEAF_SIZE", "30"))
+# Explicações guardadas por preditor (mesma chave canônica do cache de predições)
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "10000"))
+
+# Ordem das features usada no treino
+FEATURE_NAMES = [
+    'age', 'anaemia', 'creatinine_phosphokinase', 'diabetes',
+    'ejection_fraction', 'high_blood_pressure', 'platelets',
+    'serum_creatinine', 'serum_sodium', 'sex', 'smoking', 'time'
+]
+
 
 class HeartFailurePredictor:
     """
@@ -16,59 +37,89 @@ class HeartFailurePredictor:
     Implementa o modelo Ensemble (Voting Classifier) treinado no notebook.
     """
     
-    def __init__(self, model=None):
+    def __init__(self, model=None, model_version: str = None, cache=None):
         """
         Inicializa o preditor com o modelo carregado do MLflow.
         
         Args:
-            model: Modelo treinado (sklearn). Se None, usa o ensemble padrão.
+            model: Modelo treinado (sklearn). Se for um Pipeline com o
+                pré-processamento ajustado no treino, ele é separado do
+                estimador e aplicado direto em NumPy.
+            model_version: Versão do artefato carregado
+            cache: PredictionCache opcional consultado antes da inferência
+                (pode ser compartilhado entre preditores; é invalidado
+                quando a versão do modelo muda)
         """
-        self.model = model
-        self.scaler = StandardScaler()
-        self.feature_names = [
-            'age', 'anaemia', 'creatinine_phosphokinase', 'diabetes',
-            'ejection_fraction', 'high_blood_pressure', 'platelets',
-            'serum_creatinine', 'serum_sodium', 'sex', 'smoking', 'time'
-        ]
+        from preprocessing import split_model
+        from inference import CompiledEnsemble
+        from explain import ExplanationEngine
+
+        self.model, self.preprocessor = split_model(model)
+        self.model_version = model_version
+        self.cache = cache
+        # Motor de passada única (None se o modelo não for um VotingClassifier)
+        self.engine = CompiledEnsemble.from_model(self.model)
+        self.feature_names = list(FEATURE_NAMES)
+        self._feature_index = {name: j for j, name in enumerate(self.feature_names)}
+        # Explicações: tabelas por folha das árvores e conjunto do KNN
+        # preparados aqui, uma vez por modelo (None se nada for explicável)
+        self.explainer = ExplanationEngine.from_model(self.model, self.engine, self.feature_names)
+        self.explanation_cache = PredictionCache(self.feature_names, max_size=EXPLANATION_CACHE_SIZE)
+        
+        if self.model is not None and self.preprocessor is None:
+            logger.warning("Modelo sem pré-processamento ajustado; features usadas sem normalização")
         
         logger.info("HeartFailurePredictor inicializado")
     
-    def prepare_data(self, data: Dict[str, Any]) -> pd.DataFrame:
+    def prepare_data(self, data: Dict[str, Any]) -> np.ndarray:
         """
         Prepara os dados de entrada para predição.
         
+        Apenas aplica a média/escala calculadas no treino sobre um array
+        float contíguo; nada é ajustado por requisição.
+        
         Args:
             data: Dicionário com os dados do paciente
             
         Returns:
-            DataFrame preparado e normalizado
+            Matriz (1, n_features) preparada e normalizada
         """
+        start = time.perf_counter()
         try:
-            # Criar DataFrame com os dados
-            df = pd.DataFrame([data])
-            
-            # Remover coluna DEATH_EVENT se existir (é o target, não feature)
-            df = df.drop(columns=['DEATH_EVENT'], errors='ignore')
-            
-            # Garantir que todas as features estão presentes
-            for feature in self.feature_names:
-                if feature not in df.columns:
-                    df[feature] = 0
-            
-            # Manter apenas as features esperadas
-            df = df[self.feature_names]
-            
-            # Normalizar os dados
-            df_scaled = self.scaler.fit_transform(df)
-            df_scaled = pd.DataFrame(df_scaled, columns=self.feature_names)
-            
-            logger.debug(f"Dados preparados: {df_scaled.shape}")
-            return df_scaled
+            # Features ausentes ficam com 0; DEATH_EVENT (target) é ignorado
+            X = np.fromiter(
+                (float(data.get(feature, 0)) for feature in self.feature_names),
+                dtype=np.float64,
+                count=len(self.feature_names)
+            ).reshape(1, -1)
+            return self._normalize(X, start)
             
         except Exception as e:
-            logger.error(f"Erro ao preparar dados: {str(e)}")
+            logger.error("Erro ao preparar dados: %s", e)
             raise
     
+    def prepare_values(self, values: Sequence[float]) -> np.ndarray:
+        """
+        Como ``prepare_data``, para valores já na ordem de ``feature_names``.
+        
+        Args:
+            values: Features do paciente (ex.: ``HeartRecord.features``)
+            
+        Returns:
+            Matriz (1, n_features) preparada e normalizada
+        """
+        start = time.perf_counter()
+        X = np.array(values, dtype=np.float64).reshape(1, -1)
+        return self._normalize(X, start)
+    
+    def _normalize(self, X: np.ndarray, start: float) -> np.ndarray:
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X, copy=False)
+        
+        observe_stage("prepare_data", time.perf_counter() - start)
+        logger.debug("Dados preparados: %s", X.shape)
+        return X
+    
     def predict(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Realiza a predição de risco de morte por insuficiência cardíaca.
@@ -77,8 +128,24 @@ class HeartFailurePredictor:
             data: Dicionário com os dados do paciente
             
         Returns:
-            Dicionário com DEATH_EVENT (inteiro 0 ou 1) e confiança
+            Dicionário com DEATH_EVENT (inteiro 0 ou 1), confiança,
+            probabilidade e, para o ensemble, o voto de cada membro
         """
+        return self._predict(data, None)
+    
+    def predict_values(self, values: Sequence[float]) -> Dict[str, Any]:
+        """
+        Predição de um registro já convertido, sem dicionário intermediário.
+        
+        Args:
+            values: Features na ordem de ``feature_names`` (ex.: ``HeartRecord.features``)
+            
+        Returns:
+            O mesmo resultado de ``predict``
+        """
+        return self._predict(None, values)
+    
+    def _predict(self, data: Optional[Dict[str, Any]], values: Optional[Sequence[float]]) -> Dict[str, Any]:
         try:
             if self.model is None:
                 logger.warning("Modelo não carregado")
@@ -89,69 +156,352 @@ class HeartFailurePredictor:
                     "probability_death": 0.0
                 }
             
+            # Leituras repetidas saem do cache, sem passar pelo ensemble
+            key = None
+            if self.cache is not None:
+                key = self.cache.key(data) if values is None else self.cache.key_values(values)
+                cached = self.cache.get(key, self.model_version)
+                if cached is not None:
+                    return cached
+            
             # Preparar dados
-            df_prepared = self.prepare_data(data)
+            X = self.prepare_data(data) if values is None else self.prepare_values(values)
             
-            # Fazer predição
-            prediction = int(self.model.predict(df_prepared)[0])
+            # Rótulo, probabilidade e votos numa única passada do ensemble
+            result = self._result(0, *self._evaluate(X))
             
-            # Obter probabilidades
-            try:
-                probabilities = self.model.predict_proba(df_prepared)[0]
-                probability_death = float(probabilities[1]) if len(probabilities) > 1 else 0.0
-                confidence = float(np.max(probabilities))
-            except:
-                probability_death = float(prediction)
-                confidence = 0.0
-            
-            # Interpretar resultado
-            risk = "ALTO RISCO" if prediction == 1 else "BAIXO RISCO"
-            
-            result = {
-                "DEATH_EVENT": prediction,
-                "risk": risk,
-                "confidence": round(confidence, 4),
-                "probability_death": round(probability_death, 4)
-            }
+            if self.cache is not None:
+                self.cache.put(key, self.model_version, result)
             
-            logger.info(f"Predição realizada: {result}")
+            logger.debug("Predição realizada: %s", result)
             return result
             
         except Exception as e:
-            logger.error(f"Erro ao fazer predição: {str(e)}")
+            logger.error("Erro ao fazer predição: %s", e)
             raise
     
-    def predict_batch(self, data_list: list) -> list:
+    def prepare_batch(self, data_list: list) -> Tuple[np.ndarray, list, Dict[int, str]]:
         """
-        Realiza predições em lote.
+        Monta uma única matriz NumPy para um lote de registros.
         
         Args:
             data_list: Lista de dicionários com dados dos pacientes
             
         Returns:
-            Lista de resultados de predição
+            Tupla (matriz normalizada, índices das linhas válidas,
+            mapa índice -> mensagem de erro das linhas inválidas)
         """
-        results = []
-        for data in data_list:
+        start = time.perf_counter()
+        n_features = len(self.feature_names)
+        X = np.zeros((len(data_list), n_features), dtype=np.float64)
+        valid = np.ones(len(data_list), dtype=bool)
+        errors = {}
+        
+        for i, data in enumerate(data_list):
             try:
-                result = self.predict(data)
-                results.append(result)
+                # Features ausentes ficam com 0, como em prepare_data
+                X[i] = [float(data.get(feature, 0)) for feature in self.feature_names]
             except Exception as e:
-                logger.error(f"Erro em predição em lote: {str(e)}")
-                results.append({
-                    "prediction": -1,
-                    "risk": "ERRO",
+                valid[i] = False
+                errors[i] = str(e)
+        
+        valid_idx = np.flatnonzero(valid).tolist()
+        X = X[valid]
+        if len(X) == 0:
+            return X, valid_idx, errors
+        
+        # Uma única transformação para o lote inteiro
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X, copy=False)
+        
+        observe_stage("prepare_data", time.perf_counter() - start)
+        logger.debug("Lote preparado: %s", X.shape)
+        return X, valid_idx, errors
+    
+    def _evaluate(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Any]:
+        """
+        Executa o modelo uma única vez e retorna rótulos e probabilidades juntos.
+        
+        Para o ensemble usa o CompiledEnsemble (cada membro avaliado uma vez);
+        para outros modelos usa predict_proba, ou apenas predict.
+        
+        Args:
+            X: Matriz já normalizada
+            
+        Returns:
+            Tupla (rótulos, probabilidade de morte, confiança, votos por
+            membro ou None)
+        """
+        start = time.perf_counter()
+        try:
+            return self._evaluate_model(X)
+        finally:
+            observe_stage("model_eval", time.perf_counter() - start)
+    
+    def _evaluate_model(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Any]:
+        if self.engine is not None:
+            return self.engine.evaluate(X)
+        
+        model = self.model
+        if not hasattr(model, 'predict_proba'):
+            labels = np.asarray(model.predict(X)).astype(int)
+            return labels, labels.astype(np.float64), np.zeros(len(labels)), None
+        
+        classes = np.asarray(model.classes_)
+        probabilities = model.predict_proba(X)
+        labels = classes[np.argmax(probabilities, axis=1)].astype(int)
+        death_idx = np.flatnonzero(classes == 1)
+        probability_death = probabilities[:, death_idx[0]] if len(death_idx) else np.zeros(len(labels))
+        confidence = probabilities.max(axis=1)
+        return labels, probability_death, confidence, None
+    
+    def _result(self, pos: int, labels: np.ndarray, probability_death: np.ndarray,
+                confidence: np.ndarray, votes: Any) -> Dict[str, Any]:
+        """Resultado de uma linha da avaliação (formato de ``predict``)."""
+        prediction = int(labels[pos])
+        result = {
+            "DEATH_EVENT": prediction,
+            "risk": "ALTO RISCO" if prediction == 1 else "BAIXO RISCO",
+            "confidence": round(float(confidence[pos]), 4),
+            "probability_death": round(float(probability_death[pos]), 4)
+        }
+        if votes is not None:
+            result["votes"] = dict(zip(self.engine.names, votes[pos].tolist()))
+        return result
+    
+    def cached(self, values: Sequence[float]) -> Tuple[Optional[tuple], Optional[Dict[str, Any]]]:
+        """
+        Consulta o cache para valores na ordem de ``feature_names``.
+        
+        Returns:
+            Tupla (chave do cache ou None, resultado em cache ou None)
+        """
+        if self.model is None or self.cache is None:
+            return None, None
+        key = self.cache.key_values(values)
+        return key, self.cache.get(key, self.model_version)
+    
+    def predict_rows(self, rows: Sequence[Sequence[float]],
+                     keys: Optional[Sequence[Optional[tuple]]] = None) -> List[Dict[str, Any]]:
+        """
+        Predição de vários registros já convertidos numa única passada do ensemble.
+        
+        Cada linha pode vir de uma requisição diferente (MicroBatcher); os
+        resultados têm o formato de ``predict``.
+        
+        Args:
+            rows: Valores na ordem de ``feature_names``, um registro por linha
+            keys: Chaves de cache (de ``cached``) para guardar os resultados
+            
+        Returns:
+            Lista de resultados, na ordem de ``rows``
+        """
+        if self.model is None:
+            return [self.predict_values(values) for values in rows]
+        
+        start = time.perf_counter()
+        X = self._normalize(np.array(rows, dtype=np.float64), start)
+        evaluation = self._evaluate(X)
+        results = [self._result(pos, *evaluation) for pos in range(len(rows))]
+        
+        if self.cache is not None and keys is not None:
+            for key, result in zip(keys, results):
+                self.cache.put(key, self.model_version, result)
+        return results
+    
+    def explain_values(self, values: Sequence[float]) -> Optional[Dict[str, Any]]:
+        """
+        Contribuição de cada feature para a ``probability_death`` de um registro.
+        
+        Args:
+            values: Features na ordem de ``feature_names``
+            
+        Returns:
+            {"base_value", "contributions", "top"[, "unexplained"]} ou None
+            se o modelo não for explicável
+        """
+        return self.explain_rows([values])[0]
+    
+    def explain_rows(self, rows: Sequence[Sequence[float]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Explicações de vários registros numa única passada vetorizada.
+        
+        ``base_value`` + a soma das contribuições (+ ``unexplained``) é a
+        ``probability_death`` da predição. Registros repetidos saem do
+        cache de explicações (invalidado quando a versão do modelo muda).
+        
+        Args:
+            rows: Valores na ordem de ``feature_names``, um registro por linha
+            
+        Returns:
+            Lista de explicações (None se o modelo não for explicável)
+        """
+        if self.explainer is None:
+            return [None] * len(rows)
+        
+        cache = self.explanation_cache
+        keys = [cache.key_values(values) for values in rows]
+        results = [cache.get(key, self.model_version) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        # A chave é arredondada: "top" mostra os valores desta requisição,
+        # não os do registro que preencheu o cache
+        for i, result in enumerate(results):
+            if result is not None:
+                for item in result["top"]:
+                    item["value"] = float(rows[i][self._feature_index[item["feature"]]])
+        if missing:
+            start = time.perf_counter()
+            X = np.array([rows[i] for i in missing], dtype=np.float64)
+            if self.preprocessor is not None:
+                X = self.preprocessor.transform(X)
+            contributions, unexplained = self.explainer.explain(X)
+            for pos, i in enumerate(missing):
+                results[i] = self.explainer.describe(rows[i], contributions[pos], unexplained[pos])
+                cache.put(keys[i], self.model_version, results[i])
+            observe_stage("explain", time.perf_counter() - start)
+        return results
+    
+    def explain_matrix(self, X: np.ndarray) -> Tuple[float, np.ndarray, np.ndarray]:
+        """
+        Contribuições vetorizadas sobre uma matriz de features brutas (sem cache).
+        
+        Args:
+            X: Matriz (n, n_features) na ordem de feature_names, sem normalizar
+            
+        Returns:
+            Tupla (base_value, contribuições (n, n_features), não explicado (n,))
+        """
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X)
+        contributions, unexplained = self.explainer.explain(X)
+        return self.explainer.base, contributions, unexplained
+    
+    def predict_batch(self, data_list: list) -> list:
+        """
+        Realiza predições em lote de forma vetorizada.
+        
+        Todos os registros válidos são normalizados numa única matriz e
+        o ensemble é executado uma única vez. Registros inválidos recebem
+        uma entrada de erro na mesma posição.
+        
+        Args:
+            data_list: Lista de dicionários com dados dos pacientes
+            
+        Returns:
+            Lista de resultados de predição
+        """
+        if self.model is None:
+            logger.warning("Modelo não carregado")
+            return [
+                {
+                    "DEATH_EVENT": 0,
+                    "risk": "DESCONHECIDO",
                     "confidence": 0.0,
-                    "probability_death": 0.0,
-                    "error": str(e)
-                })
+                    "probability_death": 0.0
+                }
+                for _ in data_list
+            ]
+        
+        results = [None] * len(data_list)
+        
+        try:
+            X, valid_idx, errors = self.prepare_batch(data_list)
+            if valid_idx:
+                evaluation = self._evaluate(X)
+                for pos, i in enumerate(valid_idx):
+                    results[i] = self._result(pos, *evaluation)
+        except Exception as e:
+            logger.error("Erro em predição em lote: %s", e)
+            errors = {i: str(e) for i in range(len(data_list)) if results[i] is None}
+        
+        for i, message in errors.items():
+            logger.error("Erro em predição em lote (registro %d): %s", i, message)
+            results[i] = {
+                "prediction": -1,
+                "risk": "ERRO",
+                "confidence": 0.0,
+                "probability_death": 0.0,
+                "error": message
+            }
         
         return results
     
+    def predict_matrix(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Predição vetorizada sobre uma matriz de features brutas.
+        
+        Args:
+            X: Matriz (n, n_features) na ordem de feature_names, sem normalizar
+            
+        Returns:
+            Tupla (rótulos, probabilidade de morte, confiança)
+        """
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X)
+        return self._evaluate(X)[:3]
+    
+    def predict_frame(self, df: "pd.DataFrame", explain: bool = False) -> "pd.DataFrame":
+        """
+        Predição em lote sobre dados colunares (JSON/NDJSON/Arrow/Parquet).
+        
+        As colunas de entrada são preservadas; DEATH_EVENT é substituído pelo
+        valor predito e risk/confidence/probability_death são adicionadas.
+        Linhas com valores não numéricos recebem DEATH_EVENT nulo, risk
+        "ERRO" e a mensagem em ``error``.
+        
+        Com ``explain``, cada linha válida recebe ``base_value`` e uma coluna
+        ``contrib_<feature>`` por feature (contribuição para probability_death).
+        
+        Args:
+            df: Tabela com uma linha por paciente
+            explain: Inclui as contribuições por feature
+            
+        Returns:
+            Tabela de resultados, na mesma ordem da entrada
+        """
+        import pandas as pd
+
+        features = df.reindex(columns=self.feature_names, fill_value=0)
+        X = features.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(X).any(axis=1)
+        
+        n = len(df)
+        labels = np.zeros(n, dtype=np.int64)
+        probability_death = np.zeros(n)
+        confidence = np.zeros(n)
+        if self.model is not None and valid.any():
+            labels[valid], probability_death[valid], confidence[valid] = self.predict_matrix(X[valid])
+        
+        result = df.copy()
+        result['DEATH_EVENT'] = pd.array(np.where(valid, labels, 0), dtype='Int64')
+        result.loc[~valid, 'DEATH_EVENT'] = pd.NA
+        if self.model is None:
+            result['risk'] = "DESCONHECIDO"
+        else:
+            result['risk'] = np.where(
+                valid, np.where(labels == 1, "ALTO RISCO", "BAIXO RISCO"), "ERRO"
+            )
+        result['confidence'] = np.round(confidence, 4)
+        result['probability_death'] = np.round(probability_death, 4)
+        if explain and self.explainer is not None:
+            contributions = np.full((n, len(self.feature_names)), np.nan)
+            base = np.nan
+            if valid.any():
+                base, contributions[valid], _ = self.explain_matrix(X[valid])
+            result['base_value'] = np.where(valid, round(base, 4), np.nan)
+            for j, name in enumerate(self.feature_names):
+                result[f'contrib_{name}'] = np.round(contributions[:, j], 4)
+        if not valid.all():
+            result['error'] = np.where(valid, None, "valor não numérico nas features")
+        return result
+    
     def get_feature_importance(self) -> Dict[str, float]:
         """
         Obtém a importância das features (se disponível no modelo).
         
+        Para o ensemble (sem ``feature_importances_``), usa o explicador:
+        média do módulo das contribuições sobre o conjunto de treino do KNN.
+        
         Returns:
             Dicionário com importância das features
         """
@@ -159,35 +509,54 @@ class HeartFailurePredictor:
             if hasattr(self.model, 'feature_importances_'):
                 importances = self.model.feature_importances_
                 return dict(zip(self.feature_names, importances))
+            elif self.explainer is not None:
+                return self.explainer.importance()
             else:
                 logger.warning("Modelo não possui feature_importances_")
                 return {}
         except Exception as e:
-            logger.error(f"Erro ao obter feature importance: {str(e)}")
+            logger.error("Erro ao obter feature importance: %s", e, exc_info=True)
             return {}
 
 
-def build_ensemble_model() -> VotingClassifier:
+def build_ensemble_model(X: np.ndarray = None, y: np.ndarray = None) -> "Pipeline":
     """
     Constrói e treina o modelo Ensemble (Voting Classifier) conforme treinado no notebook.
     Este é o modelo padrão caso nenhum modelo MLflow esteja disponível.
     
+    O pré-processamento (FeaturePreprocessor) é ajustado aqui, uma única vez,
+    e serializado junto com o ensemble no mesmo Pipeline. O índice de
+    vizinhos do KNN (KNN_ALGORITHM) também é construído aqui e vai no
+    artefato, sem reconstrução na carga.
+    
+    Args:
+        X: Features de treino na ordem de feature_names (opcional)
+        y: Target DEATH_EVENT (opcional)
+    
     Returns:
-        Modelo Ensemble treinado com dados dummy para funcionar
+        Pipeline (preprocessor + ensemble) treinado. Sem X/y, usa dados dummy.
     """
-    from sklearn.datasets import make_classification
-    
-    # Criar dados dummy para treinar o modelo
-    X, y = make_classification(
-        n_samples=100, 
-        n_features=12, 
-        n_informative=8,
-        n_redundant=2,
-        n_classes=2,
-        random_state=42
-    )
+    from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.tree import DecisionTreeClassifier
+
+    from preprocessing import FeaturePreprocessor
+
+    if X is None or y is None:
+        from sklearn.datasets import make_classification
+        
+        # Criar dados dummy para treinar o modelo
+        X, y = make_classification(
+            n_samples=100, 
+            n_features=12, 
+            n_informative=8,
+            n_redundant=2,
+            n_classes=2,
+            random_state=42
+        )
     
-    knn = KNeighborsClassifier(n_neighbors=3)
+    knn = KNeighborsClassifier(n_neighbors=3, algorithm=KNN_ALGORITHM, leaf_size=KNN_LEAF_SIZE)
     dt = DecisionTreeClassifier(max_depth=3, random_state=42)
     rf = RandomForestClassifier(max_depth=3, random_state=42)
     
@@ -200,8 +569,13 @@ def build_ensemble_model() -> VotingClassifier:
         voting='hard'
     )
     
-    # Treinar o modelo com dados dummy
-    ensemble.fit(X, y)
+    model = Pipeline([
+        ('preprocessor', FeaturePreprocessor()),
+        ('ensemble', ensemble)
+    ])
+    
+    # Treinar o modelo (preprocessor ajustado uma única vez)
+    model.fit(np.asarray(X, dtype=np.float64), np.asarray(y))
     
     logger.info("Modelo Ensemble criado e treinado com sucesso")
-    return ensemble
+    return model
@@ -0,0 +1,153 @@
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from typing import Any, Optional, Tuple
+import logging
+
+from reference import reference_profile
+
+logger = logging.getLogger(__name__)
+
+
+class FeaturePreprocessor(BaseEstimator, TransformerMixin):
+    """
+    Normalização (média/desvio) ajustada uma única vez no treino.
+
+    Equivalente ao StandardScaler, mas guarda média e escala como arrays
+    float64 contíguos e aplica a transformação direto em NumPy, sem a
+    validação do sklearn nem DataFrames no caminho da requisição.
+    É serializado junto com o modelo (primeiro passo do Pipeline).
+    """
+
+    def fit(self, X, y=None):
+        """
+        Calcula média e escala a partir dos dados de treino.
+
+        Também guarda o perfil das features de treino (``reference_``),
+        referência do monitor de drift da API; ``partial_fit`` não o altera.
+
+        Args:
+            X: Matriz de treino (n_amostras, n_features)
+            y: DEATH_EVENT do treino (opcional, só para o perfil de referência)
+
+        Returns:
+            O próprio preprocessor ajustado
+        """
+        X = np.asarray(X, dtype=np.float64)
+        self.n_samples_seen_ = X.shape[0]
+        self.var_ = X.var(axis=0)
+        self._set_stats(X.mean(axis=0), self.var_)
+        self.n_features_in_ = X.shape[1]
+        self.reference_ = reference_profile(X, y)
+        return self
+
+    def partial_fit(self, X, y=None):
+        """
+        Atualiza média e variância com um novo lote (estatísticas acumuladas).
+
+        Combina as estatísticas atuais com as do lote (fórmula de Chan), sem
+        precisar dos dados antigos.
+
+        Args:
+            X: Novo lote (n_amostras, n_features)
+            y: Ignorado
+
+        Returns:
+            O próprio preprocessor atualizado
+        """
+        if not hasattr(self, 'n_samples_seen_'):
+            if hasattr(self, 'mean_'):
+                raise ValueError("Preprocessor sem estatísticas acumuladas (ajustado por uma versão antiga)")
+            return self.fit(X)
+
+        X = np.asarray(X, dtype=np.float64)
+        n_a, n_b = self.n_samples_seen_, X.shape[0]
+        if n_b == 0:
+            return self
+        n = n_a + n_b
+        mean_b = X.mean(axis=0)
+        delta = mean_b - self.mean_
+        mean = self.mean_ + delta * (n_b / n)
+        m2 = self.var_ * n_a + X.var(axis=0) * n_b + delta ** 2 * (n_a * n_b / n)
+        self.n_samples_seen_ = n
+        self.var_ = m2 / n
+        self._set_stats(mean, self.var_)
+        return self
+
+    def _set_stats(self, mean: np.ndarray, var: np.ndarray) -> None:
+        scale = np.sqrt(var)
+        # Features constantes não são escaladas (mesmo critério do StandardScaler)
+        scale[scale == 0.0] = 1.0
+        self.mean_ = np.ascontiguousarray(mean, dtype=np.float64)
+        self.scale_ = np.ascontiguousarray(scale, dtype=np.float64)
+
+    def transform(self, X, copy: bool = True) -> np.ndarray:
+        """
+        Aplica (X - média) / escala.
+
+        Args:
+            X: Matriz (n_amostras, n_features)
+            copy: Se False e X já for float64 contíguo, transforma no lugar
+
+        Returns:
+            Matriz normalizada float64 contígua
+        """
+        X = np.array(X, dtype=np.float64, order='C', copy=copy)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+    @classmethod
+    def from_scaler(cls, scaler: StandardScaler) -> "FeaturePreprocessor":
+        """
+        Converte um StandardScaler já ajustado (ex.: modelos do notebook).
+
+        Args:
+            scaler: StandardScaler ajustado
+
+        Returns:
+            FeaturePreprocessor com as mesmas estatísticas
+        """
+        preprocessor = cls()
+        n_features = scaler.n_features_in_
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+        preprocessor.mean_ = np.ascontiguousarray(mean, dtype=np.float64)
+        preprocessor.scale_ = np.ascontiguousarray(scale, dtype=np.float64)
+        preprocessor.n_features_in_ = n_features
+        if scaler.with_mean and scaler.with_std and getattr(scaler, 'var_', None) is not None:
+            # n_samples_seen_ é um array quando há NaN nos dados de treino
+            preprocessor.n_samples_seen_ = int(np.max(scaler.n_samples_seen_))
+            preprocessor.var_ = np.asarray(scaler.var_, dtype=np.float64)
+        return preprocessor
+
+
+def split_model(model: Any) -> Tuple[Any, Optional[FeaturePreprocessor]]:
+    """
+    Separa o pré-processamento do estimador final.
+
+    Aceita o Pipeline gerado por build_ensemble_model (ou um Pipeline do
+    notebook com StandardScaler como primeiro passo) e devolve o estimador
+    final junto com um FeaturePreprocessor equivalente.
+
+    Args:
+        model: Modelo sklearn, possivelmente um Pipeline
+
+    Returns:
+        Tupla (estimador, preprocessor ou None)
+    """
+    if not isinstance(model, Pipeline) or len(model.steps) < 2:
+        return model, None
+
+    first = model.steps[0][1]
+    if isinstance(first, FeaturePreprocessor):
+        preprocessor = first
+    elif isinstance(first, StandardScaler) and hasattr(first, 'scale_'):
+        preprocessor = FeaturePreprocessor.from_scaler(first)
+    else:
+        return model, None
+
+    rest = model.steps[1:]
+    estimator = rest[0][1] if len(rest) == 1 else Pipeline(rest)
+    return estimator, preprocessor
@@ -0,0 +1,107 @@
+import json
+import math
+from collections.abc import Mapping
+from operator import itemgetter
+from typing import Any, Iterator, Optional, Tuple
+
+from pydantic import BaseModel
+
+from predict import FEATURE_NAMES
+
+
+class HeartData(BaseModel):
+    age: float
+    anaemia: int
+    creatinine_phosphokinase: int
+    diabetes: int
+    ejection_fraction: int
+    high_blood_pressure: int
+    platelets: float
+    serum_creatinine: float
+    serum_sodium: int
+    sex: int
+    smoking: int
+    time: int
+    DEATH_EVENT: Optional[int] = None
+
+
+# Ordem das features do treino + o rótulo (= colunas de dados_analise)
+FIELDS: Tuple[str, ...] = tuple(FEATURE_NAMES) + ("DEATH_EVENT",)
+
+_INDEX = {name: i for i, name in enumerate(FIELDS)}
+_FEATURES = itemgetter(*FEATURE_NAMES)
+# Campos float: os únicos que podem não ser finitos (NaN/Infinity)
+_FLOAT_INDEX = [i for i, name in enumerate(FEATURE_NAMES) if HeartData.__annotations__[name] is float]
+# Objeto JSON compacto com os campos em ordem fixa; para int e float
+# finito, str() produz o mesmo texto que o json
+_JSON_TEMPLATE = "{" + ",".join(f'"{name}":%s' for name in FIELDS) + "}"
+
+
+class HeartRecord(Mapping):
+    """
+    Leitura validada em layout fixo, convertida uma única vez por requisição.
+
+    ``features`` é uma tupla na ordem de FEATURE_NAMES, compartilhada (sem
+    cópia) pelo preditor (``predict_values``), pela chave do cache e pelas
+    cópias com outro rótulo (``with_label``). ``row`` está na ordem das
+    colunas de dados_analise (PostgresWriteBuffer) e ``to_json`` serializa o
+    registro uma vez para a resposta e para o segmento do MinIO.
+
+    Também é um Mapping somente leitura, então pode ser passado onde um
+    dicionário de features é esperado (sombra, aprendizado incremental).
+    """
+
+    __slots__ = ("features", "label")
+
+    def __init__(self, features: Tuple[Any, ...], label: Optional[int] = None):
+        """
+        Args:
+            features: Valores na ordem de FEATURE_NAMES
+            label: DEATH_EVENT (real ou predito), se houver
+        """
+        self.features = features
+        self.label = label
+
+    @classmethod
+    def from_model(cls, data: HeartData) -> "HeartRecord":
+        """Converte o modelo pydantic já validado (uma leitura de atributos)."""
+        values = data.__dict__
+        return cls(_FEATURES(values), values["DEATH_EVENT"])
+
+    def with_label(self, label: Optional[int]) -> "HeartRecord":
+        """Mesmo registro com outro DEATH_EVENT (a tupla de features é compartilhada)."""
+        return HeartRecord(self.features, label)
+
+    @property
+    def row(self) -> Tuple[Any, ...]:
+        """Valores na ordem de FIELDS (colunas de dados_analise)."""
+        return self.features + (self.label,)
+
+    def __getitem__(self, name: str) -> Any:
+        i = _INDEX[name]
+        return self.label if i == len(FEATURE_NAMES) else self.features[i]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        i = _INDEX.get(name)
+        if i is None:
+            return default
+        return self.label if i == len(FEATURE_NAMES) else self.features[i]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return f"HeartRecord({dict(self)!r})"
+
+    def to_json(self) -> bytes:
+        """Objeto JSON do registro (mesmas chaves e ordem da resposta da API)."""
+        features = self.features
+        for i in _FLOAT_INDEX:
+            if not math.isfinite(features[i]):
+                # NaN/Infinity: mesma saída do json padrão
+                return json.dumps(dict(self), separators=(",", ":")).encode()
+        label = "null" if self.label is None else self.label
+        return (_JSON_TEMPLATE % (*features, label)).encode()
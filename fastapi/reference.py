@@ -0,0 +1,60 @@
+import os
+from typing import Any, Dict
+
+import numpy as np
+
+# Faixas por feature no perfil de referência (quantis do treino)
+DRIFT_BINS = int(os.getenv("DRIFT_BINS", "10"))
+# Quantis guardados no perfil e estimados (P²) na janela do monitor de drift
+DRIFT_QUANTILES = [float(q) for q in os.getenv("DRIFT_QUANTILES", "0.05,0.25,0.5,0.75,0.95").split(",") if q.strip()]
+
+
+def quantile_label(p: float) -> str:
+    """Nome do quantil nos perfis e relatórios (ex.: 0.05 -> ``p5``)."""
+    return f"p{p * 100:g}".replace(".", "_")
+
+
+def reference_profile(X, y=None, bins: int = DRIFT_BINS) -> Dict[str, Any]:
+    """
+    Perfil das features de treino usado como referência do drift.
+
+    Para cada feature guarda média, desvio, quantis e um histograma com
+    faixas nos quantis do treino (features com poucos valores distintos,
+    como as binárias, têm uma faixa por valor). Só listas de floats: vai
+    serializado no artefato (FeaturePreprocessor) e pode ser salvo em JSON.
+
+    Só depende de NumPy, para que o artefato do modelo continue
+    carregável sem a pilha do serviço (métricas, banco, executores).
+
+    Args:
+        X: Matriz de treino (n_amostras, n_features) na ordem de FEATURE_NAMES
+        y: DEATH_EVENT do treino (opcional: taxa de positivos de referência)
+        bins: Faixas por feature contínua
+
+    Returns:
+        Dicionário com ``n``, ``mean``, ``std``, ``quantiles``, ``edges``
+        (limites internos das faixas), ``proportions`` e ``positive_rate``
+    """
+    X = np.asarray(X, dtype=np.float64)
+    edges, proportions = [], []
+    for column in X.T:
+        distinct = np.unique(column)
+        if len(distinct) <= bins:
+            inner = (distinct[:-1] + distinct[1:]) / 2
+        else:
+            inner = np.unique(np.quantile(column, np.linspace(0, 1, bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(inner, column, side="right"), minlength=len(inner) + 1)
+        edges.append(inner.tolist())
+        proportions.append((counts / len(column)).tolist())
+    positive_rate = None
+    if y is not None:
+        positive_rate = float(np.mean(np.asarray(y) == 1))
+    return {
+        "n": int(len(X)),
+        "mean": X.mean(axis=0).tolist(),
+        "std": X.std(axis=0).tolist(),
+        "quantiles": {quantile_label(p): np.quantile(X, p, axis=0).tolist() for p in DRIFT_QUANTILES},
+        "edges": edges,
+        "proportions": proportions,
+        "positive_rate": positive_rate,
+    }
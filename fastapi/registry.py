@@ -0,0 +1,235 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+import logging
+
+from cache import PredictionCache
+from metrics import observe_stage
+from predict import FEATURE_NAMES, HeartFailurePredictor
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+
+# Slots extras carregados lado a lado: "challenger=v2,canary=v3"
+MODEL_SLOTS = os.getenv("MODEL_SLOTS", "")
+# Divisão do tráfego por slot (pesos): "primary=90,challenger=10"
+MODEL_TRAFFIC = os.getenv("MODEL_TRAFFIC", "")
+# Slots avaliados em sombra, fora do caminho da resposta: "challenger"
+MODEL_SHADOWS = os.getenv("MODEL_SHADOWS", "")
+# Cabeçalho que escolhe o slot explicitamente
+MODEL_ROUTE_HEADER = os.getenv("MODEL_ROUTE_HEADER", "X-Model-Slot")
+# Avaliações em sombra pendentes além das quais novas são descartadas
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "1000"))
+
+SLOT_REQUESTS = Counter(
+    "heart_model_slot_requests_total",
+    "Predições servidas por slot do registry",
+    ["slot"],
+)
+SHADOW_RESULTS = Counter(
+    "heart_shadow_predictions_total",
+    "Predições em sombra por slot e concordância com o modelo servido",
+    ["slot", "outcome"],
+)
+
+
+def parse_mapping(spec: str) -> Dict[str, str]:
+    """Converte "a=1,b=2" em {"a": "1", "b": "2"} (entradas vazias são ignoradas)."""
+    mapping = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            if name.strip():
+                mapping[name.strip()] = value.strip()
+    return mapping
+
+
+class ModelRegistry:
+    """
+    Vários modelos servidos lado a lado no mesmo processo.
+
+    Cada slot (``primary``, ``challenger``, ...) tem o seu
+    HeartFailurePredictor. Os artefatos vêm do ModelStore com mmap, então
+    versões com o mesmo sha256 compartilham o mesmo modelo carregado, e as
+    páginas do arquivo são compartilhadas entre workers.
+
+    - ``route``: escolhe o slot pelo cabeçalho (se existir) ou sorteia pelos
+      pesos de tráfego; sem pesos, tudo vai para o ``primary``.
+    - ``shadow``: avalia os slots em sombra num pool próprio, depois da
+      resposta, e registra a concordância com o slot que respondeu.
+    """
+
+    def __init__(self, store, shadow_executor: ThreadPoolExecutor,
+                 primary_cache: Optional[PredictionCache] = None,
+                 traffic: Optional[Dict[str, float]] = None,
+                 shadows: Optional[List[str]] = None,
+                 shadow_max_pending: int = SHADOW_MAX_PENDING,
+                 on_change: Optional[Callable[[str, str], None]] = None):
+        """
+        Args:
+            store: ModelStore de onde as versões são carregadas
+            shadow_executor: Pool onde rodam as avaliações em sombra
+            primary_cache: PredictionCache do slot primary (os demais
+                recebem caches próprios, pois o cache é invalidado a cada
+                troca de versão)
+            traffic: Pesos de tráfego por slot
+            shadows: Slots avaliados em sombra
+            shadow_max_pending: Limite de avaliações em sombra pendentes
+            on_change: Chamado com (slot, versão) a cada troca de modelo
+        """
+        self.store = store
+        self.primary_cache = primary_cache
+        self.traffic = {k: float(v) for k, v in (traffic or {}).items() if float(v) > 0}
+        self.shadows = list(shadows or [])
+        self.shadow_max_pending = shadow_max_pending
+        self.on_change = on_change
+        self._slots: Dict[str, HeartFailurePredictor] = {}
+        # sha256 -> modelo carregado, e o sha256 de cada slot (para reaproveitar)
+        self._models: Dict[str, Any] = {}
+        self._slot_digest: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._shadow_executor = shadow_executor
+        self._shadow_pending = 0
+        self.shadow_dropped = 0
+
+    # ---------- slots ----------
+
+    def _cache_for(self, slot: str) -> Optional[PredictionCache]:
+        if slot == PRIMARY:
+            return self.primary_cache
+        current = self._slots.get(slot)
+        return current.cache if current is not None else PredictionCache(FEATURE_NAMES)
+
+    def load(self, slot: str, version: str = "latest") -> Optional[Dict[str, str]]:
+        """
+        Carrega uma versão do ModelStore num slot.
+
+        Returns:
+            {"version", "sha256"} ou None se não houver artefato
+        """
+        model, info = self.store.load(version, current=(slot == PRIMARY))
+        if model is None:
+            return None
+        with self._lock:
+            # Mesmo artefato em outro slot: reaproveita o modelo já carregado
+            model = self._models.setdefault(info["sha256"], model)
+        self.set(slot, model, info["version"], digest=info["sha256"])
+        logger.info("Slot '%s': modelo %s (%s)", slot, info["version"], info["sha256"][:12])
+        return info
+
+    def set(self, slot: str, model: Any, version: str,
+            digest: Optional[str] = None) -> HeartFailurePredictor:
+        """
+        Coloca um modelo num slot (troca atômica do preditor).
+
+        Args:
+            slot: Nome do slot
+            model: Modelo ajustado
+            version: Versão exibida e usada no cache
+            digest: sha256 do artefato, se veio do ModelStore
+        """
+        predictor = HeartFailurePredictor(model=model, model_version=version,
+                                          cache=self._cache_for(slot))
+        with self._lock:
+            self._slots[slot] = predictor
+            if digest is None:
+                self._slot_digest.pop(slot, None)
+            else:
+                self._slot_digest[slot] = digest
+            # Modelos que nenhum slot usa mais deixam de ser referenciados
+            in_use = set(self._slot_digest.values())
+            for sha in [sha for sha in self._models if sha not in in_use]:
+                del self._models[sha]
+        if self.on_change is not None:
+            self.on_change(slot, version)
+        return predictor
+
+    def get(self, slot: str = PRIMARY) -> Optional[HeartFailurePredictor]:
+        return self._slots.get(slot)
+
+    @property
+    def primary(self) -> Optional[HeartFailurePredictor]:
+        return self._slots.get(PRIMARY)
+
+    def slots(self) -> Dict[str, Optional[str]]:
+        """Versão carregada em cada slot."""
+        return {name: p.model_version for name, p in self._slots.items()}
+
+    # ---------- roteamento ----------
+
+    def route(self, requested: Optional[str] = None) -> Tuple[str, Optional[HeartFailurePredictor]]:
+        """
+        Escolhe o slot que atende a requisição.
+
+        Args:
+            requested: Valor do cabeçalho MODEL_ROUTE_HEADER (nome do slot)
+
+        Returns:
+            Tupla (nome do slot, preditor)
+        """
+        if requested and requested in self._slots:
+            slot = requested
+        elif self.traffic:
+            slots = [s for s in self.traffic if s in self._slots]
+            slot = random.choices(slots, weights=[self.traffic[s] for s in slots])[0] if slots else PRIMARY
+        else:
+            slot = PRIMARY
+        SLOT_REQUESTS.labels(slot).inc()
+        return slot, self._slots.get(slot)
+
+    # ---------- sombra ----------
+
+    def shadow(self, data: Dict[str, Any], served_slot: str, served: Dict[str, Any]) -> None:
+        """
+        Agenda a avaliação dos slots em sombra para um registro já respondido.
+
+        Não bloqueia: só enfileira no pool de sombra. Se houver mais de
+        ``shadow_max_pending`` avaliações pendentes, a amostra é descartada.
+
+        Args:
+            data: Registro avaliado
+            served_slot: Slot que respondeu
+            served: Resultado devolvido ao cliente
+        """
+        for slot in self.shadows:
+            if slot == served_slot or slot not in self._slots:
+                continue
+            with self._lock:
+                if self._shadow_pending >= self.shadow_max_pending:
+                    self.shadow_dropped += 1
+                    SHADOW_RESULTS.labels(slot, "dropped").inc()
+                    continue
+                self._shadow_pending += 1
+            self._shadow_executor.submit(self._run_shadow, slot, data, served)
+
+    def _run_shadow(self, slot: str, data: Dict[str, Any], served: Dict[str, Any]) -> None:
+        start = time.perf_counter()
+        try:
+            result = self._slots[slot].predict(data)
+            outcome = "agree" if result["DEATH_EVENT"] == served.get("DEATH_EVENT") else "disagree"
+            SHADOW_RESULTS.labels(slot, outcome).inc()
+            logger.debug("Sombra %s: %s (servido: %s)", slot, result, served)
+        except Exception as e:
+            SHADOW_RESULTS.labels(slot, "error").inc()
+            logger.error("Erro na predição em sombra (%s): %s", slot, e)
+        finally:
+            observe_stage("shadow_inference", time.perf_counter() - start)
+            with self._lock:
+                self._shadow_pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Slots carregados, roteamento e situação da avaliação em sombra."""
+        return {
+            "slots": self.slots(),
+            "traffic": self.traffic,
+            "shadows": self.shadows,
+            "route_header": MODEL_ROUTE_HEADER,
+            "shadow_pending": self._shadow_pending,
+            "shadow_dropped": self.shadow_dropped,
+        }
@@ -0,0 +1,209 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple, Type
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+import logging
+
+from executors import INFERENCE_WORKERS, IO_WORKERS, SHADOW_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# ---------- Postgres ----------
+# Conexões usadas ao mesmo tempo: o pool de I/O, a thread de flush do
+# PostgresWriteBuffer e as threads de fundo (online learning, carga de CSV)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(IO_WORKERS + 2)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "4"))
+# Espera máxima (s) por uma conexão livre no pool
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Conexões mais velhas que isso são recriadas (evita cortes por idle do servidor/NAT)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# ---------- MinIO (S3 compatível) ----------
+# Threads de cada upload multipart (SegmentWriter)
+S3_TRANSFER_CONCURRENCY = int(os.getenv("S3_TRANSFER_CONCURRENCY", "4"))
+# O pool padrão do botocore tem 10 conexões: com o pool de I/O, os uploads
+# multipart e as threads de fundo disputando o cliente, conexões eram
+# descartadas e reabertas ("Connection pool is full")
+S3_MAX_POOL_CONNECTIONS = int(os.getenv(
+    "S3_MAX_POOL_CONNECTIONS",
+    str(IO_WORKERS + INFERENCE_WORKERS + SHADOW_WORKERS + S3_TRANSFER_CONCURRENCY + 2),
+))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "4"))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "3"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "30"))
+
+# ---------- Retentativas ----------
+# Tentativas na inicialização (Postgres/MinIO podem subir depois da API)
+STARTUP_ATTEMPTS = int(os.getenv("STARTUP_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "10"))
+
+
+def database_url() -> str:
+    """URL do banco (DATABASE_URL ou montada a partir de DB_*)."""
+    # DATABASE_URL (opcional) permite apontar para outro banco, ex.: SQLite nos benchmarks
+    return os.getenv("DATABASE_URL") or (
+        f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+        f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+    )
+
+
+def create_db_engine(url: Optional[str] = None) -> Engine:
+    """
+    Cria o Engine com o pool dimensionado para os pools de threads da API.
+
+    ``pool_pre_ping`` testa a conexão ao tirá-la do pool, então conexões
+    derrubadas (reinício do Postgres, timeout de idle) são trocadas em vez
+    de falharem na primeira query. ``pool_use_lifo`` reaproveita as
+    conexões mais recentes e deixa as ociosas expirarem pelo recycle.
+
+    Args:
+        url: URL do banco (padrão: ``database_url()``)
+
+    Returns:
+        Engine SQLAlchemy
+    """
+    url = url or database_url()
+    if url.startswith("sqlite"):
+        # SQLite (benchmarks/testes): arquivo local, sem conexões a testar nem dimensionar
+        return create_engine(url)
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        pool_use_lifo=True,
+        connect_args={"connect_timeout": DB_CONNECT_TIMEOUT},
+    )
+
+
+def create_s3_client(**kwargs: Any):
+    """
+    Cria o cliente S3 (MinIO) com pool de conexões e retentativas.
+
+    O cliente boto3 é thread-safe e deve ser único por processo: cada
+    cliente tem o seu pool de conexões HTTP.
+
+    Args:
+        **kwargs: Sobrescreve parâmetros de ``boto3.client`` (ex.: endpoint_url)
+
+    Returns:
+        Cliente S3
+    """
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=S3_CONNECT_TIMEOUT,
+        read_timeout=S3_READ_TIMEOUT,
+        # "standard": backoff exponencial com jitter para throttling e erros transitórios
+        retries={"total_max_attempts": S3_MAX_ATTEMPTS, "mode": "standard"},
+        tcp_keepalive=True,
+    )
+    params = {
+        "endpoint_url": os.getenv("S3_ENDPOINT_URL"),
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+        "config": config,
+    }
+    params.update(kwargs)
+    return boto3.client("s3", **params)
+
+
+class LazyS3Client:
+    """
+    Cliente S3 criado no primeiro uso (ver ``create_s3_client``).
+
+    Importar o boto3 e montar o cliente custa cerca de 0,1 s; com o proxy
+    esse custo sai da importação da API e acontece na primeira chamada
+    (a etapa de inicialização em segundo plano). Os atributos são
+    repassados ao cliente real.
+    """
+
+    def __init__(self, **kwargs: Any):
+        """
+        Args:
+            **kwargs: Repassados a ``create_s3_client``
+        """
+        self._kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Cliente real (criado uma única vez, mesmo com chamadas concorrentes)."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = create_s3_client(**self._kwargs)
+        return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def close(self) -> None:
+        """Fecha o cliente, se chegou a ser criado."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def close_s3_client(client) -> None:
+    """Fecha as conexões HTTP do cliente (no shutdown)."""
+    close = getattr(client, "close", None)
+    if close is not None:
+        close()
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY,
+                  cap: float = RETRY_MAX_DELAY) -> float:
+    """
+    Espera antes da tentativa ``attempt`` (backoff exponencial com jitter).
+
+    Args:
+        attempt: Número de falhas seguidas (1 = primeira falha)
+        base: Espera da primeira retentativa (s)
+        cap: Espera máxima (s)
+
+    Returns:
+        Segundos a esperar
+    """
+    # "Full jitter": espalha as retentativas de vários workers no tempo
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def retry(fn: Callable[..., Any], *args: Any, attempts: int = STARTUP_ATTEMPTS,
+          base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY,
+          retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+          label: str = "operação", **kwargs: Any) -> Any:
+    """
+    Chama ``fn`` com retentativas e backoff exponencial.
+
+    Args:
+        fn: Função chamada com ``*args`` e ``**kwargs``
+        attempts: Total de tentativas
+        base: Espera da primeira retentativa (s)
+        cap: Espera máxima entre tentativas (s)
+        retry_on: Exceções que disparam nova tentativa (as demais propagam)
+        label: Nome usado nos logs
+
+    Returns:
+        O retorno de ``fn``; a última exceção é propagada se todas falharem
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn(*args, **kwargs)
+        except retry_on as e:
+            if attempt >= attempts:
+                raise
+            delay = backoff_delay(attempt, base, cap)
+            logger.warning("%s falhou (tentativa %d/%d): %s; nova tentativa em %.1fs",
+                           label, attempt, attempts, e, delay)
+            time.sleep(delay)
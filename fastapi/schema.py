@@ -0,0 +1,340 @@
+import os
+import threading
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    SmallInteger,
+    Table,
+    func,
+    inspect,
+    text,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_TABLE = "dados_analise"
+# Agregado diário para dashboards (Trendz) e notebooks
+DAILY_AGGREGATE = "dados_analise_diario"
+
+# Partições mensais criadas à frente do mês corrente
+SCHEMA_PARTITIONS_AHEAD = int(os.getenv("SCHEMA_PARTITIONS_AHEAD", "2"))
+# Intervalo (s) de atualização do agregado materializado
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "300"))
+
+# Chave do advisory lock do Postgres que serializa o DDL entre workers
+# (criação/migração da tabela, partições e agregado)
+_SCHEMA_LOCK_KEY = 0x68656172745F6461  # "heart_da"
+
+metadata = MetaData()
+
+# Colunas tipadas (antes eram inferidas pelo pandas a cada to_sql)
+dados_analise = Table(
+    ANALYSIS_TABLE, metadata,
+    Column("age", Float),
+    Column("anaemia", SmallInteger),
+    Column("creatinine_phosphokinase", Integer),
+    Column("diabetes", SmallInteger),
+    Column("ejection_fraction", SmallInteger),
+    Column("high_blood_pressure", SmallInteger),
+    Column("platelets", Float),
+    Column("serum_creatinine", Float),
+    Column("serum_sodium", SmallInteger),
+    Column("sex", SmallInteger),
+    Column("smoking", SmallInteger),
+    Column("time", Integer),
+    Column("DEATH_EVENT", SmallInteger),
+    # Preenchido pelo banco: os clientes não enviam o instante de ingestão
+    Column("ingested_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index("ix_dados_analise_death_event", "DEATH_EVENT"),
+    Index("ix_dados_analise_time", "time"),
+    Index("ix_dados_analise_ingested_at", "ingested_at"),
+)
+
+# Colunas gravadas pelos clientes (tudo menos o que o banco preenche)
+DATA_COLUMNS = [c.name for c in dados_analise.columns if c.server_default is None]
+
+_PG_TYPES = {
+    Float: "DOUBLE PRECISION",
+    SmallInteger: "SMALLINT",
+    Integer: "INTEGER",
+}
+
+_AGGREGATE_SELECT = f"""
+    SELECT
+        DATE(ingested_at) AS dia,
+        COUNT(*) AS registros,
+        SUM(CASE WHEN "DEATH_EVENT" = 1 THEN 1 ELSE 0 END) AS obitos_preditos,
+        AVG("DEATH_EVENT" * 1.0) AS taxa_obito,
+        AVG(age) AS idade_media,
+        AVG(ejection_fraction * 1.0) AS ejection_fraction_media,
+        AVG(serum_creatinine) AS serum_creatinine_media,
+        AVG(serum_sodium * 1.0) AS serum_sodium_media,
+        MAX(ingested_at) AS atualizado_ate
+    FROM {ANALYSIS_TABLE}
+    GROUP BY DATE(ingested_at)
+"""
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_type(name: str) -> Optional[str]:
+    """Tipo SQL (Postgres) de uma coluna de dados da tabela gerenciada."""
+    col = dados_analise.columns.get(name)
+    if col is None or name not in DATA_COLUMNS:
+        return None
+    return _PG_TYPES[type(col.type)]
+
+
+def _is_managed(insp, table_name: str = ANALYSIS_TABLE) -> bool:
+    if table_name != ANALYSIS_TABLE or not insp.has_table(table_name):
+        return False
+    return any(c["name"] == "ingested_at" for c in insp.get_columns(table_name))
+
+
+def is_managed(engine, table_name: str = ANALYSIS_TABLE) -> bool:
+    """Se a tabela existe com o esquema gerenciado (coluna ingested_at)."""
+    return _is_managed(inspect(engine), table_name)
+
+
+def _lock_schema(conn) -> None:
+    # Liberado no fim da transação; outros workers esperam aqui e, ao
+    # entrar, encontram o esquema já criado/migrado
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _SCHEMA_LOCK_KEY})
+
+
+def _month_start(year: int, month: int) -> date:
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return date(year, month, 1)
+
+
+def _create_partitions(conn, ahead: int, today: date) -> List[str]:
+    created = []
+    for i in range(ahead + 1):
+        start = _month_start(today.year, today.month + i)
+        end = _month_start(start.year, start.month + 1)
+        name = f"{ANALYSIS_TABLE}_p{start:%Y%m}"
+        if conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar():
+            continue
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_q(name)} PARTITION OF {_q(ANALYSIS_TABLE)} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+        created.append(name)
+    return created
+
+
+def ensure_partitions(engine, ahead: int = SCHEMA_PARTITIONS_AHEAD,
+                      today: Optional[date] = None) -> List[str]:
+    """
+    Cria as partições mensais do mês corrente até ``ahead`` meses à frente.
+
+    Registros fora delas caem na partição DEFAULT (que precisa ficar vazia
+    para o intervalo de uma partição nova, por isso elas são criadas com
+    antecedência). Só se aplica ao Postgres.
+
+    Returns:
+        Nomes das partições criadas
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.begin() as conn:
+        _lock_schema(conn)
+        created = _create_partitions(conn, ahead, today or date.today())
+    if created:
+        logger.info("Partições criadas: %s", ", ".join(created))
+    return created
+
+
+def _create_postgres(conn) -> None:
+    cols = ",\n    ".join(f"{_q(c)} {column_type(c)}" for c in DATA_COLUMNS)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_q(ANALYSIS_TABLE)} (\n    {cols},\n"
+        f"    ingested_at TIMESTAMPTZ NOT NULL DEFAULT now()\n"
+        f") PARTITION BY RANGE (ingested_at)"
+    ))
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_q(ANALYSIS_TABLE + '_default')} "
+        f"PARTITION OF {_q(ANALYSIS_TABLE)} DEFAULT"
+    ))
+    # Índices no pai valem para todas as partições (atuais e futuras)
+    conn.execute(text(
+        f'CREATE INDEX IF NOT EXISTS ix_dados_analise_death_event ON {_q(ANALYSIS_TABLE)} ("DEATH_EVENT")'
+    ))
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_dados_analise_time ON {_q(ANALYSIS_TABLE)} ("time")'))
+    # BRIN: minúsculo e eficiente para uma coluna que só cresce (append)
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS ix_dados_analise_ingested_at ON {_q(ANALYSIS_TABLE)} "
+        f"USING brin (ingested_at)"
+    ))
+
+
+def _create_aggregate(conn, dialect: str) -> None:
+    if dialect == "postgresql":
+        conn.execute(text(
+            f"CREATE MATERIALIZED VIEW IF NOT EXISTS {_q(DAILY_AGGREGATE)} AS {_AGGREGATE_SELECT}"
+        ))
+        # Índice único: permite REFRESH ... CONCURRENTLY (leituras não bloqueiam)
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{DAILY_AGGREGATE}_dia ON {_q(DAILY_AGGREGATE)} (dia)"
+        ))
+    else:
+        # Sem views materializadas (ex.: SQLite nos benchmarks): view comum
+        conn.execute(text(f"CREATE VIEW IF NOT EXISTS {_q(DAILY_AGGREGATE)} AS {_AGGREGATE_SELECT}"))
+
+
+def ensure_schema(engine) -> Dict[str, Any]:
+    """
+    Cria (ou migra) a tabela dados_analise gerenciada e o agregado diário.
+
+    - Postgres: tabela particionada por mês em ``ingested_at`` (mais uma
+      partição DEFAULT), índices em DEATH_EVENT e time, BRIN em
+      ``ingested_at`` e a view materializada ``dados_analise_diario``.
+    - Outros bancos: mesma tabela tipada, sem partições, e o agregado como
+      view comum.
+
+    Uma tabela antiga (criada pelo to_sql, sem ``ingested_at``) é migrada:
+    as linhas são copiadas para a nova, com ``ingested_at`` = agora.
+
+    Todo o DDL roda numa transação só; no Postgres ela começa com um
+    advisory lock, então workers que sobem juntos executam um de cada vez
+    e a situação da tabela é verificada de novo depois do lock (só o
+    primeiro migra; os demais encontram a tabela gerenciada).
+
+    Args:
+        engine: Engine SQLAlchemy
+
+    Returns:
+        {"created": bool, "migrated": linhas copiadas da tabela antiga}
+    """
+    dialect = engine.dialect.name
+    legacy = f"{ANALYSIS_TABLE}_legacy"
+    migrated = 0
+    with engine.begin() as conn:
+        _lock_schema(conn)
+        insp = inspect(conn)
+        exists = insp.has_table(ANALYSIS_TABLE)
+        if exists and _is_managed(insp):
+            if dialect == "postgresql":
+                created = _create_partitions(conn, SCHEMA_PARTITIONS_AHEAD, date.today())
+                if created:
+                    logger.info("Partições criadas: %s", ", ".join(created))
+            _create_aggregate(conn, dialect)
+            return {"created": False, "migrated": 0}
+
+        if exists:
+            legacy_cols = {c["name"] for c in insp.get_columns(ANALYSIS_TABLE)}
+            conn.execute(text(f"DROP VIEW IF EXISTS {_q(DAILY_AGGREGATE)}"))
+            conn.execute(text(f"ALTER TABLE {_q(ANALYSIS_TABLE)} RENAME TO {_q(legacy)}"))
+        if dialect == "postgresql":
+            _create_postgres(conn)
+            # Antes da cópia: as linhas migradas não podem ficar na DEFAULT
+            _create_partitions(conn, SCHEMA_PARTITIONS_AHEAD, date.today())
+        else:
+            dados_analise.create(conn, checkfirst=True)
+        if exists:
+            cols = [c for c in DATA_COLUMNS if c in legacy_cols]
+            target = ", ".join(_q(c) for c in cols)
+            source = ", ".join(
+                f"CAST({_q(c)} AS {column_type(c)})" if dialect == "postgresql" else _q(c)
+                for c in cols
+            )
+            migrated = conn.execute(text(
+                f"INSERT INTO {_q(ANALYSIS_TABLE)} ({target}) SELECT {source} FROM {_q(legacy)}"
+            )).rowcount
+            conn.execute(text(f"DROP TABLE {_q(legacy)}"))
+        _create_aggregate(conn, dialect)
+    logger.info("Tabela %s gerenciada criada (%d linhas migradas)", ANALYSIS_TABLE, migrated)
+    return {"created": True, "migrated": migrated}
+
+
+def refresh_aggregates(engine) -> None:
+    """Atualiza o agregado diário (no-op fora do Postgres, onde é uma view comum)."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {_q(DAILY_AGGREGATE)}"))
+
+
+def daily_aggregate(engine, days: int = 30) -> List[Dict[str, Any]]:
+    """
+    Últimos ``days`` dias do agregado diário, do mais recente ao mais antigo.
+
+    Args:
+        engine: Engine SQLAlchemy
+        days: Quantidade de dias
+
+    Returns:
+        Uma linha por dia
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT * FROM {_q(DAILY_AGGREGATE)} ORDER BY dia DESC LIMIT :n"), {"n": days}
+        ).mappings().all()
+    return [{k: (v.isoformat() if hasattr(v, "isoformat") else v) for k, v in row.items()}
+            for row in rows]
+
+
+class AggregateRefresher:
+    """
+    Thread de fundo que atualiza o agregado materializado e cria as
+    partições dos próximos meses a cada ``interval`` segundos.
+
+    ``wake`` antecipa a atualização (ex.: depois de uma carga de CSV).
+    """
+
+    def __init__(self, engine, interval: float = SCHEMA_REFRESH_INTERVAL):
+        """
+        Args:
+            engine: Engine SQLAlchemy
+            interval: Intervalo (s) entre atualizações
+        """
+        self.engine = engine
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+
+    def start(self) -> None:
+        """Inicia a thread de atualização."""
+        if self._thread is not None or self.engine.dialect.name != "postgresql":
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="aggregate-refresher", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        """Pede uma atualização imediata."""
+        self._wake.set()
+
+    def close(self) -> None:
+        """Para a thread de fundo."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                ensure_partitions(self.engine)
+                refresh_aggregates(self.engine)
+                self.refreshes += 1
+            except Exception as e:
+                logger.error("Erro ao atualizar o agregado %s: %s", DAILY_AGGREGATE, e)
@@ -0,0 +1,128 @@
+import io
+import os
+import gzip
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import logging
+
+from buffering import BufferedWriter
+from resources import S3_TRANSFER_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = os.getenv("SEGMENT_PREFIX", "telemetria")
+SEGMENT_MAX_BYTES = int(os.getenv("SEGMENT_MAX_BYTES", str(8 * 1024 * 1024)))
+SEGMENT_MAX_RECORDS = int(os.getenv("SEGMENT_MAX_RECORDS", "50000"))
+SEGMENT_INTERVAL = float(os.getenv("SEGMENT_INTERVAL", "60"))
+# Linhas recusadas pelo Postgres (dead-letter), fora do prefixo lido no treino
+DEAD_LETTER_PREFIX = os.getenv("DEAD_LETTER_PREFIX", "rejeitados")
+
+
+@lru_cache(maxsize=None)
+def transfer_config():
+    """TransferConfig dos uploads (boto3 importado só no primeiro envio)."""
+    from boto3.s3.transfer import TransferConfig
+
+    # Partes de 8 MB (mínimo do S3 é 5 MB) para segmentos grandes
+    return TransferConfig(
+        multipart_threshold=8 * 1024 * 1024,
+        multipart_chunksize=8 * 1024 * 1024,
+        # Cabe no pool de conexões do cliente (resources.S3_MAX_POOL_CONNECTIONS)
+        max_concurrency=S3_TRANSFER_CONCURRENCY,
+    )
+
+
+class SegmentWriter(BufferedWriter):
+    """
+    Agrupa os registros de telemetria em segmentos NDJSON comprimidos.
+
+    Em vez de um objeto ``record_<timestamp>.json`` por requisição, cada
+    registro vira uma linha JSON (com ``ingested_at``) e os segmentos são
+    enviados ao MinIO quando atingem ``SEGMENT_MAX_BYTES`` /
+    ``SEGMENT_MAX_RECORDS`` ou a cada ``SEGMENT_INTERVAL`` segundos.
+
+    Chaves: ``<prefixo>/dt=AAAA-MM-DD/hour=HH/segment_<ts>_<uuid>.ndjson.gz``
+    (o sufixo aleatório elimina colisões entre workers).
+    """
+
+    def __init__(self, s3, bucket: str, prefix: str = SEGMENT_PREFIX,
+                 max_bytes: int = SEGMENT_MAX_BYTES,
+                 max_records: int = SEGMENT_MAX_RECORDS,
+                 max_delay: float = SEGMENT_INTERVAL):
+        """
+        Args:
+            s3: Cliente boto3 S3 (MinIO)
+            bucket: Bucket de destino
+            prefix: Prefixo das chaves dos segmentos
+            max_bytes: Tamanho (NDJSON não comprimido) que fecha um segmento
+            max_records: Quantidade de registros que fecha um segmento
+            max_delay: Intervalo máximo (s) até o envio
+        """
+        super().__init__(max_records=max_records, max_delay=max_delay,
+                         name="segment-writer", max_bytes=max_bytes, stage="minio_put")
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Serializa o registro como linha NDJSON e enfileira na sua partição."""
+        self.extend([record])
+
+    def extend(self, records: List[Dict[str, Any]]) -> None:
+        """Serializa e enfileira vários registros (mesmo instante de ingestão)."""
+        self.extend_json([json.dumps(record).encode() for record in records])
+
+    def extend_json(self, objects: List[bytes]) -> None:
+        """
+        Enfileira registros já serializados (ex.: ``HeartRecord.to_json``).
+
+        O ``ingested_at`` é acrescentado ao fim de cada objeto, sem
+        desserializar nem serializar de novo.
+
+        Args:
+            objects: Objetos JSON não vazios (``{...}``), um por registro
+        """
+        now = datetime.now(timezone.utc)
+        suffix = f',"ingested_at":"{now.isoformat()}"}}\n'.encode()
+        partition = now.strftime("dt=%Y-%m-%d/hour=%H")
+        super().extend([(partition, obj[:-1] + suffix) for obj in objects])
+
+    def _weigh(self, item: Tuple[str, bytes]) -> int:
+        return len(item[1])
+
+    def _key(self, partition: str) -> str:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        return f"{self.prefix}/{partition}/segment_{stamp}_{uuid.uuid4().hex[:12]}.ndjson.gz"
+
+    def _write(self, batch: List[Tuple[str, bytes]]) -> None:
+        partitions = defaultdict(list)
+        for partition, line in batch:
+            partitions[partition].append(line)
+
+        failed, error = [], None
+        for partition, lines in partitions.items():
+            body = io.BytesIO(gzip.compress(b"".join(lines)))
+            key = self._key(partition)
+            try:
+                self.s3.upload_fileobj(
+                    body, self.bucket, key,
+                    ExtraArgs={"ContentType": "application/gzip"},
+                    Config=transfer_config(),
+                )
+                logger.debug("Segmento %s enviado (%d registros)", key, len(lines))
+            except Exception as e:
+                failed.extend((partition, line) for line in lines)
+                error = e
+
+        if error is not None:
+            if len(failed) == len(batch):
+                raise error
+            # Reenfileira só as partições que falharam (evita duplicar as enviadas)
+            logger.error("Falha ao enviar %d registros; serão reenviados: %s", len(failed), error)
+            # Itens já serializados: direto no buffer da classe base
+            BufferedWriter.extend(self, failed)
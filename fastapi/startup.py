@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import logging
+
+from resources import RETRY_BASE_DELAY, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Etapas exigidas por /health/ready (as demais só aquecem a API)
+READY_STAGES = [s.strip() for s in os.getenv("READY_STAGES", "minio,postgres,model").split(",") if s.strip()]
+# Espera máxima (s) pelas etapas em andamento ao encerrar a API
+STARTUP_SHUTDOWN_WAIT = float(os.getenv("STARTUP_SHUTDOWN_WAIT", "30"))
+# Espera máxima (s) entre novas tentativas de uma etapa obrigatória que falhou
+STARTUP_RETRY_MAX_DELAY = float(os.getenv("STARTUP_RETRY_MAX_DELAY", "60"))
+
+PENDING, RUNNING, READY, FAILED = "pending", "running", "ready", "failed"
+
+
+class Stage:
+    """Uma etapa da inicialização: função, dependências e situação."""
+
+    def __init__(self, name: str, fn: Callable[[], Any], after: Sequence[str], required: bool,
+                 retry: bool):
+        self.name = name
+        self.fn = fn
+        self.after = list(after)
+        self.required = required
+        self.retry = retry
+        self.attempts = 0
+        self.next_retry: Optional[float] = None
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.detail: Any = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = threading.Event()
+
+    def info(self) -> Dict[str, Any]:
+        end = self.finished or time.perf_counter()
+        info = {
+            "status": self.status,
+            "required": self.required,
+            "seconds": round(end - self.started, 3) if self.started else None,
+        }
+        if self.detail is not None:
+            info["detail"] = self.detail
+        if self.error is not None:
+            info["error"] = self.error
+        if self.attempts > 1 or self.next_retry is not None:
+            info["attempts"] = self.attempts
+        if self.next_retry is not None:
+            info["retry_in"] = round(max(0.0, self.next_retry - time.perf_counter()), 3)
+        return info
+
+
+class StagedStartup:
+    """
+    Inicialização em etapas, executadas em segundo plano.
+
+    Cada etapa (ex.: verificar o MinIO, o Postgres, carregar o modelo)
+    roda na sua própria thread assim que as etapas listadas em ``after``
+    terminam; etapas independentes rodam ao mesmo tempo. A API
+    aceita conexões logo após o ``start`` e ``ready`` indica quando as
+    etapas obrigatórias concluíram — é o que o ``/health/ready`` expõe ao
+    orquestrador, enquanto ``/health/live`` só indica que o processo responde.
+
+    Uma etapa que falha fica ``failed`` (com a mensagem). ``after`` só
+    ordena: a etapa seguinte roda mesmo assim e decide o que fazer (ex.: o
+    modelo cai no cache local se o MinIO não respondeu). As etapas
+    obrigatórias que falham são repetidas em segundo plano com backoff até
+    concluírem (ou até o ``close``): uma indisponibilidade passageira do
+    MinIO/Postgres na subida não deixa o processo fora do ar até reiniciar.
+    """
+
+    def __init__(self, required: Sequence[str] = READY_STAGES):
+        """
+        Args:
+            required: Etapas exigidas para a API ficar pronta
+        """
+        self.required = list(required)
+        self._stages: Dict[str, Stage] = {}
+        self._threads: List[threading.Thread] = []
+        self._closing = threading.Event()
+        self.created = time.perf_counter()
+
+    def add(self, name: str, fn: Callable[[], Any], after: Sequence[str] = (),
+            required: Optional[bool] = None, retry: Optional[bool] = None) -> None:
+        """
+        Registra uma etapa.
+
+        Args:
+            name: Nome exibido em /health/ready
+            fn: Função da etapa; o retorno (se não for None) vira ``detail``
+                e uma exceção marca a etapa como falha
+            after: Etapas que precisam terminar antes (com sucesso ou não)
+            required: Exigida para ``ready`` (padrão: se está em ``required``)
+            retry: Repetir em segundo plano se falhar (padrão: se é
+                obrigatória); ``fn`` precisa poder ser chamada de novo
+        """
+        if required is None:
+            required = name in self.required
+        if retry is None:
+            retry = required
+        self._stages[name] = Stage(name, fn, after, required, retry)
+
+    def start(self) -> None:
+        """Dispara todas as etapas em segundo plano (não bloqueia)."""
+        for stage in self._stages.values():
+            thread = threading.Thread(target=self._run, args=(stage,),
+                                      name=f"startup-{stage.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self, stage: Stage) -> None:
+        for name in stage.after:
+            self._stages[name].done.wait()
+        stage.status = RUNNING
+        stage.started = time.perf_counter()
+        try:
+            self._attempt(stage)
+        finally:
+            stage.finished = time.perf_counter()
+            # Dependentes e o encerramento não esperam pelas novas tentativas
+            stage.done.set()
+
+        while stage.status == FAILED and stage.retry and not self._closing.is_set():
+            delay = backoff_delay(stage.attempts, RETRY_BASE_DELAY, STARTUP_RETRY_MAX_DELAY)
+            stage.next_retry = time.perf_counter() + delay
+            if self._closing.wait(delay):
+                break
+            stage.next_retry = None
+            self._attempt(stage)
+            stage.finished = time.perf_counter()
+        stage.next_retry = None
+
+    def _attempt(self, stage: Stage) -> None:
+        stage.attempts += 1
+        try:
+            stage.detail = stage.fn()
+            stage.status = READY
+            stage.error = None
+            logger.info("Inicialização: etapa '%s' pronta em %.2fs (tentativa %d)",
+                        stage.name, time.perf_counter() - stage.started, stage.attempts)
+        except Exception as e:
+            stage.status = FAILED
+            stage.error = str(e)
+            if stage.attempts == 1:
+                logger.error("Inicialização: etapa '%s' falhou: %s", stage.name, e, exc_info=True)
+            else:
+                logger.warning("Inicialização: etapa '%s' falhou de novo (tentativa %d): %s",
+                               stage.name, stage.attempts, e)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera as etapas terminarem (com sucesso ou não).
+
+        Returns:
+            True se todas terminaram dentro do prazo
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for stage in self._stages.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if not stage.done.wait(remaining):
+                return False
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Interrompe as novas tentativas e espera as etapas em andamento.
+
+        Returns:
+            True se todas as threads terminaram dentro do prazo
+        """
+        self._closing.set()
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            thread.join(remaining)
+            if thread.is_alive():
+                return False
+        return True
+
+    @property
+    def ready(self) -> bool:
+        """Se todas as etapas obrigatórias concluíram com sucesso."""
+        return all(s.status == READY for s in self._stages.values() if s.required)
+
+    def stats(self) -> Dict[str, Any]:
+        """Situação geral e de cada etapa (corpo do /health/ready)."""
+        stages = self._stages.values()
+        if self.ready:
+            status = "ready"
+        elif any(s.required and s.status == FAILED for s in stages):
+            status = "failed"
+        else:
+            status = "starting"
+        return {
+            "status": status,
+            "uptime": round(time.perf_counter() - self.created, 3),
+            "pending": [s.name for s in stages if s.status in (PENDING, RUNNING)],
+            "stages": {s.name: s.info() for s in stages},
+        }
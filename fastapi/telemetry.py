@@ -0,0 +1,285 @@
+import os
+import json
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+import logging
+
+from pydantic import BaseModel
+
+from metrics import observe_stage, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Ingestão por fila: o endpoint/MQTT só enfileira e os consumidores
+# predizem e gravam em micro-lotes
+TELEMETRY_QUEUE = os.getenv("TELEMETRY_QUEUE", "0") == "1"
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "10000"))
+TELEMETRY_CONSUMERS = int(os.getenv("TELEMETRY_CONSUMERS", "2"))
+# Tamanho máximo do micro-lote e espera máxima (s) para completá-lo
+TELEMETRY_BATCH = int(os.getenv("TELEMETRY_BATCH", "256"))
+TELEMETRY_MAX_WAIT = float(os.getenv("TELEMETRY_MAX_WAIT", "0.05"))
+
+# Broker MQTT local (opcional): sem MQTT_HOST, apenas o endpoint HTTP enfileira
+MQTT_HOST = os.getenv("MQTT_HOST", "")
+MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
+MQTT_TOPIC = os.getenv("MQTT_TOPIC", "heart/telemetry")
+MQTT_QOS = int(os.getenv("MQTT_QOS", "1"))
+MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID", "")
+
+# (slot, preditor) que avalia o próximo micro-lote
+Route = Callable[[], Tuple[str, Any]]
+# Recebe os registros válidos e os resultados da predição, na mesma ordem
+Sink = Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], None]
+
+
+class TelemetryQueue:
+    """
+    Fila em processo entre a chegada das leituras e a predição.
+
+    ``submit`` só enfileira (não bloqueia: com a fila cheia, as leituras são
+    recusadas e o chamador decide o que fazer). Um pool de consumidores
+    retira micro-lotes de até ``max_batch`` leituras, esperando no máximo
+    ``max_wait`` segundos para completá-los. Cada micro-lote é avaliado com
+    uma única chamada vetorizada do preditor e entregue ao ``sink``, que
+    grava em lote (buffers de Postgres/MinIO).
+
+    Assim, rajadas dos dispositivos ficam na fila em vez de disputarem a
+    inferência e o armazenamento requisição a requisição.
+    """
+
+    def __init__(self, route: Route, sink: Sink, maxsize: int = TELEMETRY_QUEUE_SIZE,
+                 consumers: int = TELEMETRY_CONSUMERS, max_batch: int = TELEMETRY_BATCH,
+                 max_wait: float = TELEMETRY_MAX_WAIT):
+        """
+        Args:
+            route: Devolve (slot, preditor) para cada micro-lote
+            sink: Grava os registros preditos
+            maxsize: Capacidade da fila (leituras)
+            consumers: Threads consumidoras
+            max_batch: Tamanho máximo do micro-lote
+            max_wait: Espera máxima (s) para completar um micro-lote
+        """
+        self.route = route
+        self.sink = sink
+        self.consumers = consumers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[float, Dict[str, Any]]]" = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self) -> None:
+        """Inicia os consumidores."""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.consumers):
+            thread = threading.Thread(target=self._consume, name=f"telemetry-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Enfileira leituras sem bloquear.
+
+        Args:
+            records: Leituras (dicionários com as features)
+
+        Returns:
+            Quantidade aceita; as demais foram recusadas por falta de espaço
+        """
+        now = time.perf_counter()
+        accepted = 0
+        for record in records:
+            try:
+                self._queue.put_nowait((now, record))
+            except queue.Full:
+                break
+            accepted += 1
+        with self._lock:
+            self.accepted += accepted
+            self.rejected += len(records) - accepted
+        return accepted
+
+    @property
+    def running(self) -> bool:
+        """Se os consumidores estão ativos."""
+        return bool(self._threads)
+
+    @property
+    def depth(self) -> int:
+        """Leituras aguardando predição."""
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """Para os consumidores depois de esvaziar a fila."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _consume(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple[float, Dict[str, Any]]]) -> None:
+        # Tempo na fila da leitura mais antiga do micro-lote
+        observe_stage("queue_wait", time.perf_counter() - batch[0][0])
+        records = [record for _, record in batch]
+        try:
+            _, predictor = self.route()
+            if predictor is None:
+                raise RuntimeError("Preditor não inicializado")
+            with stage_timer("queue_inference"):
+                results = predictor.predict_batch(records)
+            valid = [i for i, result in enumerate(results) if "error" not in result]
+            if valid:
+                self.sink([records[i] for i in valid], [results[i] for i in valid])
+            failed = len(records) - len(valid)
+            if failed:
+                logger.error("%d leituras inválidas descartadas do micro-lote", failed)
+        except Exception as e:
+            failed = len(records)
+            logger.error("Erro ao processar micro-lote de %d leituras: %s", len(records), e, exc_info=True)
+        with self._lock:
+            self.batches += 1
+            self.processed += len(records) - failed
+            self.failed += failed
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores da fila e dos consumidores."""
+        return {
+            "enabled": self.running,
+            "depth": self.depth,
+            "capacity": self._queue.maxsize,
+            "consumers": self.consumers,
+            "max_batch": self.max_batch,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+class MqttListener:
+    """
+    Assina um tópico MQTT e enfileira as leituras recebidas na TelemetryQueue.
+
+    Cada mensagem é um objeto JSON (uma leitura) ou uma lista de objetos.
+    Cada leitura passa pelo mesmo modelo pydantic do endpoint HTTP
+    (``HeartData``) antes de entrar na fila: tipos errados (ex.: 137.5 num
+    campo inteiro) são contados em ``invalid`` e descartados, e são os
+    valores convertidos pelo modelo (não o JSON bruto) que seguem para a
+    predição e a gravação. O callback do paho roda na thread de rede do cliente, então nada além do
+    enfileiramento acontece nele; com a fila cheia a leitura é descartada
+    (o MQTT não tem como devolver "tente depois" ao publicador).
+    """
+
+    def __init__(self, telemetry: TelemetryQueue, model: Optional[Type[BaseModel]] = None,
+                 host: str = MQTT_HOST, port: int = MQTT_PORT, topic: str = MQTT_TOPIC,
+                 qos: int = MQTT_QOS, client_id: str = MQTT_CLIENT_ID):
+        """
+        Args:
+            telemetry: Fila de destino
+            model: Modelo pydantic que valida e converte cada leitura
+                (None = só exige um objeto JSON)
+            host: Endereço do broker
+            port: Porta do broker
+            topic: Tópico assinado
+            qos: QoS da assinatura
+            client_id: Identificador do cliente (vazio = gerado pelo broker)
+        """
+        self.telemetry = telemetry
+        self.model = model
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.qos = qos
+        self.client_id = client_id
+        self.client = None
+        self.received = 0
+        self.dropped = 0
+        self.invalid = 0
+
+    def start(self) -> None:
+        """Conecta ao broker e inicia a thread de rede do paho."""
+        # Dependência só do modo MQTT
+        import paho.mqtt.client as mqtt
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        # connect_async + loop_start: reconecta sozinho se o broker cair ou subir depois
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()
+        logger.info("MQTT: assinando %s em %s:%d", self.topic, self.host, self.port)
+
+    def close(self) -> None:
+        """Desconecta do broker."""
+        if self.client is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
+            self.client = None
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None) -> None:
+        # (Re)assina a cada conexão: a assinatura não sobrevive a uma reconexão limpa
+        client.subscribe(self.topic, qos=self.qos)
+
+    def _on_message(self, client, userdata, message) -> None:
+        try:
+            payload = json.loads(message.payload)
+        except ValueError:
+            self.invalid += 1
+            return
+        records = payload if isinstance(payload, list) else [payload]
+        valid = []
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            if self.model is None:
+                valid.append(record)
+                continue
+            try:
+                valid.append(self.model(**record).dict())
+            except (TypeError, ValueError) as e:
+                logger.debug("Leitura MQTT inválida descartada: %s", e)
+        self.invalid += len(records) - len(valid)
+        records = valid
+        self.received += len(records)
+        self.dropped += len(records) - self.telemetry.submit(records)
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """Contadores das mensagens recebidas."""
+        if self.client is None:
+            return None
+        return {
+            "host": self.host,
+            "topic": self.topic,
+            "received": self.received,
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+        }
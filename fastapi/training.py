@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+TREINO - Comparação de resamplers × estimadores × hiperparâmetros
+
+Versão em script dos laços do notebook heartFailureSurvivalPrediction.ipynb
+(baseline, RandomOverSampler, SMOTE, BorderlineSMOTE e ADASYN com KNN, DT,
+RF e Voting), executada em paralelo num pool de processos:
+
+- as dobras (StratifiedKFold), as matrizes normalizadas e os conjuntos
+  reamostrados de cada dobra são calculados uma única vez, gravados em
+  disco e mapeados em memória pelos workers;
+- cada célula (resampler, estimador, parâmetros) concluída é gravada num
+  checkpoint JSONL, e uma execução interrompida continua de onde parou;
+- ao final, todas as células são registradas numa única run do MLflow
+  com log_batch, e o melhor modelo pode ser publicado no ModelStore.
+
+Uso:
+    python training.py --data ../heart_failure_clinical_records_dataset.csv --workers 4
+    python training.py --data dados.csv --publish v2   # publica o melhor modelo
+    python training.py --data s3://dados-analise       # último CSV enviado ao MinIO
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.tree import DecisionTreeClassifier
+import logging
+
+from preprocessing import FeaturePreprocessor
+from predict import FEATURE_NAMES, KNN_ALGORITHM, KNN_LEAF_SIZE
+
+logger = logging.getLogger(__name__)
+
+TARGET = "DEATH_EVENT"
+TRAINING_WORKDIR = os.getenv("TRAINING_WORKDIR", "/tmp/training_runs")
+MLFLOW_EXPERIMENT = os.getenv("MLFLOW_EXPERIMENT", "heart_failure_sweep")
+# Métrica usada para escolher o melhor modelo
+SELECTION_METRIC = "f1_mean"
+
+SEED = 42
+# Baixo k devido ao pequeno tamanho do dataset (como no notebook)
+SAMPLER_K_NEIGHBORS = 3
+
+# Limite de métricas por chamada do log_batch do MLflow
+_MLFLOW_BATCH = 1000
+
+
+def make_sampler(name: str):
+    """
+    Cria o resampler pelo nome (None = sem resampling).
+
+    Args:
+        name: "baseline", "random_oversampler", "smote", "borderline_smote" ou "adasyn"
+    """
+    if name == "baseline":
+        return None
+    from imblearn.over_sampling import ADASYN, BorderlineSMOTE, RandomOverSampler, SMOTE
+
+    k = SAMPLER_K_NEIGHBORS
+    if name == "random_oversampler":
+        return RandomOverSampler(random_state=SEED)
+    if name == "smote":
+        return SMOTE(sampling_strategy='minority', k_neighbors=k, random_state=SEED)
+    if name == "borderline_smote":
+        return BorderlineSMOTE(sampling_strategy='minority', k_neighbors=k, random_state=SEED)
+    if name == "adasyn":
+        return ADASYN(sampling_strategy='minority', n_neighbors=k, random_state=SEED)
+    raise ValueError(f"Resampler desconhecido: {name}")
+
+
+SAMPLERS = ["baseline", "random_oversampler", "smote", "borderline_smote", "adasyn"]
+
+
+def make_estimator(name: str, params: Dict[str, Any]):
+    """
+    Cria o estimador pelo nome com os hiperparâmetros da célula.
+
+    Os estimadores usam um único núcleo: o paralelismo é entre células.
+    """
+    if name == "knn":
+        return KNeighborsClassifier(algorithm=KNN_ALGORITHM, leaf_size=KNN_LEAF_SIZE, **params)
+    if name == "dt":
+        return DecisionTreeClassifier(random_state=SEED, **params)
+    if name == "rf":
+        return RandomForestClassifier(random_state=SEED, n_jobs=1, **params)
+    if name == "voting":
+        # Membros com os parâmetros usados no notebook e na API
+        return VotingClassifier(
+            estimators=[
+                ('knn', KNeighborsClassifier(n_neighbors=3, algorithm=KNN_ALGORITHM,
+                                             leaf_size=KNN_LEAF_SIZE)),
+                ('dt', DecisionTreeClassifier(max_depth=3, random_state=SEED)),
+                ('rf', RandomForestClassifier(max_depth=3, random_state=SEED, n_jobs=1)),
+            ],
+            **params
+        )
+    raise ValueError(f"Estimador desconhecido: {name}")
+
+
+PARAM_GRIDS: Dict[str, Dict[str, list]] = {
+    # k de 1 a 21, como no método do cotovelo do notebook
+    "knn": {"n_neighbors": list(range(1, 22)), "weights": ["uniform", "distance"]},
+    "dt": {"max_depth": [3, 5, 8, None], "min_samples_leaf": [1, 5]},
+    "rf": {"n_estimators": [100, 300], "max_depth": [3, 5, None], "class_weight": [None, "balanced"]},
+    "voting": {"voting": ["hard", "soft"]},
+}
+
+
+def cell_id(sampler: str, estimator: str, params: Dict[str, Any]) -> str:
+    """Identificador estável de uma célula do grid."""
+    raw = json.dumps({"sampler": sampler, "estimator": estimator, "params": params}, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def build_cells(samplers: List[str], estimators: List[str]) -> List[Dict[str, Any]]:
+    """Produto resampler × estimador × grid de hiperparâmetros."""
+    cells = []
+    for sampler in samplers:
+        for estimator in estimators:
+            for params in ParameterGrid(PARAM_GRIDS[estimator]):
+                params = dict(sorted(params.items()))
+                cells.append({
+                    "cell_id": cell_id(sampler, estimator, params),
+                    "sampler": sampler,
+                    "estimator": estimator,
+                    "params": params,
+                })
+    return cells
+
+
+# ---------- Dados e dobras em cache ----------
+
+def resolve_data_path(path: str) -> str:
+    """
+    Caminho local do CSV de treino.
+
+    ``s3://bucket/chave`` baixa o objeto para o cache do DatasetLoader;
+    ``s3://bucket`` usa o CSV mais recente enviado por /enviarDados.
+    """
+    if not path.startswith("s3://"):
+        return path
+    from dataset_loader import DatasetLoader
+    from resources import create_s3_client
+
+    bucket, _, key = path[len("s3://"):].partition("/")
+    loader = DatasetLoader(create_s3_client(), bucket)
+    if not key:
+        latest = loader.latest_upload(".csv")
+        if latest is None:
+            raise FileNotFoundError(f"Nenhum CSV em {path}")
+        key = latest["Key"]
+    logger.info("Dados de treino: s3://%s/%s", bucket, key)
+    return str(loader.fetch_object(key))
+
+
+def load_training_data(path: str):
+    """
+    Lê o CSV de treino (caminho local ou ``s3://``, ver resolve_data_path).
+
+    Returns:
+        Tupla (X na ordem de FEATURE_NAMES, y, sha256 do arquivo)
+    """
+    path = resolve_data_path(path)
+    digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    df = pd.read_csv(path)
+    # O notebook usa nomes em minúsculas (death_event)
+    df = df.rename(columns={c: TARGET for c in df.columns if c.lower() == TARGET.lower()})
+    X = df[FEATURE_NAMES].to_numpy(dtype=np.float64)
+    y = df[TARGET].to_numpy(dtype=np.int64)
+    return X, y, digest
+
+
+def prepare_folds(X: np.ndarray, y: np.ndarray, samplers: List[str], n_splits: int,
+                  cache_path: Path) -> Path:
+    """
+    Calcula dobras, normalização e reamostragem uma única vez e grava em disco.
+
+    Para cada dobra o FeaturePreprocessor é ajustado só no treino; para
+    cada resampler o treino normalizado é reamostrado (nunca o teste).
+    O arquivo é gravado sem compressão para ser mapeado em memória pelos
+    workers. Se já existir, é reaproveitado.
+
+    Returns:
+        Caminho do arquivo de cache
+    """
+    if cache_path.exists():
+        cached = joblib.load(cache_path, mmap_mode='r')
+        if set(samplers) <= set(cached["samplers"]):
+            logger.info("Dobras reaproveitadas de %s", cache_path)
+            return cache_path
+
+    cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=SEED)
+    folds = []
+    for train_idx, test_idx in cv.split(X, y):
+        prep = FeaturePreprocessor().fit(X[train_idx])
+        X_train = prep.transform(X[train_idx])
+        fold = {
+            "X_test": prep.transform(X[test_idx]),
+            "y_test": y[test_idx],
+            "train": {},
+            "errors": {},
+        }
+        for name in samplers:
+            sampler = make_sampler(name)
+            try:
+                if sampler is None:
+                    fold["train"][name] = (X_train, y[train_idx])
+                else:
+                    X_res, y_res = sampler.fit_resample(X_train, y[train_idx])
+                    fold["train"][name] = (np.ascontiguousarray(X_res), np.asarray(y_res))
+            except Exception as e:
+                fold["errors"][name] = str(e)
+        folds.append(fold)
+
+    tmp = cache_path.with_suffix(".part")
+    joblib.dump({"samplers": list(samplers), "folds": folds}, tmp)
+    os.replace(tmp, cache_path)
+    logger.info("Dobras calculadas e gravadas em %s", cache_path)
+    return cache_path
+
+
+# ---------- Execução das células (processos do pool) ----------
+
+_FOLDS = None
+
+
+def _init_worker(cache_path: str) -> None:
+    """Carrega as dobras uma vez por processo (mmap, páginas compartilhadas)."""
+    global _FOLDS
+    _FOLDS = joblib.load(cache_path, mmap_mode='r')["folds"]
+
+
+def evaluate_cell(cell: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Avalia uma célula em todas as dobras.
+
+    Returns:
+        A célula com média/desvio de acurácia, precisão, recall e F1, ou
+        com ``error`` se o resampler/estimador falhar
+    """
+    start = time.perf_counter()
+    scores = {"accuracy": [], "precision": [], "recall": [], "f1": []}
+    try:
+        for fold in _FOLDS:
+            if cell["sampler"] in fold["errors"]:
+                raise RuntimeError(fold["errors"][cell["sampler"]])
+            X_train, y_train = fold["train"][cell["sampler"]]
+            model = make_estimator(cell["estimator"], cell["params"])
+            model.fit(X_train, y_train)
+            y_pred = model.predict(fold["X_test"])
+            y_test = fold["y_test"]
+            scores["accuracy"].append(accuracy_score(y_test, y_pred))
+            scores["precision"].append(precision_score(y_test, y_pred, zero_division=0))
+            scores["recall"].append(recall_score(y_test, y_pred, zero_division=0))
+            scores["f1"].append(f1_score(y_test, y_pred, zero_division=0))
+    except Exception as e:
+        return {**cell, "error": str(e), "seconds": round(time.perf_counter() - start, 3)}
+
+    result = {**cell, "seconds": round(time.perf_counter() - start, 3)}
+    for metric, values in scores.items():
+        result[f"{metric}_mean"] = float(np.mean(values))
+        result[f"{metric}_std"] = float(np.std(values))
+    return result
+
+
+# ---------- Checkpoint ----------
+
+def read_checkpoint(path: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Células já avaliadas (por cell_id), com sucesso ou erro.
+
+    Linhas truncadas são ignoradas; se uma célula aparece mais de uma vez
+    (falhou e foi repetida), vale a última linha.
+    """
+    done = {}
+    if not path.exists():
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[record["cell_id"]] = record
+    return done
+
+
+# ---------- MLflow ----------
+
+def _slug(text: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "_-." else "_" for ch in text)
+
+
+def log_to_mlflow(results: pd.DataFrame, config: Dict[str, Any], best: Optional[Dict[str, Any]],
+                  artifact_path: Path, experiment: str = MLFLOW_EXPERIMENT) -> Optional[str]:
+    """
+    Registra a varredura inteira numa única run do MLflow.
+
+    As métricas de todas as células são enviadas com log_batch (em blocos),
+    em vez de uma run ou uma chamada HTTP por célula.
+
+    Returns:
+        run_id, ou None se o MLflow não estiver disponível
+    """
+    try:
+        import mlflow
+        from mlflow.entities import Metric, Param
+        from mlflow.tracking import MlflowClient
+    except ImportError:
+        logger.warning("MLflow não instalado; resultados só no checkpoint/CSV")
+        return None
+
+    mlflow.set_experiment(experiment)
+    client = MlflowClient()
+    with mlflow.start_run(run_name=f"sweep-{config['fingerprint'][:8]}") as run:
+        run_id = run.info.run_id
+        now = int(time.time() * 1000)
+
+        params = [Param(k, str(v)) for k, v in config.items()]
+        if best is not None:
+            params += [Param("best_cell", best["cell_id"]),
+                       Param("best_sampler", best["sampler"]),
+                       Param("best_estimator", best["estimator"]),
+                       Param("best_params", json.dumps(best["params"]))]
+
+        metrics = []
+        ok = results[results["error"].isna()] if "error" in results else results
+        for row in ok.itertuples(index=False):
+            prefix = f"{_slug(row.sampler)}/{row.estimator}/{row.cell_id[:8]}"
+            for name in ("accuracy_mean", "precision_mean", "recall_mean", "f1_mean", "f1_std"):
+                metrics.append(Metric(f"{prefix}/{name}", float(getattr(row, name)), now, 0))
+        if best is not None:
+            for name in ("accuracy_mean", "precision_mean", "recall_mean", "f1_mean", "f1_std"):
+                metrics.append(Metric(f"best/{name}", float(best[name]), now, 0))
+
+        client.log_batch(run_id, params=params[:100])
+        for i in range(0, len(metrics), _MLFLOW_BATCH):
+            client.log_batch(run_id, metrics=metrics[i:i + _MLFLOW_BATCH])
+        mlflow.log_artifact(str(artifact_path))
+
+    logger.info("Varredura registrada no MLflow (run %s, %d métricas)", run_id, len(metrics))
+    return run_id
+
+
+# ---------- Orquestração ----------
+
+def run_sweep(
+    data_path: str,
+    workdir: str = TRAINING_WORKDIR,
+    workers: Optional[int] = None,
+    samplers: Optional[List[str]] = None,
+    estimators: Optional[List[str]] = None,
+    n_splits: int = 5,
+    resume: bool = True,
+    use_mlflow: bool = True,
+    retry_failed: bool = True,
+) -> Dict[str, Any]:
+    """
+    Executa a varredura resampler × estimador × hiperparâmetros.
+
+    Args:
+        data_path: CSV com as features e DEATH_EVENT
+        workdir: Diretório de checkpoints e cache de dobras
+        workers: Processos do pool (padrão: núcleos disponíveis)
+        samplers: Resamplers (padrão: SAMPLERS)
+        estimators: Estimadores (padrão: todos de PARAM_GRIDS)
+        n_splits: Dobras da validação cruzada
+        resume: Reaproveitar células já concluídas no checkpoint
+        use_mlflow: Registrar a varredura no MLflow
+        retry_failed: Na retomada, rodar de novo as células que falharam
+            (falhas passageiras, ex.: falta de memória); se False, o erro
+            registrado no checkpoint é mantido
+
+    Returns:
+        Dicionário com o DataFrame de resultados, a melhor célula, o
+        diretório da varredura e o run_id do MLflow
+    """
+    samplers = samplers or list(SAMPLERS)
+    estimators = estimators or list(PARAM_GRIDS)
+    X, y, data_digest = load_training_data(data_path)
+
+    # Mesmos dados e mesma validação cruzada -> mesmo diretório de varredura
+    fingerprint = hashlib.sha256(
+        json.dumps({"data": data_digest, "n_splits": n_splits, "seed": SEED}).encode()
+    ).hexdigest()
+    sweep_dir = Path(workdir) / fingerprint[:16]
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = sweep_dir / "cells.jsonl"
+    if not resume and checkpoint.exists():
+        checkpoint.unlink()
+
+    cache_path = prepare_folds(X, y, samplers, n_splits, sweep_dir / "folds.joblib")
+
+    cells = build_cells(samplers, estimators)
+    done = read_checkpoint(checkpoint)
+    failed = {cell_id for cell_id, result in done.items() if "error" in result}
+    pending = [c for c in cells if c["cell_id"] not in done
+               or (retry_failed and c["cell_id"] in failed)]
+    retried = sum(c["cell_id"] in failed for c in pending)
+    logger.info("%d células no grid, %d já concluídas, %d pendentes (%d com falha anterior)",
+                len(cells), len(cells) - len(pending), len(pending), retried)
+
+    if pending:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(cache_path),)) as pool, \
+                open(checkpoint, "a") as ckpt:
+            futures = [pool.submit(evaluate_cell, c) for c in pending]
+            for n, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                done[result["cell_id"]] = result
+                # Uma linha por célula: uma interrupção perde no máximo as que estavam rodando
+                ckpt.write(json.dumps(result) + "\n")
+                ckpt.flush()
+                if "error" in result:
+                    logger.warning("Célula %s/%s %s falhou: %s", result["sampler"],
+                                   result["estimator"], result["params"], result["error"])
+                if n % 25 == 0 or n == len(pending):
+                    logger.info("%d/%d células concluídas (%.1fs)", n, len(pending),
+                                time.perf_counter() - start)
+
+    results = pd.DataFrame([done[c["cell_id"]] for c in cells])
+    if "error" not in results:
+        results["error"] = None
+    ok = results[results["error"].isna()]
+    best = None
+    if len(ok):
+        best = ok.sort_values(SELECTION_METRIC, ascending=False).iloc[0].to_dict()
+
+    results_path = sweep_dir / "results.csv"
+    results.assign(params=results["params"].map(json.dumps)).to_csv(results_path, index=False)
+
+    run_id = None
+    if use_mlflow:
+        config = {
+            "fingerprint": fingerprint,
+            "data_sha256": data_digest,
+            "n_splits": n_splits,
+            "samplers": ",".join(samplers),
+            "estimators": ",".join(estimators),
+            "n_cells": len(cells),
+            "selection_metric": SELECTION_METRIC,
+        }
+        run_id = log_to_mlflow(results, config, best, results_path)
+
+    return {"results": results, "best": best, "sweep_dir": sweep_dir, "run_id": run_id}
+
+
+def fit_best(X: np.ndarray, y: np.ndarray, best: Dict[str, Any]) -> Pipeline:
+    """
+    Retreina a melhor célula no conjunto completo.
+
+    O resampler só é usado no ajuste; o artefato servido é o mesmo Pipeline
+    (FeaturePreprocessor + estimador) carregado pela API.
+    """
+    prep = FeaturePreprocessor().fit(X, y)
+    X_scaled = prep.transform(X)
+    sampler = make_sampler(best["sampler"])
+    if sampler is not None:
+        X_scaled, y = sampler.fit_resample(X_scaled, y)
+    estimator = make_estimator(best["estimator"], best["params"]).fit(X_scaled, y)
+    # Passos já ajustados: o Pipeline só os encadeia na predição
+    return Pipeline([('preprocessor', prep), ('ensemble', estimator)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Varredura de resamplers × estimadores × hiperparâmetros")
+    parser.add_argument("--data", required=True, help="CSV com as features e DEATH_EVENT (ou s3://bucket[/chave])")
+    parser.add_argument("--workdir", default=TRAINING_WORKDIR)
+    parser.add_argument("--workers", type=int, default=None, help="processos (padrão: núcleos)")
+    parser.add_argument("--samplers", nargs="+", choices=SAMPLERS)
+    parser.add_argument("--estimators", nargs="+", choices=list(PARAM_GRIDS))
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--no-resume", action="store_true", help="ignora o checkpoint existente")
+    parser.add_argument("--no-mlflow", action="store_true")
+    parser.add_argument("--no-retry-failed", action="store_true",
+                        help="na retomada, mantém as células que falharam sem rodá-las de novo")
+    parser.add_argument("--publish", metavar="VERSION", help="retreina a melhor célula e publica no MinIO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    sweep = run_sweep(
+        args.data, args.workdir, args.workers, args.samplers, args.estimators,
+        args.splits, resume=not args.no_resume, use_mlflow=not args.no_mlflow,
+        retry_failed=not args.no_retry_failed,
+    )
+    best = sweep["best"]
+    if best is None:
+        logger.error("Nenhuma célula concluída com sucesso")
+        return 1
+
+    top = sweep["results"].dropna(subset=[SELECTION_METRIC]).nlargest(10, SELECTION_METRIC)
+    print(top[["sampler", "estimator", "params", "f1_mean", "f1_std", "recall_mean", "accuracy_mean"]]
+          .to_string(index=False))
+    print(f"\nResultados: {sweep['sweep_dir'] / 'results.csv'}")
+
+    if args.publish:
+        from model_store import ModelStore
+        from resources import create_s3_client
+
+        X, y, _ = load_training_data(args.data)
+        model = fit_best(X, y, best)
+        s3 = create_s3_client()
+        store = ModelStore(s3=s3, bucket=os.getenv("MODEL_S3_BUCKET", os.getenv("S3_BUCKET", "dados-analise")))
+        digest = store.save(model, args.publish, publish=True)
+        print(f"Modelo {args.publish} ({digest[:12]}) publicado: {best['sampler']}/{best['estimator']} {best['params']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
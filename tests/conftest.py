@@ -0,0 +1,96 @@
+"""
+Configuração comum dos testes.
+
+Os módulos da API ficam em fastapi/ (importados sem pacote, como no
+container). O ambiente aponta para um SQLite temporário e credenciais de
+teste do moto antes de qualquer import de main.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "fastapi"))
+
+DATASET = ROOT / "heart_failure_clinical_records_dataset.csv"
+
+_TMP = tempfile.mkdtemp(prefix="tests_")
+os.environ.update({
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "S3_BUCKET": "dados-analise",
+    "DATABASE_URL": f"sqlite:///{_TMP}/api.db",
+    "MODEL_CACHE_DIR": f"{_TMP}/model_cache",
+})
+os.environ.pop("S3_ENDPOINT_URL", None)
+
+
+@pytest.fixture
+def s3():
+    """
+    Cliente S3 do moto; os buckets criados no teste são removidos ao final.
+
+    Com a API ativa (fixture ``api``), os mock_aws ficam aninhados e o moto
+    só descarta os dados quando o último termina.
+    """
+    import boto3
+    from moto import mock_aws
+
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        existing = {b["Name"] for b in client.list_buckets()["Buckets"]}
+        yield client
+        for bucket in client.list_buckets()["Buckets"]:
+            if bucket["Name"] in existing:
+                continue
+            for obj in client.list_objects_v2(Bucket=bucket["Name"]).get("Contents", []):
+                client.delete_object(Bucket=bucket["Name"], Key=obj["Key"])
+            client.delete_bucket(Bucket=bucket["Name"])
+
+
+@pytest.fixture(scope="session")
+def dataset() -> pd.DataFrame:
+    """heart_failure_clinical_records_dataset.csv completo."""
+    return pd.read_csv(DATASET)
+
+
+@pytest.fixture(scope="session")
+def training_data(dataset):
+    """Tupla (X, y) do dataset na ordem de FEATURE_NAMES."""
+    from predict import FEATURE_NAMES
+
+    return dataset[FEATURE_NAMES].to_numpy(dtype=np.float64), dataset["DEATH_EVENT"].to_numpy()
+
+
+@pytest.fixture(scope="session")
+def model(training_data):
+    """Pipeline padrão (FeaturePreprocessor + VotingClassifier) treinado no dataset."""
+    from predict import build_ensemble_model
+
+    return build_ensemble_model(*training_data)
+
+
+@pytest.fixture(scope="session")
+def api():
+    """Tupla (TestClient, módulo main) com a inicialização concluída."""
+    import time
+
+    from moto import mock_aws
+
+    with mock_aws():
+        from fastapi.testclient import TestClient
+        import main
+
+        with TestClient(main.app) as client:
+            deadline = time.monotonic() + 120
+            while client.get("/health/ready").status_code != 200:
+                assert time.monotonic() < deadline, client.get("/health/ready").text
+                time.sleep(0.05)
+            yield client, main
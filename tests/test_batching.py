@@ -0,0 +1,104 @@
+"""MicroBatcher: agrupamento, controle de admissão e expiração na fila."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batching import MicroBatcher, Overloaded
+
+
+class SlowPredictor:
+    """Preditor falso: cada lote leva ``delay`` segundos."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.batches = []
+
+    def cached(self, values):
+        return None, None
+
+    def predict_rows(self, rows, keys=None):
+        self.batches.append(len(rows))
+        time.sleep(self.delay)
+        return [{"values": list(v)} for v in rows]
+
+    def predict_values(self, values):
+        return self.predict_rows([values])[0]
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        yield pool
+
+
+def _batcher(executor, **kwargs):
+    options = dict(workers=1, max_batch=8, max_wait=0.01, budget=1.0,
+                   max_queue=100, timeout=5.0, enabled=True)
+    options.update(kwargs)
+    return MicroBatcher(executor, **options)
+
+
+def test_concurrent_predictions_share_a_batch(executor):
+    predictor = SlowPredictor(0.05)
+    batcher = _batcher(executor)
+
+    async def run():
+        return await asyncio.gather(*[batcher.predict(predictor, [float(i)]) for i in range(5)])
+
+    results = asyncio.run(run())
+
+    assert [r["values"] for r in results] == [[float(i)] for i in range(5)]
+    # O primeiro sai sozinho (nenhum lote em execução); os demais esperam juntos
+    assert predictor.batches == [1, 4]
+
+
+def test_admission_rejects_above_budget(executor):
+    predictor = SlowPredictor(0.1)
+    batcher = _batcher(executor, budget=0.05)
+
+    async def run():
+        # Primeiro lote mede a duração média (0,1 s > orçamento)
+        await batcher.predict(predictor, [0.0])
+        return await asyncio.gather(*[batcher.predict(predictor, [1.0]) for _ in range(2)],
+                                    return_exceptions=True)
+
+    first, second = asyncio.run(run())
+
+    assert first == {"values": [1.0]}
+    assert isinstance(second, Overloaded)
+    assert batcher.rejected == 1
+
+
+def test_admission_rejects_full_queue(executor):
+    predictor = SlowPredictor(0.05)
+    batcher = _batcher(executor, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(*[batcher.predict(predictor, [float(i)]) for i in range(3)],
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert isinstance(results[2], Overloaded)
+    assert batcher.rejected == 1
+    assert [r["values"] for r in results[:2]] == [[0.0], [1.0]]
+
+
+def test_entries_older_than_budget_expire(executor):
+    predictor = SlowPredictor(0.1)
+    # Sem duração medida a admissão aceita tudo; o segundo espera o primeiro lote
+    batcher = _batcher(executor, max_batch=1, budget=0.05)
+
+    async def run():
+        return await asyncio.gather(*[batcher.predict(predictor, [float(i)]) for i in range(2)],
+                                    return_exceptions=True)
+
+    first, second = asyncio.run(run())
+
+    assert first == {"values": [0.0]}
+    assert isinstance(second, Overloaded)
+    assert batcher.expired == 1
+    assert predictor.batches == [1]
@@ -0,0 +1,141 @@
+"""BufferedWriter e PostgresWriteBuffer: lotes, falhas e registros recusados."""
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from buffering import BufferedWriter
+from persistence import PostgresWriteBuffer
+from predict import FEATURE_NAMES
+from records import FIELDS
+
+
+class ListWriter(BufferedWriter):
+    """Grava em memória; ``poison`` falha sempre e ``down`` derruba tudo."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.written = []
+        self.calls = 0
+        self.down = False
+
+    def _write(self, batch):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("destino fora do ar")
+        if "poison" in batch:
+            raise ValueError("registro inválido")
+        self.written.extend(batch)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        BufferedWriter()
+
+
+def test_flush_writes_in_order():
+    writer = ListWriter(max_records=3)
+    writer.extend([1, 2])
+    writer.add(3)
+
+    assert writer._wake.is_set()
+    assert writer.flush() == 3
+    assert writer.written == [1, 2, 3] and writer.depth == 0
+
+
+def test_transient_failure_requeues_batch():
+    writer = ListWriter(isolate_failures=True)
+    writer.extend([1, 2, 3])
+    writer.down = True
+
+    # Nenhuma metade gravada: o lote inteiro volta, sem recusar registros
+    assert writer.flush() == 0
+    assert (writer.failures, writer.depth, writer.rejected) == (1, 3, 0)
+    writer.add(4)
+    writer.down = False
+
+    assert writer.flush() == 4
+    assert writer.written == [1, 2, 3, 4] and writer.failures == 0
+
+
+def test_bad_record_is_isolated_and_rejected():
+    rejected = []
+    writer = ListWriter(isolate_failures=True, on_reject=rejected.extend)
+    records = list(range(10))
+    records[6] = "poison"
+    writer.extend(records)
+
+    assert writer.flush() == 9
+
+    assert sorted(writer.written) == [r for r in records if r != "poison"]
+    assert [(r, type(e)) for r, e in rejected] == [("poison", ValueError)]
+    assert (writer.rejected, writer.failures, writer.depth) == (1, 0, 0)
+
+
+def test_without_isolation_bad_record_blocks_batch():
+    writer = ListWriter(max_pending=4)
+    writer.extend([1, "poison", 3])
+    assert writer.flush() == 0
+    writer.extend([4, 5])
+
+    assert writer.flush() == 0
+    # Acima de max_pending os mais antigos são descartados
+    assert writer._buffer == ["poison", 3, 4, 5]
+    assert writer.dropped == 1
+
+
+def test_close_flushes_pending():
+    writer = ListWriter(max_delay=60)
+    writer.start()
+    writer.extend([1, 2])
+    writer.close()
+
+    assert writer.written == [1, 2]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/buffer.db")
+    yield engine
+    engine.dispose()
+
+
+def test_postgres_buffer_writes_tuples_and_dicts(engine, dataset):
+    buffer = PostgresWriteBuffer(engine, "dados_analise", FIELDS)
+    rows = dataset[list(FIELDS)].head(5)
+    buffer.extend([tuple(r) for r in rows.head(3).itertuples(index=False)])
+    buffer.extend(rows.tail(2).to_dict("records"))
+
+    assert buffer.flush() == 5
+
+    with engine.connect() as conn:
+        stored = conn.execute(text('SELECT age, "DEATH_EVENT" FROM dados_analise')).fetchall()
+    assert [(float(a), int(d)) for a, d in stored] == list(zip(rows["age"], rows["DEATH_EVENT"]))
+
+
+def test_postgres_buffer_rejects_only_bad_rows(engine, dataset):
+    rejected = []
+    buffer = PostgresWriteBuffer(engine, "dados_analise", FIELDS, on_reject=rejected.extend)
+    rows = dataset[list(FIELDS)].head(8).to_dict("records")
+    # Valor que o driver não consegue gravar
+    rows[3] = {**rows[3], "serum_sodium": [137]}
+    buffer.extend(rows)
+
+    assert buffer.flush() == 7
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM dados_analise")).scalar() == 7
+    (row, error), = rejected
+    assert row is rows[3] and error is not None
+    assert set(FEATURE_NAMES) <= set(row)
+
+
+def test_postgres_buffer_creates_managed_table(engine, dataset):
+    from schema import ensure_schema, is_managed
+
+    buffer = PostgresWriteBuffer(engine, "dados_analise", FIELDS)
+    buffer.extend(dataset[list(FIELDS)].head(2).to_dict("records"))
+
+    # Flush antes da etapa de inicialização: a tabela já nasce gerenciada
+    assert buffer.flush() == 2
+    assert is_managed(engine)
+    assert ensure_schema(engine) == {"created": False, "migrated": 0}
@@ -0,0 +1,115 @@
+"""Predição em lote colunar: predict_frame e /predizerLote (JSON, NDJSON, Arrow)."""
+
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pytest
+
+import formats
+from predict import FEATURE_NAMES, HeartFailurePredictor
+
+
+@pytest.fixture(scope="module")
+def predictor(model):
+    return HeartFailurePredictor(model, model_version="v1")
+
+
+@pytest.fixture
+def cohort(dataset) -> pd.DataFrame:
+    return dataset.drop(columns=["DEATH_EVENT"]).head(20).assign(paciente=range(20))
+
+
+def test_frame_matches_batch(predictor, cohort):
+    result = predictor.predict_frame(cohort)
+
+    batch = predictor.predict_batch(cohort[FEATURE_NAMES].to_dict("records"))
+    assert result["DEATH_EVENT"].tolist() == [r["DEATH_EVENT"] for r in batch]
+    assert result["risk"].tolist() == [r["risk"] for r in batch]
+    assert result["probability_death"].tolist() == pytest.approx([r["probability_death"] for r in batch])
+    # Colunas de entrada preservadas, sem coluna de erro num lote válido
+    assert result["paciente"].tolist() == list(range(20))
+    assert "error" not in result
+
+
+def test_invalid_rows_are_marked(predictor, cohort):
+    cohort = cohort.astype({"age": object})
+    cohort.loc[2, "age"] = "abc"
+    cohort.loc[5, "serum_sodium"] = np.nan
+
+    result = predictor.predict_frame(cohort)
+
+    invalid = result.index.isin([2, 5])
+    assert result.loc[invalid, "DEATH_EVENT"].isna().all()
+    assert (result.loc[invalid, "risk"] == "ERRO").all()
+    assert result.loc[invalid, "error"].notna().all()
+    assert result.loc[~invalid, "error"].isna().all()
+    assert result.loc[~invalid, "DEATH_EVENT"].notna().all()
+
+
+def test_explain_columns(predictor, cohort):
+    result = predictor.predict_frame(cohort, explain=True)
+
+    contrib = result[[f"contrib_{name}" for name in FEATURE_NAMES]].to_numpy()
+    # As contribuições somam (até o arredondamento) probability_death - base_value
+    total = result["base_value"] + contrib.sum(axis=1)
+    assert total.tolist() == pytest.approx(result["probability_death"].tolist(), abs=1e-3)
+
+
+def _arrow(df: pd.DataFrame) -> bytes:
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _read(body: bytes, media_type: str) -> pd.DataFrame:
+    if media_type == formats.ARROW:
+        return ipc.open_stream(pa.BufferReader(body)).read_all().to_pandas()
+    return pd.read_json(io.BytesIO(body), lines=media_type == formats.NDJSON)
+
+
+@pytest.mark.parametrize("media_type, encode", [
+    (formats.JSON, lambda df: df.to_json(orient="records").encode()),
+    (formats.NDJSON, lambda df: df.to_json(orient="records", lines=True).encode()),
+    (formats.ARROW, _arrow),
+])
+def test_endpoint_answers_in_request_format(api, cohort, media_type, encode):
+    client, _ = api
+
+    resp = client.post("/predizerLote", content=encode(cohort),
+                       headers={"Content-Type": media_type})
+
+    assert resp.status_code == 200, resp.text
+    assert resp.headers["content-type"].startswith(media_type)
+    result = _read(resp.content, media_type)
+    assert result["paciente"].tolist() == list(range(20))
+    assert set(result["risk"]) <= {"ALTO RISCO", "BAIXO RISCO"}
+    assert len(result) == len(cohort)
+
+
+def test_endpoint_rejects_unknown_format(api, cohort):
+    client, _ = api
+
+    resp = client.post("/predizerLote", content=cohort.to_csv(index=False).encode(),
+                       headers={"Content-Type": "text/csv"})
+
+    assert resp.status_code == 415
+    assert json.loads(resp.content)["status"] == "error"
+
+
+def test_endpoint_explain(api, cohort):
+    client, _ = api
+
+    resp = client.post("/predizerLote", params={"explain": "true"},
+                       content=cohort.to_json(orient="records").encode(),
+                       headers={"Content-Type": formats.JSON})
+
+    assert resp.status_code == 200
+    first = resp.json()[0]
+    assert "base_value" in first
+    assert {f"contrib_{name}" for name in FEATURE_NAMES} <= set(first)
@@ -0,0 +1,75 @@
+"""PredictionCache: TTL, invalidação por versão do modelo e cópias."""
+
+import time
+
+import pytest
+
+from cache import PredictionCache
+
+FEATURES = ["age", "serum_sodium"]
+
+
+@pytest.fixture
+def cache():
+    return PredictionCache(FEATURES, max_size=3, ttl=60, decimals=3)
+
+
+def test_hit_after_put(cache):
+    key = cache.key({"age": 60, "serum_sodium": 130})
+    assert cache.get(key, "v1") is None
+    cache.put(key, "v1", {"DEATH_EVENT": 1})
+
+    assert cache.get(key, "v1") == {"DEATH_EVENT": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_is_rounded_and_ordered(cache):
+    assert cache.key({"serum_sodium": 130, "age": 60.0001}) == (60.0, 130.0)
+    assert cache.key({"age": -0.0}) == (0.0, 0.0)
+    assert cache.key({"age": "abc"}) is None
+
+
+def test_entries_expire_after_ttl(monkeypatch, cache):
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    key = cache.key({"age": 60})
+    cache.put(key, "v1", {"DEATH_EVENT": 0})
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 59)
+    assert cache.get(key, "v1") is not None
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get(key, "v1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_new_model_version_invalidates(cache):
+    key = cache.key({"age": 60})
+    cache.put(key, "v1", {"DEATH_EVENT": 0})
+
+    assert cache.get(key, "v2") is None
+    assert cache.invalidations == 1
+    # Voltar à versão anterior não ressuscita as entradas
+    assert cache.get(key, "v1") is None
+
+
+def test_least_recently_used_is_evicted(cache):
+    keys = [cache.key({"age": age}) for age in range(4)]
+    for key in keys[:3]:
+        cache.put(key, "v1", {"age": key[0]})
+    cache.get(keys[0], "v1")
+    cache.put(keys[3], "v1", {"age": 3})
+
+    assert cache.get(keys[1], "v1") is None
+    assert cache.get(keys[0], "v1") is not None
+
+
+def test_results_are_copied(cache):
+    key = cache.key({"age": 60})
+    result = {"votes": {"knn": 1}, "top": [{"value": 60.0}]}
+    cache.put(key, "v1", result)
+    result["votes"]["knn"] = 0
+
+    cached = cache.get(key, "v1")
+    assert cached["votes"] == {"knn": 1}
+    cached["top"][0]["value"] = 61.0
+    assert cache.get(key, "v1")["top"] == [{"value": 60.0}]
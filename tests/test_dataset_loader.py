@@ -0,0 +1,94 @@
+"""DatasetLoader: manifesto por dia, folga de fechamento e leitura em Arrow."""
+
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dataset_loader import DatasetLoader
+from records import FIELDS
+
+TODAY = datetime.now(timezone.utc).date()
+PAST = [TODAY - timedelta(days=n) for n in (5, 3, 1)]
+
+
+@pytest.fixture
+def s3(s3):
+    s3.create_bucket(Bucket="dados")
+    return s3
+
+
+@pytest.fixture
+def rows(dataset):
+    return dataset[list(FIELDS)].head(4).to_dict("records")
+
+
+def _put_segment(s3, day, rows, name="a") -> str:
+    key = f"telemetria/dt={day}/hour=12/segment_{name}.ndjson.gz"
+    body = "".join(json.dumps(r) + "\n" for r in rows).encode()
+    s3.put_object(Bucket="dados", Key=key, Body=gzip.compress(body))
+    return key
+
+
+def _loader(s3, tmp_path, margin: float = 0) -> DatasetLoader:
+    return DatasetLoader(s3, "dados", cache_dir=str(tmp_path), workers=2, close_margin=margin)
+
+
+def test_refresh_without_start_lists_every_day_up_to_end(s3, tmp_path, rows):
+    keys = [_put_segment(s3, day, rows[:1]) for day in PAST + [TODAY]]
+    loader = _loader(s3, tmp_path)
+
+    assert loader.refresh(end=PAST[1]) == {"listed_days": 2, "segments": 2}
+    assert sorted(loader.segments(end=PAST[1])) == keys[:2]
+
+
+def test_closed_days_are_not_listed_again(s3, tmp_path, rows):
+    _put_segment(s3, PAST[0], rows[:1])
+    _put_segment(s3, TODAY, rows[:1])
+    loader = _loader(s3, tmp_path)
+    loader.refresh()
+    late = _put_segment(s3, PAST[0], rows[:1], name="atrasado")
+    _put_segment(s3, TODAY, rows[:1], name="b")
+
+    # Só o dia corrente continua aberto
+    assert loader.refresh() == {"listed_days": 1, "segments": 3}
+    assert late not in loader.segments()
+
+
+def test_close_margin_keeps_recent_days_open(s3, tmp_path, rows):
+    _put_segment(s3, PAST[2], rows[:1])
+    loader = _loader(s3, tmp_path, margin=3 * 86400)
+    loader.refresh(start=PAST[2])
+    late = _put_segment(s3, PAST[2], rows[:1], name="atrasado")
+
+    loader.refresh(start=PAST[2])
+
+    assert late in loader.segments(start=PAST[2], end=PAST[2])
+
+
+def test_dataset_is_typed_like_dados_analise(s3, tmp_path, rows):
+    _put_segment(s3, PAST[0], rows[:2])
+    _put_segment(s3, PAST[1], rows[2:])
+    loader = _loader(s3, tmp_path)
+
+    df = loader.to_pandas()
+
+    assert len(df) == 4
+    assert str(df["serum_sodium"].dtype) == "int16" and str(df["age"].dtype) == "float64"
+    assert sorted(df["time"]) == sorted(r["time"] for r in rows)
+    # Segundo acesso sai do cache local, sem baixar de novo
+    s3.delete_object(Bucket="dados", Key=_put_segment(s3, PAST[0], rows[:2]))
+    assert len(loader.dataset(refresh=False).to_table()) == 4
+
+
+def test_latest_upload_ignores_segments(s3, tmp_path, rows):
+    _put_segment(s3, TODAY, rows[:1])
+    s3.put_object(Bucket="dados", Key="notas.txt", Body=b"")
+    s3.put_object(Bucket="dados", Key="novo.csv", Body=b"age\n2\n")
+    loader = _loader(s3, tmp_path)
+
+    latest = loader.latest_upload()
+
+    assert latest["Key"] == "novo.csv"
+    assert loader.fetch_object("novo.csv").read_bytes() == b"age\n2\n"
@@ -0,0 +1,159 @@
+"""Monitor de drift: perfil de referência, esboços em fluxo e snapshots."""
+
+import json
+
+import numpy as np
+import pytest
+
+from drift import DriftMonitor, P2Quantiles, StreamingStats, psi
+from predict import FEATURE_NAMES
+from reference import quantile_label, reference_profile
+
+
+@pytest.fixture(scope="module")
+def reference(training_data):
+    return reference_profile(*training_data)
+
+
+def _monitor(reference, **kwargs) -> DriftMonitor:
+    monitor = DriftMonitor(reference_path="", enabled=True, **kwargs)
+    monitor.set_reference(reference, "teste")
+    return monitor
+
+
+def _observe(monitor, X, labels):
+    monitor.observe_many([(row.tolist(), int(label), 0.5) for row, label in zip(X, labels)])
+    monitor.flush()
+
+
+def test_quantile_label():
+    assert [quantile_label(p) for p in (0.05, 0.5, 0.025)] == ["p5", "p50", "p2_5"]
+
+
+def test_reference_profile(training_data, reference):
+    X, y = training_data
+
+    assert reference["n"] == len(X)
+    assert reference["positive_rate"] == pytest.approx(y.mean())
+    assert reference["quantiles"]["p50"] == pytest.approx(np.median(X, axis=0).tolist())
+    for proportions in reference["proportions"]:
+        assert sum(proportions) == pytest.approx(1.0)
+    # Feature binária: uma faixa por valor
+    anaemia = FEATURE_NAMES.index("anaemia")
+    assert reference["edges"][anaemia] == [0.5]
+    # O perfil vai no artefato e pode ser salvo em JSON
+    assert json.loads(json.dumps(reference)) == reference
+
+
+def test_psi_is_zero_for_the_same_distribution():
+    expected = np.array([0.2, 0.3, 0.5])
+
+    assert psi(expected, expected) == 0
+    assert psi(np.array([0.5, 0.3, 0.2]), expected) > 0.25
+
+
+def test_p2_quantiles_track_numpy():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(5000, 2)) * [1, 10]
+    sketch = P2Quantiles(2, [0.25, 0.5, 0.95])
+
+    sketch.update(X)
+
+    np.testing.assert_allclose(sketch.values(), np.quantile(X, [0.25, 0.5, 0.95], axis=0), rtol=0.05, atol=0.05)
+
+
+def test_streaming_stats_match_the_whole_batch(training_data, reference):
+    X, y = training_data
+    stats = StreamingStats(reference)
+    bad = X[:3].copy()
+    bad[:, 0] = np.nan
+
+    for chunk in np.array_split(X, 7):
+        stats.update(chunk, np.zeros(len(chunk)), np.full(len(chunk), np.nan))
+    stats.update(bad, np.full(3, np.nan), np.full(3, np.nan))
+
+    assert stats.count == len(X) and stats.invalid == 3
+    np.testing.assert_allclose(stats.mean, X.mean(axis=0))
+    np.testing.assert_allclose(stats.std, X.std(axis=0))
+    np.testing.assert_array_equal(stats.min, X.min(axis=0))
+    assert stats.predictions == len(X) and stats.positive_rate == 0
+    assert stats.probability_count == 0
+
+
+def test_training_data_is_stable(training_data, reference):
+    monitor = _monitor(reference)
+
+    _observe(monitor, *training_data)
+
+    report = monitor.report()
+    assert report["window"]["status"] == "stable"
+    assert report["window"]["drifted"] == []
+    assert report["window"]["predictions"]["shift"] == 0
+    assert set(report["window"]["features"]["age"]["quantiles"]) == {"p5", "p25", "p50", "p75", "p95"}
+
+
+def test_shifted_feature_is_flagged(training_data, reference):
+    X, y = training_data
+    shifted = X.copy()
+    shifted[:, FEATURE_NAMES.index("serum_creatinine")] *= 3
+    monitor = _monitor(reference)
+
+    _observe(monitor, shifted, y)
+
+    report = monitor.report(histograms=True)
+    assert report["window"]["status"] == "drift"
+    assert report["window"]["drifted"] == ["serum_creatinine"]
+    creatinine = report["window"]["features"]["serum_creatinine"]
+    assert creatinine["status"] == "drift" and creatinine["mean_shift"] > 1
+    assert sum(creatinine["histogram"]["live"]) == pytest.approx(1.0, abs=1e-3)
+
+
+def test_few_records_are_not_judged(training_data, reference):
+    X, y = training_data
+    monitor = _monitor(reference)
+
+    _observe(monitor, X[:10] * 3, y[:10])
+
+    assert monitor.report()["window"]["status"] == "insufficient_data"
+
+
+def test_disabled_and_full_monitor_skip_records(training_data, reference):
+    X, y = training_data
+    disabled = DriftMonitor(enabled=False)
+    disabled.observe(X[0].tolist(), 1)
+    assert disabled.depth == 0
+
+    monitor = _monitor(reference)
+    monitor.max_pending = 2
+    for row in X[:5]:
+        monitor.observe(row.tolist(), 0)
+    assert monitor.depth == 2 and monitor.skipped == 3
+
+
+def test_snapshot_is_written_and_window_restarts(s3, training_data, reference):
+    s3.create_bucket(Bucket="dados")
+    monitor = _monitor(reference, s3=s3, bucket="dados")
+    _observe(monitor, *training_data)
+
+    snapshot = monitor.snapshot()
+
+    (obj,) = s3.list_objects_v2(Bucket="dados")["Contents"]
+    assert obj["Key"].startswith("drift/dt=")
+    stored = json.loads(s3.get_object(Bucket="dados", Key=obj["Key"])["Body"].read())
+    assert stored == snapshot
+    assert stored["window"]["records"] == len(training_data[0])
+    assert monitor.window.count == 0 and monitor.total.count == len(training_data[0])
+    assert monitor.report()["last_snapshot"]["key"] == obj["Key"]
+    # Janela vazia: nada a gravar
+    assert monitor.snapshot() is None
+
+
+def test_same_reference_keeps_the_statistics(training_data, reference):
+    monitor = _monitor(reference)
+    _observe(monitor, *training_data)
+
+    monitor.set_reference(json.loads(json.dumps(reference)), "outra origem")
+    assert monitor.total.count == len(training_data[0])
+
+    monitor.set_reference(reference_profile(training_data[0][:50]), "outro treino")
+    assert monitor.total.count == 0
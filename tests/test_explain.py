@@ -0,0 +1,80 @@
+"""ExplanationEngine: as contribuições somam a probabilidade de óbito."""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from explain import ExplanationEngine
+from inference import CompiledEnsemble
+from predict import FEATURE_NAMES, HeartFailurePredictor
+from preprocessing import split_model
+
+
+def _assert_additive(ensemble, X):
+    engine = CompiledEnsemble.from_model(ensemble)
+    explainer = ExplanationEngine.from_model(ensemble, engine, FEATURE_NAMES)
+
+    contributions, unexplained = explainer.explain(X)
+
+    _, probability_death, _, _ = engine.evaluate(X)
+    np.testing.assert_allclose(explainer.base + contributions.sum(axis=1) + unexplained,
+                               probability_death, atol=1e-9)
+    return unexplained
+
+
+def test_contributions_sum_to_probability(model, training_data):
+    ensemble, preprocessor = split_model(model)
+    unexplained = _assert_additive(ensemble, preprocessor.transform(training_data[0]))
+    assert not unexplained.any()
+
+
+def test_uncompiled_member_is_unexplained(model, training_data):
+    _, preprocessor = split_model(model)
+    X, y = training_data
+    X = preprocessor.transform(X)
+    # KNN com métrica manhattan não é compilado: entra como "unexplained"
+    ensemble = VotingClassifier([
+        ("knn", KNeighborsClassifier(n_neighbors=3, metric="manhattan")),
+        ("dt", DecisionTreeClassifier(max_depth=3, random_state=42)),
+        ("rf", RandomForestClassifier(max_depth=3, random_state=42)),
+    ], voting="hard").fit(X, y)
+
+    unexplained = _assert_additive(ensemble, X)
+    assert unexplained.any()
+
+
+@pytest.fixture
+def predictor(model):
+    return HeartFailurePredictor(model, model_version="v1")
+
+
+def test_api_explanation_matches_prediction(predictor, training_data):
+    rows = training_data[0][:20].tolist()
+
+    for values, explanation in zip(rows, predictor.explain_rows(rows)):
+        total = explanation["base_value"] + sum(explanation["contributions"].values())
+        probability = predictor.predict_values(values)["probability_death"]
+        # Valores arredondados a 4 casas na resposta
+        assert total == pytest.approx(probability, abs=1e-3)
+
+
+def test_cached_explanation_reports_request_values(predictor, training_data):
+    values = training_data[0][0].tolist()
+    predictor.explain_values(values)
+    # Mesma chave do cache (diferença abaixo de PREDICTION_CACHE_DECIMALS)
+    nearby = [v + 1e-5 for v in values]
+
+    explanation = predictor.explain_values(nearby)
+
+    for item in explanation["top"]:
+        assert item["value"] == nearby[FEATURE_NAMES.index(item["feature"])]
+    assert predictor.explanation_cache.hits == 1
+
+
+def test_importance_is_normalized(predictor):
+    importance = predictor.explainer.importance()
+
+    assert set(importance) == set(FEATURE_NAMES)
+    assert sum(importance.values()) == pytest.approx(1.0, abs=1e-4)
@@ -0,0 +1,65 @@
+"""Paridade do CompiledEnsemble com o VotingClassifier do sklearn."""
+
+import copy
+
+import numpy as np
+import pytest
+
+from inference import CompiledEnsemble, CompiledKNN, CompiledTrees
+from preprocessing import split_model
+
+
+@pytest.fixture(scope="module")
+def fitted(model, training_data):
+    """Tupla (ensemble, X normalizado) com leituras vizinhas às do treino."""
+    ensemble, preprocessor = split_model(model)
+    X, _ = training_data
+    rng = np.random.default_rng(0)
+    # Ruído pequeno: evita empates de distância no KNN com os próprios pontos
+    queries = X * (1 + rng.normal(0, 0.01, X.shape))
+    return ensemble, preprocessor.transform(np.vstack([X, queries]))
+
+
+def _member_death_proba(ensemble, X):
+    death = list(ensemble.le_.classes_).index(1)
+    return np.mean([est.predict_proba(X)[:, death] for est in ensemble.estimators_], axis=0)
+
+
+@pytest.mark.parametrize("compile_members", [True, False])
+def test_hard_voting_matches_sklearn(fitted, compile_members):
+    ensemble, X = fitted
+    engine = CompiledEnsemble.from_model(ensemble, compile_members=compile_members)
+
+    labels, probability_death, confidence, votes = engine.evaluate(X)
+
+    np.testing.assert_array_equal(labels, ensemble.predict(X))
+    np.testing.assert_allclose(probability_death, _member_death_proba(ensemble, X), atol=1e-12)
+    expected_votes = np.column_stack([ensemble.le_.classes_[est.predict(X)] for est in ensemble.estimators_])
+    np.testing.assert_array_equal(votes, expected_votes)
+    assert np.all((confidence > 0.5) & (confidence <= 1.0))
+
+
+def test_soft_voting_matches_sklearn(fitted):
+    ensemble, X = fitted
+    soft = copy.deepcopy(ensemble).set_params(voting="soft")
+    engine = CompiledEnsemble.from_model(soft)
+
+    labels, probability_death, confidence, _ = engine.evaluate(X)
+
+    proba = soft.predict_proba(X)
+    np.testing.assert_array_equal(labels, soft.predict(X))
+    np.testing.assert_allclose(probability_death, proba[:, 1], atol=1e-12)
+    np.testing.assert_allclose(confidence, proba.max(axis=1), atol=1e-12)
+
+
+def test_members_are_compiled(fitted):
+    ensemble, _ = fitted
+    engine = CompiledEnsemble.from_model(ensemble)
+
+    assert engine.names == ["knn", "dt", "rf"]
+    assert [type(m) for m in engine.members] == [CompiledKNN, CompiledTrees, CompiledTrees]
+
+
+def test_non_voting_model_is_not_compiled(fitted):
+    ensemble, _ = fitted
+    assert CompiledEnsemble.from_model(ensemble.named_estimators_["rf"]) is None
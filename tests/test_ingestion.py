@@ -0,0 +1,55 @@
+"""/enviarDados: modos replace, append e upsert (MinIO simulado, SQLite)."""
+
+import pandas as pd
+from sqlalchemy import text
+
+KEYS = ["age", "time", "serum_creatinine"]
+
+
+def _send(client, df: pd.DataFrame, **params):
+    resp = client.post("/enviarDados", params=params,
+                       files={"file": ("dados.csv", df.to_csv(index=False).encode(), "text/csv")})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def _table(main) -> pd.DataFrame:
+    with main.engine.connect() as conn:
+        return pd.read_sql(text(f"SELECT * FROM {main.ANALYSIS_TABLE}"), conn)
+
+
+def test_replace_append_upsert(api, dataset):
+    client, main = api
+
+    result = _send(client, dataset, mode="replace")
+    assert (result["status"], result["rows"]) == ("ok", len(dataset))
+    assert len(_table(main)) == len(dataset)
+    raw = main.s3.get_object(Bucket=main.BUCKET, Key="dados.csv")["Body"].read()
+    assert raw == dataset.to_csv(index=False).encode()
+
+    assert _send(client, dataset.head(10), mode="append")["rows"] == 10
+    assert len(_table(main)) == len(dataset) + 10
+
+    changed = dataset.head(5).assign(DEATH_EVENT=1 - dataset["DEATH_EVENT"].head(5))
+    assert _send(client, changed, mode="upsert", key_columns=",".join(KEYS))["rows"] == 5
+
+    table = _table(main)
+    before = pd.concat([dataset, dataset.head(10)])
+    matched = before.merge(changed[KEYS], on=KEYS)
+    assert len(table) == len(before) - len(matched) + len(changed)
+    updated = table.merge(changed[KEYS], on=KEYS)
+    assert len(updated) == len(changed)
+    assert sorted(updated["DEATH_EVENT"]) == sorted(changed["DEATH_EVENT"])
+
+    # Um novo replace descarta o que foi acrescentado
+    _send(client, dataset, mode="replace")
+    assert len(_table(main)) == len(dataset)
+
+
+def test_rejects_invalid_requests(api, dataset):
+    client, _ = api
+
+    assert _send(client, dataset, mode="merge")["status"] == "error"
+    assert _send(client, dataset, mode="upsert")["message"] == "O modo upsert exige key_columns"
+    result = _send(client, dataset, mode="upsert", key_columns="paciente")
+    assert result["status"] == "error" and "paciente" in result["message"]
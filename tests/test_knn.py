@@ -0,0 +1,58 @@
+"""CompiledKNN: busca exaustiva e pelo índice do treino contra o sklearn."""
+
+import numpy as np
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+
+from inference import CompiledKNN
+
+
+@pytest.fixture(scope="module")
+def data(training_data):
+    """Tupla (X de treino padronizado, y, consultas vizinhas)."""
+    X, y = training_data
+    X = (X - X.mean(axis=0)) / X.std(axis=0)
+    rng = np.random.default_rng(0)
+    # Ruído pequeno: evita empates de distância com os próprios pontos
+    return X, y, X + rng.normal(0, 0.05, X.shape)
+
+
+@pytest.mark.parametrize("algorithm", ["kd_tree", "ball_tree"])
+@pytest.mark.parametrize("weights", ["uniform", "distance"])
+def test_tree_search_matches_brute_force(data, algorithm, weights):
+    X, y, queries = data
+    knn = KNeighborsClassifier(n_neighbors=3, algorithm=algorithm, weights=weights).fit(X, y)
+
+    # brute_max abaixo do conjunto de referência força a consulta ao índice
+    tree_search = CompiledKNN(knn, brute_max=10)
+    brute = CompiledKNN(knn, brute_max=len(X) * 10)
+    assert tree_search.tree is not None and brute.tree is None
+
+    expected = knn.predict_proba(queries)
+    np.testing.assert_allclose(tree_search.predict_proba(queries), expected, atol=1e-12)
+    np.testing.assert_allclose(brute.predict_proba(queries), expected, atol=1e-12)
+
+
+def test_brute_fitted_model_never_uses_a_tree(data):
+    X, y, _ = data
+    knn = KNeighborsClassifier(n_neighbors=3, algorithm="brute").fit(X, y)
+
+    assert CompiledKNN(knn, brute_max=10).tree is None
+
+
+def test_neighbors_match_sklearn(data):
+    X, y, queries = data
+    knn = KNeighborsClassifier(n_neighbors=3, algorithm="kd_tree").fit(X, y)
+
+    distances, indices = CompiledKNN(knn, brute_max=10).kneighbors(queries)
+
+    expected_distances, expected_indices = knn.kneighbors(queries)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(distances, expected_distances, atol=1e-9)
+
+
+def test_supports_only_euclidean(data):
+    X, y, _ = data
+
+    assert CompiledKNN.supports(KNeighborsClassifier(n_neighbors=3).fit(X, y))
+    assert not CompiledKNN.supports(KNeighborsClassifier(n_neighbors=3, p=1).fit(X, y))
@@ -0,0 +1,76 @@
+"""ModelStore: cache por conteúdo e fallback sem o armazenamento remoto."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from model_store import ModelStore
+from registry import ModelRegistry
+
+
+@pytest.fixture
+def s3(s3):
+    s3.create_bucket(Bucket="modelos")
+    return s3
+
+
+@pytest.fixture
+def store(s3, tmp_path):
+    return ModelStore(s3, "modelos", model_name="teste", cache_dir=str(tmp_path / "cache"))
+
+
+def _offline(store: ModelStore) -> ModelStore:
+    """Mesmo cache local, com um bucket que não existe (remoto indisponível)."""
+    return ModelStore(store.s3, "inexistente", model_name="teste", cache_dir=str(store.cache_dir))
+
+
+def test_load_latest_from_remote(store, tmp_path):
+    digest = store.save({"pesos": [1, 2]}, "v1", publish=True)
+    fresh = ModelStore(store.s3, "modelos", model_name="teste", cache_dir=str(tmp_path / "outro"))
+
+    model, info = fresh.load()
+
+    assert model == {"pesos": [1, 2]}
+    assert info == {"version": "v1", "sha256": digest}
+
+
+def test_same_artifact_is_cached_once(store):
+    first = store.save({"pesos": [1]}, "v1")
+    second = store.save({"pesos": [1]}, "v1-copia")
+
+    assert first == second
+    assert len([p for p in store.cache_dir.iterdir() if p.is_dir()]) == 1
+
+
+def test_offline_latest_falls_back_to_current(store):
+    store.save({"pesos": [1]}, "v1", publish=True)
+    store.load("v1")
+
+    model, info = _offline(store).load()
+
+    assert model == {"pesos": [1]} and info["version"] == "v1"
+
+
+def test_offline_pinned_version_uses_cache(store):
+    store.save({"pesos": [1]}, "v1", publish=True)
+    store.save({"pesos": [2]}, "v2", publish=True)
+
+    model, info = _offline(store).load("v1")
+
+    assert model == {"pesos": [1]} and info["version"] == "v1"
+
+
+def test_offline_unknown_version_is_not_replaced(store):
+    store.save({"pesos": [1]}, "v1", publish=True)
+
+    assert _offline(store).load("v999") == (None, None)
+
+
+def test_registry_reports_unknown_version(store, model):
+    digest = store.save(model, "v1", publish=True)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        registry = ModelRegistry(_offline(store), pool)
+
+        assert registry.load("primary") == {"version": "v1", "sha256": digest}
+        assert registry.load("challenger", "v999") is None
+    assert "challenger" not in registry.slots()
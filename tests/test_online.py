@@ -0,0 +1,73 @@
+"""OnlineUpdater: conversão de normalização e codificação dos rótulos."""
+
+import copy
+
+import numpy as np
+import pytest
+
+from online import OnlineUpdater, remap_member
+from predict import FEATURE_NAMES, HeartFailurePredictor, build_ensemble_model
+from preprocessing import split_model
+
+
+@pytest.fixture
+def shifted(model, training_data):
+    """Tupla (ensemble, preprocessor antigo, preprocessor novo, leituras brutas)."""
+    ensemble, old = split_model(copy.deepcopy(model))
+    X, _ = training_data
+    rng = np.random.default_rng(0)
+    new = copy.deepcopy(old).partial_fit(X * rng.uniform(0.8, 1.3, X.shape[1]) + 5)
+    # Leituras fora do treino: amostras do treino podem cair exatamente sobre
+    # um limiar, onde o arredondamento em float32 pode mudar o lado
+    queries = X * (1 + rng.normal(0, 0.01, X.shape))
+    return ensemble, old, new, queries
+
+
+@pytest.mark.parametrize("member", ["dt", "rf"])
+def test_remap_trees_keeps_predictions(shifted, member):
+    ensemble, old, new, X = shifted
+    estimator = ensemble.named_estimators_[member]
+    before = estimator.predict_proba(old.transform(X))
+
+    remap_member(estimator, old, new)
+
+    np.testing.assert_allclose(estimator.predict_proba(new.transform(X)), before, atol=1e-9)
+
+
+def test_remap_knn_rescales_reference_set(shifted):
+    ensemble, old, new, _ = shifted
+    knn = ensemble.named_estimators_["knn"]
+    raw = knn._fit_X * old.scale_ + old.mean_
+    labels = knn.classes_[knn._y]
+
+    remap_member(knn, old, new)
+
+    np.testing.assert_allclose(knn._fit_X * new.scale_ + new.mean_, raw)
+    np.testing.assert_array_equal(knn.classes_[knn._y], labels)
+
+
+def test_update_encodes_labels_like_the_ensemble(training_data):
+    X, y = training_data
+    # Rótulos fora de 0..n-1: os membros trabalham com a codificação do ensemble
+    model = build_ensemble_model(X, y * 2 + 3)
+    updates = []
+    predictor = HeartFailurePredictor(model, model_version="v1")
+    updater = OnlineUpdater(lambda: predictor, lambda m, v: updates.append((m, v)),
+                            FEATURE_NAMES, min_records=40, window=40, new_trees=2)
+
+    rows = np.random.default_rng(1).choice(len(X), 40, replace=False)
+    for i in rows:
+        assert updater.add_labelled({**dict(zip(FEATURE_NAMES, X[i])), "DEATH_EVENT": y[i] * 2 + 3})
+    # Rótulo desconhecido pelo ensemble é descartado na atualização
+    updater.add_labelled({**dict(zip(FEATURE_NAMES, X[0])), "DEATH_EVENT": 9})
+    assert updater.flush() == 41
+
+    (updated, version), = updates
+    ensemble = updated.named_steps["ensemble"]
+    knn, rf = ensemble.named_estimators_["knn"], ensemble.named_estimators_["rf"]
+    assert version == "v1+online.1"
+    assert list(ensemble.le_.classes_) == [3, 5]
+    assert list(knn.classes_) == [0, 1] and knn.n_samples_fit_ == len(X) + 40
+    assert list(rf.classes_) == [0, 1] and len(rf.estimators_) == 102
+    assert set(updated.predict(X)) <= {3, 5}
+    assert np.mean(updated.predict(X) == y * 2 + 3) > 0.8
@@ -0,0 +1,60 @@
+"""HeartFailurePredictor: predict_batch vetorizado contra predict registro a registro."""
+
+import numpy as np
+import pytest
+
+from predict import FEATURE_NAMES, HeartFailurePredictor
+
+
+@pytest.fixture(scope="module")
+def predictor(model):
+    return HeartFailurePredictor(model, model_version="v1")
+
+
+@pytest.fixture
+def records(dataset):
+    return dataset.drop(columns=["DEATH_EVENT"]).to_dict("records")
+
+
+def test_batch_matches_single_predictions(predictor, records):
+    batch = predictor.predict_batch(records)
+
+    assert batch == [predictor.predict(r) for r in records]
+
+
+def test_batch_matches_model(predictor, model, dataset):
+    batch = predictor.predict_batch(dataset.drop(columns=["DEATH_EVENT"]).to_dict("records"))
+
+    expected = model.predict(dataset[FEATURE_NAMES].to_numpy(dtype=np.float64))
+    assert [r["DEATH_EVENT"] for r in batch] == expected.tolist()
+    assert {r["risk"] for r in batch} <= {"ALTO RISCO", "BAIXO RISCO"}
+
+
+def test_invalid_rows_fail_alone(predictor, records):
+    batch = records[:5]
+    batch[1] = {**batch[1], "age": "abc"}
+    batch[3] = {**batch[3], "serum_sodium": None}
+
+    results = predictor.predict_batch(batch)
+
+    for i in (1, 3):
+        assert results[i]["risk"] == "ERRO" and results[i]["prediction"] == -1
+        assert results[i]["error"]
+    for i in (0, 2, 4):
+        assert results[i] == predictor.predict(batch[i])
+
+
+def test_missing_features_default_to_zero(predictor, records):
+    partial = {k: v for k, v in records[0].items() if k != "smoking"}
+
+    assert predictor.predict_batch([partial]) == [predictor.predict({**partial, "smoking": 0})]
+
+
+def test_empty_batch(predictor):
+    assert predictor.predict_batch([]) == []
+
+
+def test_batch_without_model():
+    results = HeartFailurePredictor().predict_batch([{}, {}])
+
+    assert [r["risk"] for r in results] == ["DESCONHECIDO", "DESCONHECIDO"]
@@ -0,0 +1,141 @@
+"""ModelRegistry: roteamento entre slots, modelo compartilhado e avaliação em sombra."""
+
+import copy
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from prometheus_client import REGISTRY
+from sklearn.dummy import DummyClassifier
+
+from registry import PRIMARY, ModelRegistry, parse_mapping
+
+
+class FakeStore:
+    """ModelStore em memória: cada load devolve uma cópia nova do artefato."""
+
+    def __init__(self, artifacts):
+        self.artifacts = artifacts
+
+    def load(self, version="latest", current=False):
+        if version not in self.artifacts:
+            return None, None
+        model, digest = self.artifacts[version]
+        return copy.copy(model), {"version": version, "sha256": digest}
+
+
+class BlockedPool:
+    """Pool que só executa as tarefas quando liberado."""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        self.tasks.append((fn, args))
+
+    def run(self):
+        for fn, args in self.tasks:
+            fn(*args)
+        self.tasks.clear()
+
+
+@pytest.fixture
+def record(dataset):
+    return dataset.drop(columns=["DEATH_EVENT"]).iloc[0].to_dict()
+
+
+def _shadow_count(slot: str, outcome: str) -> float:
+    value = REGISTRY.get_sample_value("heart_shadow_predictions_total",
+                                      {"slot": slot, "outcome": outcome})
+    return value or 0.0
+
+
+def test_parse_mapping():
+    assert parse_mapping("primary=90, challenger=10,,x") == {"primary": "90", "challenger": "10"}
+    assert parse_mapping("") == {}
+
+
+def test_same_artifact_is_loaded_once(model):
+    store = FakeStore({"v1": (model, "aaa"), "v1-copia": (model, "aaa")})
+    changes = []
+    registry = ModelRegistry(store, BlockedPool(), on_change=lambda *c: changes.append(c))
+
+    registry.load(PRIMARY, "v1")
+    registry.load("challenger", "v1-copia")
+
+    assert registry.get("challenger").model is registry.primary.model
+    assert registry.slots() == {PRIMARY: "v1", "challenger": "v1-copia"}
+    assert changes == [(PRIMARY, "v1"), ("challenger", "v1-copia")]
+    assert registry.load("canary", "v999") is None
+
+
+def test_route_by_header_and_default(model):
+    registry = ModelRegistry(FakeStore({}), BlockedPool())
+    registry.set(PRIMARY, model, "v1")
+    registry.set("challenger", model, "v2")
+
+    assert registry.route("challenger")[0] == "challenger"
+    # Slot inexistente no cabeçalho cai no roteamento padrão
+    slot, predictor = registry.route("canary")
+    assert slot == PRIMARY and predictor is registry.primary
+
+
+def test_route_by_traffic_weights(model):
+    registry = ModelRegistry(FakeStore({}), BlockedPool(),
+                             traffic={PRIMARY: 3, "challenger": 1, "canary": 5, "off": 0})
+    registry.set(PRIMARY, model, "v1")
+    registry.set("challenger", model, "v2")
+
+    random.seed(0)
+    slots = [registry.route()[0] for _ in range(4000)]
+
+    # "canary" não está carregado e "off" tem peso zero
+    assert set(slots) == {PRIMARY, "challenger"}
+    assert slots.count("challenger") / len(slots) == pytest.approx(0.25, abs=0.03)
+    assert "off" not in registry.traffic
+
+
+def test_shadow_scores_after_the_response(model, training_data, record):
+    X, y = training_data
+    always_alive = DummyClassifier(strategy="constant", constant=0).fit(X, y)
+    pool = BlockedPool()
+    registry = ModelRegistry(FakeStore({}), pool, shadows=["challenger", "canary", PRIMARY])
+    registry.set(PRIMARY, model, "v1")
+    registry.set("challenger", always_alive, "v0")
+    agree, disagree = _shadow_count("challenger", "agree"), _shadow_count("challenger", "disagree")
+
+    registry.shadow(record, PRIMARY, {"DEATH_EVENT": 1})
+    registry.shadow(record, PRIMARY, {"DEATH_EVENT": 0})
+
+    # Só o challenger: canary não está carregado e o primary foi quem respondeu
+    assert len(pool.tasks) == 2 and registry.stats()["shadow_pending"] == 2
+    pool.run()
+    assert registry.stats()["shadow_pending"] == 0
+    assert _shadow_count("challenger", "agree") == agree + 1
+    assert _shadow_count("challenger", "disagree") == disagree + 1
+
+
+def test_shadow_is_dropped_over_the_limit(model, record):
+    pool = BlockedPool()
+    registry = ModelRegistry(FakeStore({}), pool, shadows=["challenger"], shadow_max_pending=2)
+    registry.set(PRIMARY, model, "v1")
+    registry.set("challenger", model, "v2")
+
+    for _ in range(5):
+        registry.shadow(record, PRIMARY, {"DEATH_EVENT": 0})
+
+    assert len(pool.tasks) == 2
+    assert registry.shadow_dropped == 3
+    pool.run()
+    registry.shadow(record, PRIMARY, {"DEATH_EVENT": 0})
+    assert len(pool.tasks) == 1
+
+
+def test_shadow_runs_on_the_executor(model, record):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        registry = ModelRegistry(FakeStore({}), pool, shadows=["challenger"])
+        registry.set(PRIMARY, model, "v1")
+        registry.set("challenger", model, "v2")
+
+        registry.shadow(record, PRIMARY, {"DEATH_EVENT": 0})
+    assert registry.stats()["shadow_pending"] == 0
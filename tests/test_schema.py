@@ -0,0 +1,48 @@
+"""ensure_schema no SQLite: criação, migração da tabela antiga e idempotência."""
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from schema import ANALYSIS_TABLE, DAILY_AGGREGATE, DATA_COLUMNS, daily_aggregate, ensure_schema, is_managed
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/schema.db")
+    yield engine
+    engine.dispose()
+
+
+def test_creates_managed_table(engine):
+    assert ensure_schema(engine) == {"created": True, "migrated": 0}
+
+    insp = inspect(engine)
+    assert is_managed(engine)
+    assert [c["name"] for c in insp.get_columns(ANALYSIS_TABLE)] == DATA_COLUMNS + ["ingested_at"]
+    assert DAILY_AGGREGATE in insp.get_view_names()
+
+
+def test_second_call_is_a_no_op(engine):
+    ensure_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f'INSERT INTO {ANALYSIS_TABLE} (age, "DEATH_EVENT") VALUES (60, 1)'))
+
+    assert ensure_schema(engine) == {"created": False, "migrated": 0}
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT COUNT(*) FROM {ANALYSIS_TABLE}")).scalar() == 1
+
+
+def test_migrates_legacy_table(engine, dataset):
+    # Tabela criada pelo to_sql antigo: tipos inferidos e sem ingested_at
+    dataset.head(10).to_sql(ANALYSIS_TABLE, engine, index=False)
+    assert not is_managed(engine)
+
+    assert ensure_schema(engine) == {"created": True, "migrated": 10}
+
+    assert is_managed(engine)
+    assert f"{ANALYSIS_TABLE}_legacy" not in inspect(engine).get_table_names()
+    migrated = pd.read_sql_table(ANALYSIS_TABLE, engine)
+    pd.testing.assert_frame_equal(migrated[list(dataset.columns)], dataset.head(10), check_dtype=False)
+    assert migrated["ingested_at"].notna().all()
+    assert daily_aggregate(engine)[0]["registros"] == 10
@@ -0,0 +1,96 @@
+"""SegmentWriter: segmentos NDJSON comprimidos e particionados no MinIO."""
+
+import gzip
+import json
+
+import pytest
+
+from records import HeartRecord
+from segments import SegmentWriter
+
+
+@pytest.fixture
+def s3(s3):
+    s3.create_bucket(Bucket="dados")
+    return s3
+
+
+def _segments(s3) -> dict:
+    keys = [o["Key"] for o in s3.list_objects_v2(Bucket="dados").get("Contents", [])]
+    return {k: [json.loads(line) for line in
+                gzip.decompress(s3.get_object(Bucket="dados", Key=k)["Body"].read()).splitlines()]
+            for k in keys}
+
+
+def test_records_become_one_partitioned_segment(s3):
+    writer = SegmentWriter(s3, "dados", prefix="telemetria/")
+    writer.extend([{"age": 60.0, "DEATH_EVENT": 1}, {"age": 70.0, "DEATH_EVENT": 0}])
+    writer.add({"age": 80.0, "DEATH_EVENT": None})
+
+    assert writer.flush() == 3
+
+    (key, lines), = _segments(s3).items()
+    assert key.startswith("telemetria/dt=") and "/hour=" in key and key.endswith(".ndjson.gz")
+    assert [line["age"] for line in lines] == [60.0, 70.0, 80.0]
+    assert all(line["ingested_at"][:10] == key.split("dt=")[1][:10] for line in lines)
+
+
+def test_serialized_records_are_not_reencoded(s3, dataset):
+    row = dataset.iloc[0]
+    record = HeartRecord(tuple(row.drop("DEATH_EVENT").tolist()), int(row["DEATH_EVENT"]))
+    writer = SegmentWriter(s3, "dados")
+    writer.extend_json([record.to_json()])
+    writer.flush()
+
+    (line,), = _segments(s3).values()
+    assert {k: v for k, v in line.items() if k != "ingested_at"} == dict(record)
+
+
+def test_size_limit_wakes_the_flush(s3):
+    writer = SegmentWriter(s3, "dados", max_bytes=100, max_records=1000)
+    writer.add({"age": 60.0})
+    assert not writer._wake.is_set()
+
+    writer.extend([{"age": 60.0, "note": "x" * 100}])
+
+    assert writer._wake.is_set()
+
+
+class FlakyS3:
+    """Cliente que falha os envios das partições em ``failing``."""
+
+    def __init__(self, s3, failing):
+        self.s3 = s3
+        self.failing = failing
+
+    def upload_fileobj(self, body, bucket, key, **kwargs):
+        if any(p in key for p in self.failing):
+            raise ConnectionError("MinIO fora do ar")
+        self.s3.upload_fileobj(body, bucket, key, **kwargs)
+
+
+def test_only_failed_partitions_are_requeued(s3):
+    flaky = FlakyS3(s3, failing=set())
+    writer = SegmentWriter(flaky, "dados")
+    lines = [b'{"age":60.0,"ingested_at":"x"}\n', b'{"age":70.0,"ingested_at":"x"}\n']
+    # Duas partições (horas) no mesmo lote
+    writer._buffer = [("dt=2024-01-01/hour=00", lines[0]), ("dt=2024-01-01/hour=01", lines[1])]
+    flaky.failing = {"hour=01"}
+
+    writer.flush()
+
+    assert len(_segments(s3)) == 1
+    assert writer._buffer == [("dt=2024-01-01/hour=01", lines[1])]
+    flaky.failing = set()
+    assert writer.flush() == 1
+    assert len(_segments(s3)) == 2
+
+
+def test_total_failure_keeps_the_batch(s3):
+    writer = SegmentWriter(FlakyS3(s3, failing={"telemetria"}), "dados")
+    writer.extend([{"age": 60.0}, {"age": 70.0}])
+
+    assert writer.flush() == 0
+
+    assert writer.depth == 2 and writer.failures == 1
+    assert _segments(s3) == {}
@@ -0,0 +1,115 @@
+"""StagedStartup: etapas em segundo plano, prontidão e novas tentativas."""
+
+import threading
+import time
+
+import pytest
+
+import startup as startup_module
+from startup import StagedStartup
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(startup_module, "RETRY_BASE_DELAY", 0.01)
+
+
+def _wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_ready_after_required_stages():
+    release = threading.Event()
+    order = []
+    startup = StagedStartup(required=["minio", "model"])
+    startup.add("minio", lambda: release.wait(5) and order.append("minio"))
+    startup.add("model", lambda: order.append("model") or "v1", after=["minio"])
+    startup.add("imports", lambda: order.append("imports"))
+
+    startup.start()
+    _wait_until(lambda: "imports" in order)
+
+    assert not startup.ready
+    stats = startup.stats()
+    assert stats["status"] == "starting"
+    assert set(stats["pending"]) == {"minio", "model"}
+    release.set()
+    assert startup.wait(5)
+    assert startup.ready and order[-2:] == ["minio", "model"]
+    stats = startup.stats()
+    assert stats["status"] == "ready" and stats["pending"] == []
+    assert stats["stages"]["model"]["detail"] == "v1"
+    assert not stats["stages"]["imports"]["required"]
+    assert startup.close(5)
+
+
+def test_optional_failure_does_not_block_readiness():
+    calls = []
+    startup = StagedStartup(required=["model"])
+    startup.add("model", lambda: None)
+    startup.add("imports", lambda: calls.append(1) or 1 / 0)
+
+    startup.start()
+    assert startup.wait(5)
+
+    assert startup.ready
+    imports = startup.stats()["stages"]["imports"]
+    assert imports["status"] == "failed" and "division" in imports["error"]
+    # Etapa opcional não é repetida
+    time.sleep(0.1)
+    assert calls == [1]
+    assert startup.close(5)
+
+
+def test_required_failure_is_retried_with_backoff():
+    failures = [ConnectionError("MinIO fora do ar")] * 2
+
+    def minio():
+        if failures:
+            raise failures.pop()
+
+    after = []
+    startup = StagedStartup(required=["minio"])
+    startup.add("minio", minio)
+    startup.add("model", lambda: after.append(startup.stats()["stages"]["minio"]["status"]),
+                after=["minio"], required=False)
+
+    startup.start()
+    # Os dependentes seguem após a primeira falha, sem esperar as novas tentativas
+    assert startup.wait(5)
+    assert after == ["failed"]
+
+    _wait_until(lambda: startup.ready)
+    minio_info = startup.stats()["stages"]["minio"]
+    assert minio_info["status"] == "ready" and minio_info["attempts"] == 3
+    assert "error" not in minio_info
+    assert startup.close(5)
+
+
+def test_close_stops_the_retries(monkeypatch):
+    monkeypatch.setattr(startup_module, "RETRY_BASE_DELAY", 60)
+    startup = StagedStartup(required=["postgres"])
+    startup.add("postgres", lambda: 1 / 0)
+
+    startup.start()
+    startup.wait(5)
+    _wait_until(lambda: "retry_in" in startup.stats()["stages"]["postgres"])
+
+    assert startup.stats()["status"] == "failed"
+    assert startup.close(5)
+    postgres = startup.stats()["stages"]["postgres"]
+    # Uma só tentativa e nenhuma agendada
+    assert postgres["status"] == "failed" and "attempts" not in postgres
+
+
+def test_health_endpoints(api):
+    client, _ = api
+
+    assert client.get("/health/live").json() == {"status": "alive"}
+    resp = client.get("/health/ready")
+    assert resp.status_code == 200
+    stages = resp.json()["stages"]
+    assert all(stages[name]["status"] == "ready" for name in ("minio", "postgres", "model"))
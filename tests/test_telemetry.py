@@ -0,0 +1,81 @@
+"""TelemetryQueue e MqttListener: validação e micro-lotes."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from predict import FEATURE_NAMES
+from records import HeartData
+from telemetry import MqttListener, TelemetryQueue
+
+
+@pytest.fixture
+def reading(dataset):
+    return {name: dataset[name].iloc[0].item() for name in FEATURE_NAMES}
+
+
+def _message(payload) -> SimpleNamespace:
+    return SimpleNamespace(payload=payload if isinstance(payload, bytes) else json.dumps(payload).encode())
+
+
+def _drain(telemetry: TelemetryQueue) -> list:
+    return [telemetry._queue.get_nowait()[1] for _ in range(telemetry.depth)]
+
+
+@pytest.fixture
+def listener():
+    telemetry = TelemetryQueue(lambda: (None, None), lambda records, results: None, maxsize=10)
+    return MqttListener(telemetry, model=HeartData)
+
+
+def test_mqtt_queues_validated_values(listener, reading):
+    listener._on_message(None, None, _message([
+        {**reading, "serum_sodium": 137.0},
+        {**reading, "age": "61.5", "time": "4"},
+    ]))
+
+    first, second = _drain(listener.telemetry)
+    assert type(first["serum_sodium"]) is int and first["serum_sodium"] == 137
+    assert (second["age"], second["time"]) == (61.5, 4)
+    assert first["DEATH_EVENT"] is None
+    assert (listener.received, listener.invalid) == (2, 0)
+
+
+def test_mqtt_counts_invalid_readings(listener, reading):
+    missing = {k: v for k, v in reading.items() if k != "time"}
+    listener._on_message(None, None, _message([
+        {**reading, "serum_sodium": 137.5}, {**reading, "age": "abc"}, missing, 42, reading,
+    ]))
+    listener._on_message(None, None, _message(b"{not json"))
+
+    assert listener.telemetry.depth == 1
+    assert (listener.received, listener.invalid) == (1, 5)
+
+
+def test_mqtt_counts_dropped_when_full(reading):
+    telemetry = TelemetryQueue(lambda: (None, None), lambda records, results: None, maxsize=1)
+    listener = MqttListener(telemetry, model=HeartData)
+
+    listener._on_message(None, None, _message([reading, reading]))
+
+    assert (listener.received, listener.dropped) == (2, 1)
+    assert telemetry.stats()["rejected"] == 1
+
+
+def test_queue_batches_predictions_and_skips_failed_rows(model, reading):
+    from predict import HeartFailurePredictor
+
+    predictor = HeartFailurePredictor(model, model_version="v1")
+    written = []
+    telemetry = TelemetryQueue(lambda: ("primary", predictor),
+                               lambda records, results: written.append((records, results)),
+                               consumers=1, max_batch=8, max_wait=0.01)
+    telemetry.submit([reading, {**reading, "age": "abc"}, reading])
+    telemetry.start()
+    telemetry.close()
+
+    (records, results), = written
+    assert records == [reading, reading]
+    assert results[0] == predictor.predict(reading)
+    assert telemetry.stats()["processed"] == 2 and telemetry.stats()["failed"] == 1